@@ -0,0 +1,129 @@
+
+"""Throughput benchmark of WishboneMaster against WishboneSlave
+
+The cocotb test module run by run.py. It takes the scenarios as JSON list in
+WB_BENCH_SCENARIOS and writes one result per scenario to WB_BENCH_OUT.
+"""
+import json
+import os
+import random
+import resource
+import time
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import Combine
+from cocotb.utils import get_sim_time
+from cocotbext.wishbone.driver import WishboneMaster, WBOp
+from cocotbext.wishbone.monitor import WishboneSlave
+from cocotbext.wishbone.memory import WBMemory
+from cocotbext.wishbone.timing import WBFixed, WBUniform, WBGeometric, WBBurstStall
+
+
+def latency_profile(name, seed):
+    return {
+        "0":            lambda: WBFixed(0),
+        "2":            lambda: WBFixed(2),
+        "uniform0-3":   lambda: WBUniform(0, 3, seed),
+        "geometric":    lambda: WBGeometric(0.5, limit=16, seed=seed),
+    }[name]()
+
+
+def stall_profile(name, seed):
+    return {
+        "none":     lambda: None,
+        "light":    lambda: WBBurstStall(0.1, 1, seed),
+        "heavy":    lambda: WBBurstStall(0.5, 4, seed),
+    }[name]()
+
+
+class CallbackCounter():
+    """Count the simulator callbacks that enter the cocotb scheduler
+    """
+    def __init__(self):
+        self.count = 0
+        self._scheduler = cocotb.scheduler
+        event_loop = self._scheduler._event_loop
+        def counting(trigger):
+            self.count += 1
+            return event_loop(trigger)
+        self._scheduler._event_loop = counting
+
+    def close(self):
+        del self._scheduler._event_loop
+
+
+def work(sc, rnd):
+    """Split the transfers of scenario <sc> into one job list per requester
+    """
+    jobs = [[] for _ in range(sc["requesters"])]
+    if sc["burst"]:
+        for i in range(sc["ops"] // sc["burst"]):
+            jobs[i % len(jobs)].append(("block", i * sc["burst"], rnd.random() < sc["writes"]))
+    else:
+        cycles = sc["ops"] // sc["cycle"]
+        for i in range(cycles):
+            ops = [WBOp(rnd.randrange(0x1000), rnd.getrandbits(32) if rnd.random() < sc["writes"] else None)
+                   for _ in range(sc["cycle"])]
+            jobs[i % len(jobs)].append(("cycle", ops, None))
+    return jobs
+
+
+async def requester(master, jobs, burst):
+    data = bytes(range(256)) * (burst * 4 // 256 + 1)
+    for kind, arg, write in jobs:
+        if kind == "cycle":
+            await master.send_cycle(arg)
+        elif write:
+            await master.write_block(arg, data[:burst * 4])
+        else:
+            await master.read_block(arg, burst)
+
+
+async def run_scenario(dut, sc):
+    rnd = random.Random(sc["seed"])
+    kwargs = dict(memory=WBMemory(), byteaddr=False,
+                  waitreplygen=latency_profile(sc["latency"], sc["seed"]),
+                  waitstallgen=stall_profile(sc["stall"], sc["seed"] + 1))
+    if sc["tlm"]:
+        slave = WishboneSlave(None, "bench", None, tlm=True, **kwargs)
+        master = WishboneMaster(None, "bench", None, timeout=1000, tlm=slave)
+    else:
+        slave = WishboneSlave(dut, "", dut.clk, **kwargs)
+        master = WishboneMaster(dut, "", dut.clk, timeout=1000, pipelined=sc["pipelined"])
+    jobs = work(sc, rnd)
+    callbacks = CallbackCounter()
+    # all scenarios run in one simulator process, whose peak RSS only grows
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    sim0 = get_sim_time("ns")
+    wall0 = time.perf_counter()
+    await Combine(*[cocotb.start_soon(requester(master, j, sc["burst"])) for j in jobs])
+    wall = time.perf_counter() - wall0
+    callbacks.close()
+    transfers = master.perf.transfers
+    if slave.perf.transfers != transfers:
+        raise RuntimeError("Slave saw %u transfers, master %u" % (slave.perf.transfers, transfers))
+    if slave._thread is not None:
+        slave._thread.kill()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return dict(sc,
+                transfers       = transfers,
+                wallSeconds     = wall,
+                simNs           = get_sim_time("ns") - sim0,
+                transfersPerSec = transfers / wall if wall else 0.0,
+                callbacksPerTransfer = callbacks.count / transfers if transfers else 0.0,
+                processPeakRssKb = rss,
+                peakRssGrowthKb = rss - rss0)
+
+
+@cocotb.test()
+async def bench(dut):
+    scenarios = json.loads(os.environ["WB_BENCH_SCENARIOS"])
+    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
+    results = []
+    for sc in scenarios:
+        res = await run_scenario(dut, sc)
+        dut._log.info("%s: %.0f transfers/s, %.2f callbacks/transfer", sc["name"],
+                      res["transfersPerSec"], res["callbacksPerTransfer"])
+        results.append(res)
+    with open(os.environ["WB_BENCH_OUT"], "w") as f:
+        json.dump(results, f, indent=1)
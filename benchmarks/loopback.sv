@@ -0,0 +1,19 @@
+// Loopback wrapper for the benchmarks: the Wishbone lines of one bus, the
+// master and the slave models both attach to them from Python.
+module loopback #(parameter WIDTH = 32) (
+  input                 clk,
+  input                 cyc,
+  input                 stb,
+  input                 we,
+  input  [31:0]         adr,
+  input  [WIDTH-1:0]    datwr,
+  input  [WIDTH/8-1:0]  sel,
+  input  [2:0]          cti,
+  input  [1:0]          bte,
+  input  [WIDTH-1:0]    datrd,
+  input                 ack,
+  input                 err,
+  input                 rty,
+  input                 stall
+);
+endmodule
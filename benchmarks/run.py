@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Run the Wishbone throughput benchmarks and compare saved runs
+
+  python benchmarks/run.py                      # sweep, results/<date>-<sim>.json
+  python benchmarks/run.py --sim verilator --quick
+  python benchmarks/run.py --compare results/a.json results/b.json
+
+Starting from a base scenario every parameter is swept on its own, see SWEEP.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+BASE = dict(ops=2000, cycle=8, writes=0.5, latency="0", stall="none", burst=0,
+            requesters=1, pipelined=False, tlm=False)
+
+SWEEP = {
+    "ops":          [500, 2000, 8000],
+    "cycle":        [1, 8, 64],
+    "writes":       [0.0, 0.5, 1.0],
+    "latency":      ["0", "2", "uniform0-3", "geometric"],
+    "stall":        ["none", "light", "heavy"],
+    "burst":        [0, 4, 16, 64],
+    "requesters":   [1, 2, 8],
+    "pipelined":    [False, True],
+    "tlm":          [False, True],
+}
+
+# parameters that identify a scenario when comparing runs
+KEY = tuple(BASE)
+
+
+def scenarios(seed, quick=False):
+    out = []
+    seen = set()
+    base = dict(BASE, ops=BASE["ops"] // 4 if quick else BASE["ops"])
+    for param, values in SWEEP.items():
+        for value in values:
+            sc = dict(base)
+            sc[param] = value
+            if quick and param == "ops":
+                sc["ops"] = value // 4
+            key = tuple(sc[k] for k in KEY)
+            if key in seen:
+                continue
+            seen.add(key)
+            # named after what runs, --quick scales the op counts
+            sc["name"] = "%s=%s" % (param, sc[param])
+            sc["seed"] = seed
+            out.append(sc)
+    return out
+
+
+def run(sim, seed, quick, waves=False):
+    from cocotb.runner import get_runner
+    runner = get_runner(sim)
+    build_dir = os.path.join(here, "build", sim)
+    build_args = ["--public-flat-rw", "-Wno-fatal"] if sim == "verilator" else []
+    runner.build(verilog_sources=[os.path.join(here, "loopback.sv")], hdl_toplevel="loopback",
+                 build_dir=build_dir, build_args=build_args, waves=waves)
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "results.json")
+        os.environ["WB_BENCH_SCENARIOS"] = json.dumps(scenarios(seed, quick))
+        os.environ["WB_BENCH_OUT"] = out
+        # the benchmark module and, when not installed, cocotbext
+        sys.path[:0] = [here, os.path.dirname(here)]
+        runner.test(hdl_toplevel="loopback", test_module="bench_wishbone", build_dir=build_dir,
+                    test_dir=build_dir, seed=seed)
+        with open(out) as f:
+            return json.load(f)
+
+
+def meta(sim, seed):
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                             capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = None
+    import cocotb
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "sim": sim, "seed": seed, "git": rev,
+            "python": platform.python_version(), "cocotb": cocotb.__version__, "host": platform.node()}
+
+
+def compare(old, new):
+    with open(old) as f:
+        a = json.load(f)
+    with open(new) as f:
+        b = json.load(f)
+    before = {tuple(r[k] for k in KEY): r for r in a["results"]}
+    print("%-24s %14s %14s %8s %10s" % ("scenario", "old xfer/s", "new xfer/s", "ratio", "cb/xfer"))
+    for r in b["results"]:
+        o = before.get(tuple(r[k] for k in KEY))
+        if o is None:
+            continue
+        print("%-24s %14.0f %14.0f %8.2f %10.2f" % (r["name"], o["transfersPerSec"], r["transfersPerSec"],
+                                                   r["transfersPerSec"] / o["transfersPerSec"],
+                                                   r["callbacksPerTransfer"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sim", default=os.environ.get("SIM", "icarus"), help="icarus or verilator")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--quick", action="store_true", help="a quarter of the transfers")
+    parser.add_argument("--out", help="result file, default results/<date>-<sim>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run(args.sim, args.seed, args.quick)
+    out = args.out or os.path.join(here, "results", "%s-%s.json" % (time.strftime("%Y%m%d-%H%M%S"), args.sim))
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"meta": meta(args.sim, args.seed), "results": results}, f, indent=1)
+    print("%-24s %14s %10s %12s %10s" % ("scenario", "xfer/s", "cb/xfer", "peak rss kB", "growth kB"))
+    for r in results:
+        print("%-24s %14.0f %10.2f %12u %10u" % (r["name"], r["transfersPerSec"], r["callbacksPerTransfer"],
+                                                r["processPeakRssKb"], r["peakRssGrowthKb"]))
+    print("saved to %s" % out)
+
+
+if __name__ == "__main__":
+    main()
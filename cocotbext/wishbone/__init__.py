@@ -1,2 +1,15 @@
 from .driver import *
-from .monitor import *
\ No newline at end of file
+from .monitor import *
+from .memory import *
+from .results import *
+from .sink import *
+from .trace import *
+from .events import *
+from .arbiter import *
+from .timing import *
+from .decoder import *
+from .stats import *
+from .sniffer import *
+from .regmap import *
+from .profile import *
+from .stimulus import *
@@ -0,0 +1,111 @@
+
+import heapq
+from collections import deque
+from cocotb.decorators import public
+
+
+@public
+class WBArbiter():
+    """Decides the order in which a WishboneMaster serves queued requests
+
+    Requests are pushed when submitted and popped by the coroutine owning
+    the bus whenever it is free.
+    """
+    def push(self, req):
+        raise NotImplementedError("Arbiter doesn't implement push()")
+
+    def pop(self):
+        raise NotImplementedError("Arbiter doesn't implement pop()")
+
+    def peek(self):
+        """The request pop() would return, None if there is none
+        """
+        raise NotImplementedError("Arbiter doesn't implement peek()")
+
+    def __len__(self):
+        raise NotImplementedError("Arbiter doesn't implement __len__()")
+
+
+@public
+class WBFifoArbiter(WBArbiter):
+    """Serve requests in the order they were submitted
+    """
+    def __init__(self):
+        self._queue = deque()
+
+    def push(self, req):
+        self._queue.append(req)
+
+    def pop(self):
+        return self._queue.popleft()
+
+    def peek(self):
+        return self._queue[0] if self._queue else None
+
+    def __len__(self):
+        return len(self._queue)
+
+
+@public
+class WBPriorityArbiter(WBArbiter):
+    """Serve the request with the highest priority first, requests of the
+    same priority in the order they were submitted
+    """
+    def __init__(self):
+        self._heap  = []
+        self._seq   = 0
+
+    def push(self, req):
+        heapq.heappush(self._heap, (-req.priority, self._seq, req))
+        self._seq += 1
+
+    def pop(self):
+        return heapq.heappop(self._heap)[2]
+
+    def peek(self):
+        return self._heap[0][2] if self._heap else None
+
+    def __len__(self):
+        return len(self._heap)
+
+
+@public
+class WBRoundRobinArbiter(WBArbiter):
+    """Serve the requesters in turn, one request each, the requests of one
+    requester in the order they were submitted
+    """
+    def __init__(self):
+        self._queues    = {}        # requester -> deque of its requests
+        self._turn      = deque()   # requesters with requests, next first
+        self._len       = 0
+
+    def push(self, req):
+        queue = self._queues.get(req.requester)
+        if queue is None:
+            queue = self._queues[req.requester] = deque()
+        if not queue:
+            self._turn.append(req.requester)
+        queue.append(req)
+        self._len += 1
+
+    def pop(self):
+        requester = self._turn.popleft()
+        queue = self._queues[requester]
+        req = queue.popleft()
+        if queue:
+            self._turn.append(requester)
+        else:
+            del self._queues[requester]
+        self._len -= 1
+        return req
+
+    def peek(self):
+        if not self._turn:
+            return None
+        return self._queues[self._turn[0]][0]
+
+    def __len__(self):
+        return self._len
+
+
+arbiters = {"fifo": WBFifoArbiter, "priority": WBPriorityArbiter, "round-robin": WBRoundRobinArbiter}
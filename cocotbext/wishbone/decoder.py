@@ -0,0 +1,156 @@
+
+from bisect import bisect_right
+from itertools import repeat
+from cocotb.decorators import public
+from .memory import lane_mask
+
+
+@public
+class WBTarget():
+    """Address range behind a WBDecoder
+
+    Args:
+        base: first byte address of the range
+        size: size of the range in bytes
+        handler: what answers the accesses, at the offset into the range:
+            an object with read_word/write_word like WBMemory, a dict of
+            offset -> word acting as register file, a callable
+            handler(offset, we, datwr, sel) returning the read data, or
+            None for an error region
+        name: name of the target for messages
+        latency: wait cycles before replying, int or iterable (e.g. a
+            cocotbext.wishbone.timing profile), None to use the waitreplygen
+            of the slave
+        reply: reply type (1 ack, 2 err, 3 rty), int or iterable, None to
+            use the ackgen of the slave. Error regions default to err.
+    """
+    def __init__(self, base, size, handler, name=None, latency=None, reply=None):
+        if size < 1:
+            raise ValueError("Size of a target must be at least 1")
+        if reply is None and handler is None:
+            reply = 2
+        self.base       = base
+        self.end        = base + size
+        self.handler    = handler
+        self.name       = name if name is not None else "0x%x" % base
+        self.latency    = repeat(latency) if isinstance(latency, int) else None if latency is None else iter(latency)
+        self.reply      = repeat(reply) if isinstance(reply, int) else None if reply is None else iter(reply)
+        self.accesses   = 0
+        if handler is None or hasattr(handler, "read_word"):
+            self._handler = handler
+        elif isinstance(handler, dict):
+            self._handler = _RegFile(handler)
+        elif callable(handler):
+            self._handler = _Callback(handler)
+        else:
+            raise TypeError("Target handler must be a memory, a dict, a callable or None")
+
+    def read_word(self, adr, nbytes):
+        self.accesses += 1
+        if self._handler is None:
+            return 0
+        return self._handler.read_word(adr - self.base, nbytes)
+
+    def write_word(self, adr, value, nbytes, sel=None):
+        self.accesses += 1
+        if self._handler is not None:
+            self._handler.write_word(adr - self.base, value, nbytes, sel)
+
+    def __repr__(self):
+        return "WBTarget(%s, 0x%x-0x%x)" % (self.name, self.base, self.end - 1)
+
+
+class _RegFile():
+    """Memory interface of a dict of offset -> word
+    """
+    def __init__(self, regs):
+        self.regs = regs
+
+    def read_word(self, adr, nbytes):
+        return self.regs.get(adr, 0)
+
+    def write_word(self, adr, value, nbytes, sel=None):
+        full = (1 << nbytes) - 1
+        if sel is not None and (sel & full) != full:
+            mask = lane_mask(sel & full, nbytes)
+            value = (self.regs.get(adr, 0) & ~mask) | (value & mask)
+        self.regs[adr] = value
+
+
+class _Callback():
+    """Memory interface of a handler(offset, we, datwr, sel) callable
+    """
+    def __init__(self, handler):
+        self.handler = handler
+
+    def read_word(self, adr, nbytes):
+        return self.handler(adr, False, None, None) or 0
+
+    def write_word(self, adr, value, nbytes, sel=None):
+        self.handler(adr, True, value, sel)
+
+
+@public
+class WBDecoder():
+    """Address decoder putting many targets behind one WishboneSlave
+
+    Pass it as <decoder> to the slave, which then answers each access from
+    the target its address falls into, with the latency and reply policy of
+    that target. Addresses that don't fall into a target go to <default>.
+    The decoder looks like a WBMemory to the slave, addresses are byte
+    addresses.
+
+    Targets are kept sorted by base address and looked up with a binary
+    search, the last target hit is checked first so sequential accesses
+    don't search at all.
+
+    Args:
+        default: WBTarget for unmapped addresses, None for an error region
+    """
+    def __init__(self, default=None):
+        self.default    = default if default is not None else WBTarget(0, 1, None, "unmapped")
+        self._bases     = []    # base addresses of the targets, sorted
+        self._targets   = []    # targets in the order of _bases
+        self._last      = None  # target of the last lookup
+
+    def add(self, base, size, handler, name=None, latency=None, reply=None):
+        """Add a target for the <size> bytes starting at <base>, see WBTarget
+        for the arguments. Returns the WBTarget.
+        """
+        if isinstance(handler, WBTarget):
+            target = handler
+        else:
+            target = WBTarget(base, size, handler, name, latency, reply)
+        i = bisect_right(self._bases, target.base)
+        if i > 0 and self._targets[i - 1].end > target.base:
+            raise ValueError("%r overlaps %r" % (target, self._targets[i - 1]))
+        if i < len(self._targets) and self._targets[i].base < target.end:
+            raise ValueError("%r overlaps %r" % (target, self._targets[i]))
+        self._bases.insert(i, target.base)
+        self._targets.insert(i, target)
+        return target
+
+    def lookup(self, adr):
+        """Return the target byte address <adr> falls into
+        """
+        target = self._last
+        if target is not None and target.base <= adr < target.end:
+            return target
+        i = bisect_right(self._bases, adr) - 1
+        if i >= 0 and adr < self._targets[i].end:
+            target = self._targets[i]
+            self._last = target
+            return target
+        # the range of the default target isn't where it applies, don't
+        # let it shadow the mapped targets
+        return self.default
+
+    @property
+    def targets(self):
+        return list(self._targets)
+
+    def read_word(self, adr, nbytes):
+        return self.lookup(adr).read_word(adr, nbytes)
+
+    def write_word(self, adr, value, nbytes, sel=None):
+        self.lookup(adr).write_word(adr, value, nbytes, sel)
@@ -1,10 +1,21 @@
 
+import logging
 import cocotb
-from cocotb.triggers import FallingEdge, RisingEdge, Event
+from collections import deque
+from cocotb.triggers import RisingEdge, FallingEdge, Event, First, Timer
+from cocotb.utils import get_sim_time
 from cocotb_bus.drivers import BusDriver
+from cocotb.log import SimLog
 from cocotb.result import TestFailure
-from cocotb.binary import BinaryValue
 from cocotb.decorators import public
+from .trace import WBTraceWriter
+from .events import WBEvent, sim_time
+from .arbiter import WBArbiter, arbiters
+from .stats import WBStats
+from .results import WBResults
+from .profile import make_profile
+from .signals import SEL, ERR, STALL, RTY, CTI, BTE, capabilities, bus_width, binstr_reader, to_int, to_binary
+from .monitor import WishboneSlave
 
 
 def is_sequence(arg):
@@ -13,23 +24,6 @@ def is_sequence(arg):
             hasattr(arg, "__iter__"))
 
 
-class WBAux():
-    """
-    Wishbone Auxiliary Wrapper Class
-
-    wrap meta informations on bus transaction (internal only)
-    """
-    def __init__(self, sel=None, adr=0, datwr=None, waitStall=0, waitIdle=0, tsStb=0, cti=0, bte=0):
-        self.sel        = sel
-        self.adr        = adr
-        self.datwr      = datwr
-        self.waitIdle   = waitIdle
-        self.waitStall  = waitStall
-        self.ts         = tsStb
-        self.cti        = cti
-        self.bte        = bte
-
-
 @public
 class WBOp():
     """
@@ -41,12 +35,12 @@ class WBOp():
         adr: address of the operation
         dat: data to write, None indicates a read cycle
         idle: number of clock cycles between asserting cyc and stb
-        sel: the selection mask for the operation
+        sel: the selection mask for the operation, None enables all byte lanes
         acktimeout: number of maximum clock cycles before asserting ack
         cti: type of cycles done by the operation
         bte: burst type extension, currently only used for signaling inc. burst wrap size
     """
-    def __init__(self, adr=0, dat=None, idle=0, sel=0xF, acktimeout=0, cti=0, bte=0):
+    def __init__(self, adr=0, dat=None, idle=0, sel=None, acktimeout=0, cti=0, bte=0):
         self.adr    = adr
         self.dat    = dat
         self.sel    = sel
@@ -56,6 +50,58 @@ class WBOp():
         self.bte    = bte
 
 
+@public
+class WBRequest():
+    """
+    Cycle queued for a WishboneMaster, see WishboneMaster.submit()
+
+    Await it to get the results of the cycle, or the exception it failed with.
+    The cycle is described by the callbacks of WishboneMaster._run_cycle.
+
+    Args:
+        n: number of operations
+        drive, complete: callbacks putting an operation on the bus and
+            taking its outcome
+        idles, acktimeouts: per operation idle cycles and ack timeouts
+        result: what awaiting the request returns once the cycle is done
+        merge: the cycle may share a bus cycle with adjacent mergeable ones
+        sync: synchronise to the clock before opening the cycle and complete
+            the request only after the cycle is closed, like send_cycle()
+        priority: priority for WBPriorityArbiter, higher is served first
+        requester: requester for WBRoundRobinArbiter
+    """
+    def __init__(self, n, drive, complete, idles=None, acktimeouts=None, result=None,
+                 merge=False, sync=False, priority=0, requester=None):
+        self.n          = n
+        self.drive      = drive
+        self.complete   = complete
+        self.idles      = idles
+        self.acktimeouts = acktimeouts
+        self.result     = result
+        self.merge      = merge
+        self.sync       = sync
+        self.priority   = priority
+        self.requester  = requester
+        self.exception  = None
+        self.done       = False
+        self._event     = Event("wb_request")
+        self._serve     = None  # carries out the queue of a master in TLM mode
+
+    def _finish(self, exception=None):
+        self.exception  = exception
+        self.done       = True
+        self._event.set()
+
+    def __await__(self):
+        if not self.done and self._serve is not None:
+            yield from self._serve().__await__()
+        if not self.done:
+            yield from self._event.wait().__await__()
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+
 @public
 class WBRes():
     """
@@ -63,6 +109,7 @@ class WBRes():
 
     What's happend on the bus plus meta information on timing
     """
+    __slots__ = ("ack", "sel", "adr", "datrd", "datwr", "waitStall", "waitAck", "waitIdle", "cti", "bte")
 
     def __init__(self, ack=0, sel=None, adr=0, datrd=None, datwr=None, waitIdle=0, waitStall=0, waitAck=0, cti=0, bte=0):
         self.ack        = ack
@@ -77,279 +124,1062 @@ class WBRes():
         self.bte        = bte
 
 
+@public
+class WBTimeout(TestFailure):
+    """
+    A WishboneMaster gave up waiting for the slave
+
+    Args:
+        kind: what the master waited for, "stall" for the slave to take the
+            request, "ack" for the reply within the acktimeout of the
+            operation, "reply" for the outstanding replies at the end of the
+            cycle
+        clocks: the timeout reached, in clock cycles
+        op: index of the operation in the cycle
+        adr: address of the operation, None if it isn't resolvable
+        outstanding: number of operations accepted by the slave but not
+            replied to yet
+        cycle: number of the bus cycle
+    """
+    _what = {"stall": "on stall from slave", "ack": "waiting for acknowledge",
+             "reply": "waiting for reply from slave"}
+
+    def __init__(self, kind, clocks, op, adr, outstanding, cycle):
+        self.kind           = kind
+        self.clocks         = clocks
+        self.op             = op
+        self.adr            = adr
+        self.outstanding    = outstanding
+        self.cycle          = cycle
+        super().__init__("Timeout of %u clock cycles reached when %s (cycle %u, op %u at %s, %u outstanding)" %
+                         (clocks, self._what[kind], cycle, op, "0x%x" % adr if adr is not None else "X", outstanding))
+
+
 class Wishbone(BusDriver):
     """
     Wishbone
     """
     _signals = ["cyc", "stb", "we", "adr", "datwr", "datrd", "ack"]
     _optional_signals = ["sel", "err", "stall", "rty", "cti", "bte"]
+    replyTypes = {1 : "ack", 2 : "err", 3 : "rty"}
+    # cycle type identifiers
+    CTI_CLASSIC, CTI_CONST, CTI_INC, CTI_END = 0, 1, 2, 7
 
-    def __init__(self, entity, name, clock, width=32, signals_dict=None, **kwargs):
+    def __init__(self, entity, name, clock, width=None, signals_dict=None, **kwargs):
         if signals_dict is not None:
             self._signals=signals_dict
         BusDriver.__init__(self, entity, name, clock, case_insensitive=False, **kwargs)
+        width = bus_width(self.bus, width)
         # Drive some sensible defaults (setimmediatevalue to avoid x asserts)
         self._width = width
+        self._sel_all = (1 << (width // 8)) - 1
         self.bus.cyc.setimmediatevalue(0)
         self.bus.stb.setimmediatevalue(0)
         self.bus.we.setimmediatevalue(0)
         self.bus.adr.setimmediatevalue(0)
         self.bus.datwr.setimmediatevalue(0)
+        # optional lines present, resolved once instead of on every access
+        self._caps = capabilities(self.bus)
 
-        if hasattr(self.bus, "sel"):
+        if self._caps & SEL:
+            self._sel_all = (1 << len(self.bus.sel)) - 1
             v = self.bus.sel.value
             v.binstr = "1" * len(self.bus.sel)
             self.bus.sel.value = v
 
-        if hasattr(self.bus, "cti"):
+        if self._caps & CTI:
             self.bus.cti.setimmediatevalue(0)
 
-        if hasattr(self.bus, "bte"):
+        if self._caps & BTE:
             self.bus.bte.setimmediatevalue(0)
 
 
+class _TLMLine():
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+
+class _TLMBus():
+    """
+    Stands in for the bus of a master in TLM mode, the drive callbacks write
+    the request to it like to the real lines
+    """
+    def __init__(self):
+        for name in Wishbone._signals + Wishbone._optional_signals:
+            setattr(self, name, _TLMLine())
+
+
 class WishboneMaster(Wishbone):
     """
     Wishbone master
+
+    All bus activity of a cycle is handled by a single loop that wakes up once
+    per rising clock edge, samples the slave lines and drives the next request.
+    Timing information is derived from simulation time stamps.
+
+    Args:
+        timeout: number of maximum clock cycles to wait for the slave, None for no timeout
+        width: size of the data bus in bits, a power of two like 32, 64 or
+            128, None to take it from the datwr line (32 in TLM mode)
+        byteaddr: the address bus carries byte addresses instead of word
+            indices, for read_block(), write_block(), read_bytes() and
+            write_bytes()
+        pipelined: issue a new strobe on every non-stalled clock instead of
+            waiting for the acknowledge of each operation (Pipelined Wishbone)
+        max_outstanding: maximum number of unacknowledged operations in flight
+            in pipelined mode, None for no limit
+        trace: WBTraceWriter or file name to record all transfers to
+        events: callable or WBSink getting a WBEvent when a cycle opens or
+            closes and for every transfer, None disables the events
+        ints: return the read data as int instead of BinaryValue, None if
+            it isn't resolvable
+        arbitration: order in which concurrently submitted cycles get the
+            bus, "fifo", "priority", "round-robin" or a WBArbiter
+        tlm: transaction level mode, talk to this WishboneSlave (constructed
+            with tlm=True), WBMemory or WBDecoder directly instead of driving
+            the bus. No simulation time passes, the wait cycles are taken
+            from the generators of the slave and counted in <clocks>.
+            <entity> and <clock> may be None. The queued cycles are carried
+            out when one of them is awaited, no simulator is needed.
+        regions: address ranges to break the statistics in <perf> down by,
+            see WBStats
+        profile: count the wakeups and Python time of the coroutines and
+            per clock functions in a WBProfile, True or the WBProfile to use
     """
-    def __init__(self, entity, name, clock, timeout=None, width=32, **kwargs):
+    def __init__(self, entity, name, clock, timeout=None, width=None, pipelined=False, max_outstanding=None, trace=None,
+                 events=None, ints=False, arbitration="fifo", tlm=None, regions=None, byteaddr=False,
+                 profile=None, **kwargs):
         sTo = ", no cycle timeout"
         if timeout is not None:
             sTo = ", cycle timeout is %u clockcycles" % timeout
+        if pipelined:
+            sTo += ", pipelined"
+            if max_outstanding is not None:
+                if max_outstanding < 1:
+                    raise ValueError("max_outstanding must be at least 1")
+                sTo += " with up to %u ops in flight" % max_outstanding
         self.busy_event         = Event("%s_busy" % name)
         self._timeout           = timeout
+        self._pipelined         = pipelined
+        self._max_outstanding   = max_outstanding
         self.busy               = False
-        self._acked_ops         = 0
-        self._res_buf           = []
-        self._aux_buf           = []
         self._op_cnt            = 0
-        self._clk_cycle_count   = 0
+        self._clkedge           = RisingEdge(clock)
+        self._clk_period        = None  # in simulator steps, measured on the first cycle
+        self._last_edge         = None
+        self.trace              = trace
+        self._events            = getattr(events, "put", events)
+        self._cycle_num         = 0
+        self._ints              = ints
+        self._byteaddr          = byteaddr
+        if not isinstance(arbitration, WBArbiter):
+            if arbitration not in arbiters:
+                raise ValueError("Unknown arbitration %r, use one of %s" % (arbitration, ", ".join(arbiters)))
+            arbitration = arbiters[arbitration]()
+        self._queue             = arbitration   # WBRequests waiting for the bus
+        self._worker            = None
+        self.clocks             = 0     # virtual clock cycles in TLM mode
+        self.perf               = WBStats(regions)
+        self.profile            = make_profile(profile, name)
+        if tlm is not None:
+            if width is None and isinstance(tlm, WishboneSlave):
+                width = tlm._width
+            width = bus_width(None, width)
+            if not isinstance(tlm, WishboneSlave):
+                tlm = WishboneSlave(None, name, None, width=width, tlm=True, **{
+                    "decoder" if hasattr(tlm, "lookup") else "memory": tlm})
+            elif not tlm._tlm:
+                raise ValueError("The slave of a master in TLM mode must be constructed with tlm=True")
+            self._tlm           = tlm
+            self.log            = SimLog("cocotb.wishbone.%s" % name)
+            # what Driver.__init__ sets up, without its coroutine: nothing
+            # here needs the scheduler, so this mode runs without a simulator
+            self._pending       = Event("Driver._pending")
+            self._sendQ         = deque()
+            self._thread        = None
+            self.entity         = entity
+            self.clock          = clock
+            self.name           = name
+            self.bus            = _TLMBus()
+            self._width         = width
+            self._caps          = SEL | ERR | RTY | CTI | BTE
+            self._sel_all       = (1 << (width // 8)) - 1
+            self._tick          = self._tlm_tick
+            self._clk_period    = 1
+            self._run_cycle     = self._tlm_run_cycle
+            self._open_trace()
+            if self.profile is not None:
+                self.profile.instrument(self, ("_serve", "_run_cycle", "_tick"), ("_drive", "_record"))
+            self.log.info("Wishbone Master created, transaction level")
+            return
+        self._tlm               = None
         Wishbone.__init__(self, entity, name, clock, width, **kwargs)
-        self.log.info("Wishbone Master created%s" % sTo)
+        self._get_reply         = self._reply_sampler()
+        self._read_datrd        = binstr_reader(self.bus.datrd)
+        self._open_trace()
+        if self.profile is not None:
+            self.profile.instrument(self, ("_serve", "_run_cycle", "_tick", "_sleep"),
+                                    ("_get_reply", "_drive", "_record"))
+        self.log.info("Wishbone Master created%s", sTo)
+
+    def _open_trace(self):
+        #a trace given by file name is written once the bus width is known
+        if self.trace is not None and not isinstance(self.trace, WBTraceWriter):
+            self.trace = WBTraceWriter(self.trace, self._width)
 
-    async def _clk_cycle_counter(self):
+    async def _tick(self):
         """
-        Cycle counter to time bus operations
+        Wait for the next rising clock edge and return its time stamp
         """
-        clkedge = RisingEdge(self.clock)
-        self._clk_cycle_count = 0
-        while self.busy:
-            await clkedge
-            self._clk_cycle_count += 1
+        await self._clkedge
+        now = get_sim_time()
+        if self._clk_period is None and self._last_edge is not None:
+            self._clk_period = now - self._last_edge
+        self._last_edge = now
+        return now
+
+    async def _tlm_tick(self):
+        """
+        _tick of the TLM mode, advances the virtual clock
+        """
+        self.clocks += 1
+        self._last_edge = self.clocks
+        return self.clocks
+
+    async def _tlm_run_cycle(self, n, drive, complete, idles=None, acktimeouts=None):
+        """
+        _run_cycle of the TLM mode: hand the operations to the slave one by
+        one and account for the clocks a classic cycle would take
+        """
+        bus     = self.bus
+        slave   = self._tlm
+        timeout = self._timeout
+        binstr  = "0%ub" % self._width
+        mask    = (1 << self._width) - 1
+        try:
+            for i in range(n):
+                idle = (idles[i] or 0) if idles else 0
+                drive(i)
+                we = bool(bus.we.value)
+                reply, datrd, waitStall, waitAck = slave._tlm_access(
+                    bus.adr.value, we, bus.datwr.value if we else None, bus.sel.value, idle)
+                if timeout is not None and waitStall > timeout:
+                    raise WBTimeout("stall", timeout, i, bus.adr.value, 0, self._cycle_num)
+                #the master sees the reply one clock after the slave took the request
+                waitAck += 1
+                if acktimeouts and acktimeouts[i] and waitAck > acktimeouts[i]:
+                    raise WBTimeout("ack", acktimeouts[i], i, bus.adr.value, 1, self._cycle_num)
+                if timeout is not None and waitAck > timeout:
+                    raise WBTimeout("reply", timeout, i, bus.adr.value, 1, self._cycle_num)
+                #one clock to present the request, then the stall and wait cycles
+                self.clocks += idle + 1 + waitStall + waitAck
+                self._last_edge = self.clocks
+                complete(i, reply, format(datrd & mask, binstr), waitStall, waitAck)
+        finally:
+            slave._tlm_close()
+
+    def _cycles(self, start, end):
+        """
+        Convert a time span between two clock edges into clock cycles
+        """
+        if not self._clk_period:
+            return 0
+        return int(round((end - start) / self._clk_period))
 
     async def _open_cycle(self):
         #Open new wishbone cycle
         if self.busy:
             self.log.error("Opening Cycle, but WB Driver is already busy. Someting's wrong")
             await self.busy_event.wait()
-            print('\n--------\nsarasa')
         self.busy_event.clear()
         self.busy       = True
-        cocotb.start_soon(self._read())
-        cocotb.start_soon(self._clk_cycle_counter()) 
         self.bus.cyc.value = 1
-        self._acked_ops = 0  
-        self._res_buf   = [] 
-        self._aux_buf   = []
-        self.log.debug("Opening cycle, %u Ops" % self._op_cnt)
+        self.log.debug("Opening cycle, %u Ops", self._op_cnt)
+        if self._events is not None:
+            self._events(WBEvent("open", sim_time(), self._cycle_num))
 
     async def _close_cycle(self):
-        #Close current wishbone cycle  
-        clkedge = RisingEdge(self.clock)
-        count           = 0
-        last_acked_ops  = 0
-        #Wait for all Operations being acknowledged by the slave before lowering the cycle line
-        #This is not mandatory by the bus standard, but a crossbar might send acks to the wrong master
-        #if we don't wait. We don't want to risk that, it could hang the bus
-        while self._acked_ops < self._op_cnt:
-            if last_acked_ops != self._acked_ops:
-                self.log.debug("Waiting for missing acks: %u/%u" % (self._acked_ops, self._op_cnt) )
-            last_acked_ops = self._acked_ops    
-            #check for timeout when finishing the cycle            
-            count += 1
-            if (not (self._timeout is None)):
-                if (count > self._timeout): 
-                    raise TestFailure("Timeout of %u clock cycles reached when waiting for reply from slave" % self._timeout)                
-            await clkedge
-
+        #Close current wishbone cycle
         self.busy = False
         self.busy_event.set()
-        if hasattr(self.bus, "cti"):
+        if self._caps & CTI:
             self.bus.cti.value = 0
-        if hasattr(self.bus, "bte"):
+        if self._caps & BTE:
             self.bus.bte.value = 0
         self.bus.cyc.value = 0
         self.log.debug("Closing cycle")
-        await clkedge
-
-    async def _wait_stall(self):
-        """Wait for stall to be low before continuing (Pipelined Wishbone)
-        """
-        clkedge = RisingEdge(self.clock)
-        count = 0
-        if hasattr(self.bus, "stall"):
-            count = 0            
-            while self.bus.stall.value == 1:
-                await clkedge
-                count += 1
-                if (not (self._timeout is None)):
-                    if (count > self._timeout): 
-                        raise TestFailure("Timeout of %u clock cycles reached when on stall from slave" % self._timeout)                
-            self.log.debug("Stalled for %u cycles" % count)
-        return count
-
-    async def _wait_ack(self):
-        """Wait for ACK on the bus before continuing (Non pipelined Wishbone)
-        """
-        #wait for acknownledgement before continuing - Classic Wishbone without pipelining
-        clkedge = RisingEdge(self.clock)
-        count = 0
-        if hasattr(self.bus, "stall"):
-            self.bus.stb.value = 0
-        if self._acktimeout == 0:
-            while not self._get_reply()[0] :
-                await clkedge
-                count += 1
-        else:
-            while (not self._get_reply()[0]) and (count < self._acktimeout) :
-                await clkedge
-                count += 1
-        if (self._acktimeout != 0) and (count >= self._acktimeout):
-            raise TestFailure("Timeout of %u clock cycles reached when waiting for acknowledge" % count)
+        if self._events is not None:
+            self._events(WBEvent("close", sim_time(), self._cycle_num))
+        self._cycle_num += 1
+        await self._tick()
 
-        if not hasattr(self.bus, "stall"):
-            self.bus.stb.value = 0
-        self._acked_ops += 1
-        self.log.debug("Waited %u cycles for ackknowledge" % count)
+    def _record(self, adr, datrd, datwr, sel, we, reply, waitIdle, waitStall, waitAck, cti, bte):
+        """
+        Pass a completed transfer to the trace and the event callback
+        """
+        datrd = to_int(datrd, 0)
+        time = sim_time()
+        if self.trace is not None:
+            self.trace.append(adr, datrd, datwr, sel, we, reply, waitIdle, waitStall, waitAck, cti, bte, time)
+        if self._events is not None:
+            self._events(WBEvent("transfer", time, self._cycle_num, adr, we, datrd, datwr, sel, reply,
+                                 waitIdle, waitStall, waitAck, cti, bte))
 
-        return count
+    def _reply_sampler(self):
+        """
+        Build the _get_reply() function for the reply lines of this bus
 
-    def _get_reply(self):
-        code = 0 # 0 if no reply, 1 for ACK, 2 for ERR, 3 for RTY
-        ack = self.bus.ack.value == 1
-        if ack:
-            code = 1
-        if hasattr(self.bus, "err") and self.bus.err.value == 1:
-            if ack:
-                raise TestFailure("Slave raised ACK and ERR line")
-            ack = True
-            code = 2
-        if hasattr(self.bus, "rty") and self.bus.rty.value == 1:
-            if ack:
-                raise TestFailure("Slave raised {} and RTY line".format("ACK" if code == 1 else "ERR"))
-            ack = True
-            code = 3
-        return ack, code
+        _get_reply() returns (replied, code), code is 0 if no reply, 1 for
+        ACK, 2 for ERR and 3 for RTY
+        """
+        ack = binstr_reader(self.bus.ack)
+        err = binstr_reader(self.bus.err) if self._caps & ERR else None
+        rty = binstr_reader(self.bus.rty) if self._caps & RTY else None
+
+        if err is None and rty is None:
+            def get_reply():
+                if ack() == "1":
+                    return True, 1
+                return False, 0
+            return get_reply
 
-    async def _read(self):
+        def get_reply():
+            code = 1 if ack() == "1" else 0
+            if err is not None and err() == "1":
+                if code:
+                    raise TestFailure("Slave raised ACK and ERR line")
+                code = 2
+            if rty is not None and rty() == "1":
+                if code:
+                    raise TestFailure("Slave raised {} and RTY line".format("ACK" if code == 1 else "ERR"))
+                code = 3
+            return code != 0, code
+        return get_reply
+
+    def _drive(self, we, adr, datwr, sel, cti, bte):
         """
-        Reader for slave replies
+        Drive the Wishbone Master Out Lines
         """
-        count = 0
-        clkedge = FallingEdge(self.clock)
-        while self.busy:
-            ack, reply = self._get_reply()
-            # valid reply?
+        self.bus.adr.value = adr
+        if self._caps & SEL:
+            self.bus.sel.value = sel if sel is not None else self._sel_all
+        if self._caps & CTI:
+            self.bus.cti.value = cti
+            if self._caps & BTE:
+                self.bus.bte.value = bte
+        else:
+            if cti != 0:
+                self.log.error("Wishbone bus doesn't support burst cycles")
+
+        self.bus.datwr.value = datwr
+        self.bus.we.value = we
+
+    async def _run_cycle(self, n, drive, complete, idles=None, acktimeouts=None):
+        """
+        Carry out <n> operations in an open cycle, one loop iteration per clock
+
+        Each iteration first drives the request for the coming clock (or idles),
+        then waits for the rising edge and evaluates what the slave did: stall
+        on the presented request and replies to the oldest outstanding one.
+        The operations themselves are only known to the callbacks, drive(i)
+        puts operation i on the bus and complete(i, reply, datrd, waitStall,
+        waitAck) gets its outcome, <datrd> as binary string.
+
+        Once the master has waited two clocks with nothing to do but wait for
+        the slave, it sleeps until a reply line rises or stall falls instead of
+        waking up on every clock. A timer wakes it up in time for the clock
+        a timeout is due on.
+        """
+        bus         = self.bus
+        has_stall   = bool(self._caps & STALL)
+        read_stall  = binstr_reader(bus.stall) if has_stall else None
+        read_datrd  = self._read_datrd
+        read_adr    = binstr_reader(bus.adr)
+        get_reply   = self._get_reply
+        pipelined   = self._pipelined
+        # classic Wishbone has exactly one operation in flight
+        max_out     = self._max_outstanding if pipelined else 1
+        # without a stall line a classic slave takes the request with its ack
+        hold_stb    = not pipelined and not has_stall
+        timeout     = self._timeout
+        debug       = self.log.isEnabledFor(logging.DEBUG)
+        replied     = [RisingEdge(bus.ack)]
+        if self._caps & ERR:
+            replied.append(RisingEdge(bus.err))
+        if self._caps & RTY:
+            replied.append(RisingEdge(bus.rty))
+        unstalled   = FallingEdge(bus.stall) if has_stall else None
+        acked       = 0
+        pending     = deque()   # accepted requests waiting for a reply: (op, accepted at, waitStall, adr)
+        strobe      = None      # operation currently presented on the bus
+        stb         = False
+        stalled     = 0
+        draining    = 0
+        quiet       = 0         # clocks in a row the slave left everything as it was
+        cnt         = 0
+        idle        = (idles[0] or 0) if idles else 0
+
+        while cnt < n or strobe is not None or pending:
+            # drive the request for the coming clock
+            waiting = False
+            if strobe is None:
+                if cnt < n and (max_out is None or len(pending) < max_out) and not idle:
+                    drive(cnt)
+                    if not stb:
+                        bus.stb.value = 1
+                        stb = True
+                    strobe = cnt
+                    cnt += 1
+                    if idles and cnt < n:
+                        idle = idles[cnt] or 0
+                else:
+                    if stb and not (hold_stb and pending):
+                        bus.stb.value = 0
+                        stb = False
+                    # requested idle cycles only count once we are allowed to issue
+                    if cnt < n and idle and (max_out is None or len(pending) < max_out):
+                        idle -= 1
+                    else:
+                        waiting = True
+            elif quiet:
+                waiting = True
+
+            # short waits are cheaper to tick through than to set up a sleep for
+            if waiting and quiet >= 2 and self._clk_period:
+                skipped = await self._sleep(strobe is not None, bool(pending), replied, unstalled,
+                                            self._deadline(strobe, stalled, draining, cnt == n, pending, acktimeouts))
+                if strobe is not None:
+                    stalled += skipped
+                elif cnt == n and pending:
+                    draining += skipped
+
+            now = await self._tick()
+            progress = not waiting
+
+            # flow control (pipelined wishbone)
+            if strobe is not None:
+                if has_stall and read_stall() == "1":
+                    stalled += 1
+                    if timeout is not None and stalled > timeout:
+                        raise WBTimeout("stall", timeout, strobe, to_int(read_adr()), len(pending), self._cycle_num)
+                else:
+                    if debug:
+                        self.log.debug("Stalled for %u cycles", stalled)
+                    pending.append((strobe, now, stalled, read_adr()))
+                    strobe = None
+                    stalled = 0
+                    progress = True
+
+            # collect the reply for the oldest outstanding request
+            ack, reply = get_reply()
             if ack:
-                datrd = self.bus.datrd.value
-                #append reply and meta info to result buffer
-                tmpRes =  WBRes(ack=reply, sel=None, adr=None, datrd=datrd, datwr=None, waitIdle=None, waitStall=None, waitAck=self._clk_cycle_count, cti=None, bte=None)
-                self._res_buf.append(tmpRes)
+                progress = True
+                if pending:
+                    op, accepted, waitStall, _ = pending.popleft()
+                    waitAck = self._cycles(accepted, now)
+                    complete(op, reply, read_datrd(), waitStall, waitAck)
+                    acked += 1
+                    if debug:
+                        self.log.debug("Waited %u cycles for ackknowledge", waitAck)
+                    if not pipelined:
+                        bus.we.value = 0
+                        bus.datwr.value = 0
+                else:
+                    self.log.error("Slave replied without an outstanding request")
+            elif pending and acktimeouts:
+                op, accepted, waitStall, adr = pending[0]
+                waited = self._cycles(accepted, now)
+                if acktimeouts[op] and waited >= acktimeouts[op]:
+                    raise WBTimeout("ack", waited, op, to_int(adr), len(pending), self._cycle_num)
+
+            #Wait for all Operations being acknowledged by the slave before lowering the cycle line
+            #This is not mandatory by the bus standard, but a crossbar might send acks to the wrong master
+            #if we don't wait. We don't want to risk that, it could hang the bus
+            if cnt == n and strobe is None and pending:
+                draining += 1
+                if debug:
+                    self.log.debug("Waiting for missing acks: %u/%u", acked, n)
+                if timeout is not None and draining > timeout:
+                    op, _, _, adr = pending[0]
+                    raise WBTimeout("reply", timeout, op, to_int(adr), len(pending), self._cycle_num)
+            quiet = 0 if progress else quiet + 1
 
-            await clkedge
-            count += 1
+        if stb:
+            bus.stb.value = 0
+        bus.we.value = 0
+        bus.datwr.value = 0
 
-    async def _drive(self, we, adr, datwr, sel, idle, cti, bte):
+    def _deadline(self, strobe, stalled, draining, drained, pending, acktimeouts):
         """
-        Drive the Wishbone Master Out Lines
+        Number of clock edges from the last one until a timeout of _run_cycle
+        is due, None if none is
+        """
+        timeout = self._timeout
+        due = []
+        if timeout is not None:
+            if strobe is not None:
+                due.append(timeout - stalled + 1)
+            elif drained and pending:
+                due.append(timeout - draining + 1)
+        if pending and acktimeouts:
+            op, accepted = pending[0][:2]
+            if acktimeouts[op]:
+                due.append(acktimeouts[op] - self._cycles(accepted, self._last_edge))
+        return min(due) if due else None
+
+    async def _sleep(self, stalled, pending, replied, unstalled, deadline):
+        """
+        Sleep until the slave moves a line _run_cycle is waiting for, or until
+        shortly before the clock edge of the <deadline>. Returns the number of
+        clock edges slept through, _run_cycle evaluates the next one as usual.
         """
+        if deadline is not None and deadline <= 1:
+            return 0
+        triggers = []
+        if stalled:
+            if unstalled is None:
+                return 0
+            triggers.append(unstalled)
+        if pending:
+            triggers.extend(replied)
+        if not triggers:
+            return 0
+        if deadline is not None:
+            period = self._clk_period
+            triggers.append(Timer(period * (deadline - 1) + max(period // 2, 1)))
+        start = self._last_edge
+        if len(triggers) == 1:
+            await triggers[0]
+        else:
+            await First(*triggers)
+        # a slave reacting to a clock edge moves its lines at the time of the edge
+        return int((get_sim_time() - start) // self._clk_period)
 
-        clkedge = RisingEdge(self.clock)
-        if self.busy:
-            # insert requested idle cycles
-            if idle is not None:
-                idlecnt = idle
-                while idlecnt > 0:
-                    idlecnt -= 1
-                    await clkedge
-            # drive outputs
-            self.bus.stb.value = 1
-            self.bus.adr.value = adr
-            if hasattr(self.bus, "sel"):
-                self.bus.sel.value = sel if sel is not None else BinaryValue("1" * len(self.bus.sel))
-            if hasattr(self.bus, "cti"):
-                self.bus.cti.value = cti
-                if hasattr(self.bus, "bte"):
-                    self.bus.bte.value = bte
+    def _check_ops(self, arg):
+        if not is_sequence(arg):
+            raise TestFailure("Sorry, argument must be a list of WBOp (Wishbone Operation) objects!")
+        ops = list(arg)
+        for op in ops:
+            if not isinstance(op, WBOp):
+                raise TestFailure("Sorry, argument must be a list of WBOp (Wishbone Operation) objects!")
+        return ops
+
+    def _op_callbacks(self, ops, result, results=None):
+        """
+        Build the drive and complete callbacks of _run_cycle for a list of
+        WBOp, the outcome is appended to the list <result> as WBRes or to
+        the WBResults <results>
+        """
+        def drive(i):
+            op = ops[i]
+            if op.dat is not None:
+                self._drive(1, op.adr, op.dat, op.sel, op.cti, op.bte)
             else:
-                if cti != 0:
-                    self.log.error("Wishbone bus doesn't support burst cycles")
-
-            self.bus.datwr.value = datwr
-            self.bus.we.value = we
-            await clkedge
-            #deal with flow control (pipelined wishbone)
-            stalled = await self._wait_stall()
-            #append operation and meta info to auxiliary buffer
-            self._aux_buf.append(WBAux(sel, adr, datwr, stalled, idle, self._clk_cycle_count, cti, bte))
-            await self._wait_ack()
-            self.bus.we.value = 0
-            self.bus.datwr.value = 0
-        else:
-            self.log.error("Cannot drive the Wishbone bus outside a cycle!")
+                self._drive(0, op.adr, 0, op.sel, op.cti, op.bte)
+
+        if self.log.isEnabledFor(logging.DEBUG):
+            _drive = drive
+            def drive(i):
+                _drive(i)
+                op = ops[i]
+                we, dat = (0, 0) if op.dat is None else (1, op.dat)
+                if op.sel is not None:
+                    self.log.debug("#%3u WE: %s ADR: 0x%08x DAT: 0x%08x SEL: 0x%1x IDLE: %3u CTI: 0x%03x BTE: 0x%02x", i, we, op.adr, dat, op.sel, op.idle, op.cti, op.bte)
+                else:
+                    self.log.debug("#%3u WE: %s ADR: 0x%08x DAT: 0x%08x SEL: None  IDLE: %3u CTI: 0x%03x BTE: 0x%02x", i, we, op.adr, dat, op.idle, op.cti, op.bte)
 
-    async def send_cycle(self, arg):
+        ints = self._ints
+        perf = self.perf
+        sel_all = self._sel_all
+        def complete(i, reply, datrd, waitStall, waitAck):
+            op = ops[i]
+            perf.add(reply, op.adr, op.dat is not None, op.idle or 0, waitStall, waitAck)
+            datrd = to_int(datrd) if ints else to_binary(datrd)
+            result.append(WBRes(ack=reply, sel=op.sel if op.sel is not None else sel_all, adr=op.adr, datrd=datrd, datwr=op.dat if op.dat is not None else 0,
+                                waitIdle=op.idle, waitStall=waitStall, waitAck=waitAck, cti=op.cti, bte=op.bte))
+
+        if results is not None:
+            def complete(i, reply, datrd, waitStall, waitAck):
+                op = ops[i]
+                perf.add(reply, op.adr, op.dat is not None, op.idle or 0, waitStall, waitAck)
+                results.append(reply, op.sel, op.adr, to_int(datrd, 0), op.dat,
+                               op.idle, waitStall, waitAck, op.cti, op.bte)
+
+        if self.trace is not None or self._events is not None:
+            _complete = complete
+            def complete(i, reply, datrd, waitStall, waitAck):
+                _complete(i, reply, datrd, waitStall, waitAck)
+                op = ops[i]
+                self._record(op.adr, datrd, op.dat, op.sel if op.sel is not None else sel_all, op.dat is not None, reply,
+                             op.idle, waitStall, waitAck, op.cti, op.bte)
+
+        return drive, complete
+
+    async def send_cycle(self, arg, results=None):
         """
         The main sending routine
 
         Args:
             list(WishboneOperations)
+            results: WBResults to append the results to instead of returning
+                a list of WBRes
+
+        Returns:
+            list(WBRes) or <results>
         """
-        cnt = 0
-        clkedge = RisingEdge(self.clock)
-        await clkedge
-        if is_sequence(arg):
-            self._op_cnt = len(arg)
-            if self._op_cnt < 1:
-                self.log.error("List contains no operations to carry out")
-            else:
-                result = []
-                await self._open_cycle()
+        ops = self._check_ops(arg)
+        if len(ops) < 1:
+            await self._tick()
+            self.log.error("List contains no operations to carry out")
+            return [] if results is None else results
+        return await self._enqueue(self._request(ops, results, sync=True))
 
-                for op in arg:
-                    if not isinstance(op, WBOp):
-                        raise TestFailure("Sorry, argument must be a list of WBOp (Wishbone Operation) objects!")    
+    def _request(self, ops, results=None, **kwargs):
+        result = [] if results is None else results
+        drive, complete = self._op_callbacks(ops, result, results)
+        return WBRequest(len(ops), drive, complete, [op.idle for op in ops], [op.acktimeout for op in ops],
+                         result, **kwargs)
 
-                    self._acktimeout = op.acktimeout
+    def _enqueue(self, req):
+        self._queue.push(req)
+        if self._tlm is not None:
+            # no time passes, whoever awaits a request carries out the queue
+            req._serve = self._serve
+        elif self._worker is None:
+            self._worker = cocotb.start_soon(self._serve())
+        return req
 
-                    if op.dat is not None:
-                        we  = 1
-                        dat = op.dat
-                    else:
-                        we  = 0
-                        dat = 0
-                    await self._drive(we, op.adr, dat, op.sel, op.idle, op.cti, op.bte)
-                    if op.sel is not None:
-                        self.log.debug("#%3u WE: %s ADR: 0x%08x DAT: 0x%08x SEL: 0x%1x IDLE: %3u CTI: 0x%03x BTE: 0x%02x" % (cnt, we, op.adr, dat, op.sel, op.idle, op.cti, op.bte))
-                    else:
-                        self.log.debug("#%3u WE: %s ADR: 0x%08x DAT: 0x%08x SEL: None  IDLE: %3u CTI: 0x%03x BTE: 0x%02x" % (cnt, we, op.adr, dat, op.idle, op.cti, op.bte))
-                    cnt += 1
+    def submit(self, ops, results=None, merge=False, priority=0, requester=None):
+        """
+        Queue a cycle without waiting for it
+
+        All cycles of the master, including those of send_cycle() and the
+        block transfers, are carried out by one coroutine owning the bus, in
+        the order chosen by the arbitration of the master. Queued cycles
+        follow each other back-to-back: the next one is opened right after
+        the clock that saw cyc low, instead of after another synchronisation
+        clock as with consecutive send_cycle() calls.
 
-                await self._close_cycle()
-
-                #do pick and mix from result- and auxiliary buffer so we get all operation and meta info
-                for res, aux in zip(self._res_buf, self._aux_buf):
-                    res.datwr       = aux.datwr
-                    res.sel         = aux.sel
-                    res.adr         = aux.adr
-                    res.waitIdle    = aux.waitIdle
-                    res.waitStall   = aux.waitStall
-                    res.waitAck    -= aux.ts
-                    res.cti         = aux.cti
-                    res.bte         = aux.bte
-                    result.append(res)
-
-            return result
+        Args:
+            ops: list of WBOp
+            results: WBResults to append the results to instead of a list
+            merge: the cycle may be carried out in one bus cycle together
+                with the queued cycles next to it that allow merging, too
+            priority: priority of the cycle with "priority" arbitration
+            requester: who submits the cycle, for "round-robin" arbitration
+
+        Returns:
+            WBRequest, await it for the result of the cycle (see send_cycle)
+        """
+        req = self._request(self._check_ops(ops), results, merge=merge, priority=priority, requester=requester)
+        if not req.n:
+            req._finish()
+            return req
+        return self._enqueue(req)
+
+    async def send_cycles(self, cycles, merge=False, results=None, window=4, priority=0, requester=None):
+        """
+        Carry out a stream of cycles back-to-back
+
+        Args:
+            cycles: iterable or async iterable of lists of WBOp
+            merge: allow merging adjacent cycles into one bus cycle
+            results: WBResults to append the results of all cycles to
+            window: number of cycles queued ahead of the bus
+            priority, requester: see submit()
+
+        Returns:
+            list of the results of each cycle or <results>
+        """
+        pending = deque()
+        out = []
+
+        async def queue(ops):
+            pending.append(self.submit(ops, results, merge, priority, requester))
+            if len(pending) > window:
+                res = await pending.popleft()
+                if results is None:
+                    out.append(res)
+
+        if hasattr(cycles, "__aiter__"):
+            async for ops in cycles:
+                await queue(ops)
         else:
-            raise TestFailure("Sorry, argument must be a list of WBOp (Wishbone Operation) objects!")
-            return None
+            for ops in cycles:
+                await queue(ops)
+        while pending:
+            res = await pending.popleft()
+            if results is None:
+                out.append(res)
+        return out if results is None else results
+
+    def _batch_callbacks(self, batch, start, results):
+        """
+        Build the drive and complete callbacks of _run_cycle for the
+        operations of a WBOpBatch from index <start> on, the outcome is
+        appended to the WBResults <results>
+        """
+        adr, we, dat, sel, idle, cti, bte = (getattr(batch, name) for name in batch.columns)
+        perf = self.perf
+        record = self.trace is not None or self._events is not None
+
+        def drive(i):
+            j = start + i
+            self._drive(1 if we[j] else 0, adr[j], dat[j], sel[j], cti[j], bte[j])
+
+        def complete(i, reply, datrd, waitStall, waitAck):
+            j = start + i
+            datwr = dat[j] if we[j] else None
+            perf.add(reply, adr[j], we[j], idle[j] or 0, waitStall, waitAck)
+            results.append(reply, sel[j], adr[j], to_int(datrd, 0), datwr,
+                           idle[j], waitStall, waitAck, cti[j], bte[j])
+            if record:
+                self._record(adr[j], datrd, datwr, sel[j], we[j], reply,
+                             idle[j], waitStall, waitAck, cti[j], bte[j])
+
+        return drive, complete
+
+    async def send_batch(self, batch, results=None, window=4, priority=0, requester=None):
+        """
+        Carry out the cycles of a WBOpBatch back-to-back
+
+        The operations are driven straight from the columns of the batch and
+        their results appended to a WBResults, no object is created per
+        operation.
+
+        Args:
+            batch: WBOpBatch, e.g. from WBStimulus.batches()
+            results: WBResults to append the results to, a new one if None
+            window: number of cycles queued ahead of the bus
+            priority, requester: see submit()
+
+        Returns:
+            <results>
+        """
+        if results is None:
+            results = WBResults(self._width)
+        pending = deque()
+        for idx in range(batch.ncycles):
+            start, end = batch.cycle_range(idx)
+            if end == start:
+                continue
+            drive, complete = self._batch_callbacks(batch, start, results)
+            pending.append(self._enqueue(WBRequest(end - start, drive, complete, batch.idle[start:end], None, results,
+                                                   priority=priority, requester=requester)))
+            if len(pending) > window:
+                await pending.popleft()
+        while pending:
+            await pending.popleft()
+        return results
+
+    def _batch(self):
+        #next request plus the mergeable ones the arbiter picks after it
+        batch = [self._queue.pop()]
+        if batch[0].merge:
+            while len(self._queue) and self._queue.peek().merge:
+                batch.append(self._queue.pop())
+        return batch
+
+    async def _serve(self):
+        """
+        Carry out the queued requests, one bus cycle per batch
+
+        A failing cycle, including a failing events callback, only fails its
+        requests. If serving fails otherwise, the current and all queued
+        requests fail with the exception and the next submitted request
+        starts a new coroutine.
+        """
+        sync = True
+        batch = []
+        try:
+            while len(self._queue):
+                batch = self._batch()
+                await self._serve_batch(batch, sync)
+                sync = False
+        except Exception as e:
+            self.bus.stb.value = 0
+            self.bus.cyc.value = 0
+            self.busy = False
+            self.busy_event.set()
+            for req in batch:
+                if not req.done:
+                    req._finish(e)
+            while len(self._queue):
+                self._queue.pop()._finish(e)
+        finally:
+            self._worker = None
+
+    async def _serve_batch(self, batch, sync):
+        """
+        Carry out the requests of <batch> in one bus cycle
+        """
+        if len(batch) == 1:
+            req = batch[0]
+            n, drive, complete, idles, acktimeouts = req.n, req.drive, req.complete, req.idles, req.acktimeouts
+        else:
+            n = 0
+            idles = []
+            acktimeouts = []
+            table = []  # (request, index in the request) per operation of the bus cycle
+            for req in batch:
+                table.extend((req, i) for i in range(req.n))
+                idles.extend(req.idles or [0] * req.n)
+                acktimeouts.extend(req.acktimeouts or [0] * req.n)
+                n += req.n
+            def drive(i):
+                req, j = table[i]
+                req.drive(j)
+            def complete(i, reply, datrd, waitStall, waitAck):
+                req, j = table[i]
+                req.complete(j, reply, datrd, waitStall, waitAck)
+
+        self._op_cnt = n
+        if sync or batch[0].sync:
+            self._last_edge = None
+            await self._tick()
+        start = self._last_edge
+        failed = None
+        try:
+            await self._open_cycle()
+            await self._run_cycle(n, drive, complete, idles, acktimeouts)
+        except Exception as e:
+            self.bus.stb.value = 0
+            failed = e
+        self.perf.end_cycle(self._cycles(start, self._last_edge))
+        if self.trace is not None:
+            self.trace.end_cycle()
+        # let the callers queue their next cycle while this one closes
+        for req in batch:
+            if not req.sync:
+                req._finish(failed)
+        try:
+            await self._close_cycle()
+        except Exception as e:
+            # cyc is low already, the close event failed
+            failed = failed or e
+        for req in batch:
+            if req.sync:
+                req._finish(failed)
+
+    def _block_burst(self, burst):
+        if burst is None:
+            return hasattr(self.bus, "cti") and not self._pipelined
+        if burst and not hasattr(self.bus, "cti"):
+            raise TestFailure("Wishbone bus doesn't support burst cycles")
+        return burst
+
+    async def _block(self, adr, count, data, out, burst, head=0, tail=None, step=1):
+        """
+        Transfer <count> words from bus address <adr> on, the address goes up
+        by <step> per word. <data> and <out> hold the bytes from lane <head>
+        of the first word to lane <tail> (exclusive) of the last word, the
+        other lanes are disabled in sel.
+        """
+        nbytes = self._width // 8
+        bus = self.bus
+        burst = self._block_burst(burst)
+        errors = []
+        if tail is None:
+            tail = nbytes
+        partial = head != 0 or tail != nbytes
+
+        def lanes(i):
+            # byte lanes of word i in the access and their offset in the buffer
+            lo = head if i == 0 else 0
+            hi = tail if i == count - 1 else nbytes
+            return lo, hi, i * nbytes - head
+
+        def lane_sel(i):
+            lo, hi, _ = lanes(i)
+            return ((1 << hi) - 1) & ~((1 << lo) - 1)
+
+        def drive(i):
+            if i == 0:
+                if burst and self._caps & BTE:
+                    bus.bte.value = 0
+                if self._caps & SEL:
+                    bus.sel.value = lane_sel(0) if partial else self._sel_all
+            elif partial and self._caps & SEL and (i == 1 or i == count - 1):
+                bus.sel.value = lane_sel(i)
+            bus.adr.value = adr + i * step
+            if data is not None:
+                if partial:
+                    lo, hi, pos = lanes(i)
+                    bus.datwr.value = int.from_bytes(data[pos + lo:pos + hi], "little") << (8 * lo)
+                else:
+                    bus.datwr.value = int.from_bytes(data[i * nbytes:(i + 1) * nbytes], "little")
+                bus.we.value = 1
+            elif i == 0:
+                bus.we.value = 0
+            if burst:
+                if i == 0:
+                    bus.cti.value = self.CTI_INC if count > 1 else self.CTI_END
+                elif i == count - 1:
+                    bus.cti.value = self.CTI_END
+
+        def complete(i, reply, datrd, waitStall, waitAck):
+            self.perf.add(reply, adr + i * step, data is not None, 0, waitStall, waitAck)
+            if reply != 1:
+                errors.append((i, reply))
+            elif out is not None:
+                if partial:
+                    lo, hi, pos = lanes(i)
+                    out[pos + lo:pos + hi] = to_int(datrd, 0).to_bytes(nbytes, "little")[lo:hi]
+                else:
+                    out[i * nbytes:(i + 1) * nbytes] = to_int(datrd, 0).to_bytes(nbytes, "little")
+            if self.trace is not None or self._events is not None:
+                cti = 0
+                if burst:
+                    cti = self.CTI_INC if i < count - 1 else self.CTI_END
+                datwr = None
+                if data is not None:
+                    lo, hi, pos = lanes(i)
+                    datwr = int.from_bytes(data[pos + lo:pos + hi], "little") << (8 * lo)
+                self._record(adr + i * step, datrd, datwr, lane_sel(i) if partial else None,
+                             data is not None, reply, 0, waitStall, waitAck, cti, 0)
+
+        await self._enqueue(WBRequest(count, drive, complete, sync=True))
+        if errors:
+            i, reply = errors[0]
+            raise TestFailure("Slave replied %s to block %s at 0x%x (%u of %u beats failed)" %
+                              (self.replyTypes[reply], "write" if data is not None else "read", adr + i * step, len(errors), count))
+
+    async def read_block(self, adr, count, out=None, burst=None):
+        """
+        Read <count> consecutive words starting at bus address <adr>
+
+        The words are stored little endian into one contiguous buffer, no
+        per-word objects are created.
+
+        Args:
+            adr: address of the first word, a byte address with byteaddr
+            count: number of words to read
+            out: writable buffer (bytearray, array.array, NumPy array, ...) to
+                fill, a new bytearray if None
+            burst: use an incrementing burst (cti), by default if the bus has
+                a cti line and the master isn't pipelined
+
+        Returns:
+            the buffer holding the read data
+        """
+        nbytes = self._width // 8
+        if out is None:
+            out = bytearray(count * nbytes)
+        buf = memoryview(out).cast("B")
+        if len(buf) < count * nbytes:
+            raise ValueError("Buffer of %u bytes too small for %u words" % (len(buf), count))
+        if count > 0:
+            await self._block(adr, count, None, buf, burst, step=self._width // 8 if self._byteaddr else 1)
+        return out
+
+    async def write_block(self, adr, data, burst=None):
+        """
+        Write consecutive words starting at bus address <adr>
+
+        Args:
+            adr: address of the first word, a byte address with byteaddr
+            data: bytes-like object (bytes, array.array, NumPy array, ...)
+                holding the little endian words to write
+            burst: use an incrementing burst (cti), by default if the bus has
+                a cti line and the master isn't pipelined
+        """
+        nbytes = self._width // 8
+        buf = memoryview(data).cast("B")
+        if len(buf) % nbytes:
+            raise ValueError("Data length of %u bytes is not a multiple of the %u byte bus width" % (len(buf), nbytes))
+        count = len(buf) // nbytes
+        if count > 0:
+            await self._block(adr, count, buf, None, burst, step=self._width // 8 if self._byteaddr else 1)
+
+    def _byte_access(self, adr, length):
+        """
+        Bus address, number of words and the lanes of the first and last
+        word of an access to <length> bytes at byte address <adr>
+        """
+        nbytes = self._width // 8
+        head = adr % nbytes
+        count = (head + length + nbytes - 1) // nbytes
+        tail = head + length - (count - 1) * nbytes
+        word = adr - head
+        return (word if self._byteaddr else word // nbytes), count, head, tail
+
+    async def read_bytes(self, adr, length, out=None, burst=None):
+        """
+        Read <length> bytes starting at byte address <adr>
+
+        The access needn't be aligned, it is carried out with the fewest bus
+        words. The byte lanes outside of it are disabled in sel of the first
+        and last word, on a bus without sel these words are read whole.
+
+        Args:
+            adr: byte address of the first byte
+            length: number of bytes to read
+            out: writable buffer to fill, a new bytearray if None
+            burst: use an incrementing burst (cti), by default if the bus has
+                a cti line and the master isn't pipelined
+
+        Returns:
+            the buffer holding the read data
+        """
+        if out is None:
+            out = bytearray(length)
+        buf = memoryview(out).cast("B")
+        if len(buf) < length:
+            raise ValueError("Buffer of %u bytes too small for %u bytes" % (len(buf), length))
+        if length > 0:
+            word, count, head, tail = self._byte_access(adr, length)
+            await self._block(word, count, None, buf, burst, head, tail, self._width // 8 if self._byteaddr else 1)
+        return out
+
+    async def write_bytes(self, adr, data, burst=None):
+        """
+        Write a bytes-like object starting at byte address <adr>
+
+        The access needn't be aligned, it is carried out with the fewest bus
+        words, the byte lanes outside of it are disabled in sel of the first
+        and last word.
+
+        Args:
+            adr: byte address of the first byte
+            data: bytes-like object (bytes, array.array, NumPy array, ...)
+            burst: use an incrementing burst (cti), by default if the bus has
+                a cti line and the master isn't pipelined
+        """
+        buf = memoryview(data).cast("B")
+        if len(buf) == 0:
+            return
+        word, count, head, tail = self._byte_access(adr, len(buf))
+        if (head or tail != self._width // 8) and not self._caps & SEL:
+            raise TestFailure("Wishbone bus has no sel line to write the %u bytes at 0x%x" % (len(buf), adr))
+        await self._block(word, count, buf, None, burst, head, tail, self._width // 8 if self._byteaddr else 1)
+
+    async def replay(self, trace, check=False):
+        """
+        Carry out the bus cycles recorded in a trace again
+
+        Args:
+            trace: WBTrace to replay
+            check: compare the replies and read data with the recorded ones
+                and raise TestFailure on the first difference
+
+        Returns:
+            number of replayed cycles
+        """
+        cycles = 0
+        for recs in trace.cycles():
+            ops = [WBOp(rec.adr, rec.datwr if rec.we else None, rec.waitIdle, rec.sel, cti=rec.cti, bte=rec.bte)
+                   for rec in recs]
+            res = await self.send_cycle(ops)
+            if check:
+                for rec, r in zip(recs, res):
+                    if r.ack != rec.ack:
+                        raise TestFailure("Replay of cycle %u: slave replied %s at 0x%x, recorded was %s" %
+                                          (rec.cycle, self.replyTypes[r.ack], rec.adr, self.replyTypes[rec.ack]))
+                    datrd = r.datrd if self._ints else to_int(r.datrd.binstr)
+                    if not rec.we and datrd != rec.datrd:
+                        raise TestFailure("Replay of cycle %u: read %s from 0x%x, recorded was 0x%x" %
+                                          (rec.cycle, r.datrd, rec.adr, rec.datrd))
+            cycles += 1
+        return cycles
@@ -0,0 +1,51 @@
+
+import cocotb
+from cocotb.decorators import public
+from cocotb.utils import get_sim_time
+
+
+def sim_time():
+    """Simulation time in ps, 0 without a simulator, as for models in
+    transaction level mode run from plain Python
+    """
+    return get_sim_time("ps") if cocotb.SIM_NAME is not None else 0
+
+
+@public
+class WBEvent():
+    """Structured record of something that happened on the bus
+
+    Masters and slaves constructed with <events> pass one to the given
+    callable (or sink) when a bus cycle opens or closes and for every
+    completed transfer. The transfer fields are None for open/close events.
+
+    Args:
+        kind: "open", "transfer" or "close"
+        time: simulation time in ps
+        cycle: number of the bus cycle, counting from 0
+    """
+    __slots__ = ("kind", "time", "cycle", "adr", "we", "datrd", "datwr", "sel", "ack",
+                 "waitIdle", "waitStall", "waitAck", "cti", "bte")
+
+    def __init__(self, kind, time, cycle, adr=None, we=None, datrd=None, datwr=None, sel=None, ack=None,
+                 waitIdle=None, waitStall=None, waitAck=None, cti=None, bte=None):
+        self.kind       = kind
+        self.time       = time
+        self.cycle      = cycle
+        self.adr        = adr
+        self.we         = we
+        self.datrd      = datrd
+        self.datwr      = datwr
+        self.sel        = sel
+        self.ack        = ack
+        self.waitIdle   = waitIdle
+        self.waitStall  = waitStall
+        self.waitAck    = waitAck
+        self.cti        = cti
+        self.bte        = bte
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return "WBEvent(%s)" % ", ".join("%s=%r" % (k, v) for k, v in self.to_dict().items() if v is not None)
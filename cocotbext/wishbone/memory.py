@@ -0,0 +1,157 @@
+
+import os
+import mmap
+from cocotb.decorators import public
+
+
+_laneMasks = {}
+
+
+def lane_mask(sel, nbytes):
+    """Mask of the data bits of the byte lanes enabled in <sel>, built once
+    per pattern
+    """
+    mask = _laneMasks.get((sel, nbytes))
+    if mask is None:
+        lanes = bytes(0xff if (sel >> lane) & 1 else 0 for lane in range(nbytes))
+        mask = _laneMasks[(sel, nbytes)] = int.from_bytes(lanes, "little")
+    return mask
+
+
+@public
+class WBMemory():
+    """Sparse, byte addressable memory for Wishbone slave models
+
+    Storage is split into pages which are only allocated when they are
+    written, so even huge address spaces cost nothing until used. Files
+    loaded into the memory are memory mapped and a page is only copied out
+    of the file when it is touched for the first time.
+
+    Args:
+        size: size of the address space in bytes, None for no limit
+        pagesize: size of a storage page in bytes, must be a power of two
+        fill: value of bytes that were never written
+    """
+    def __init__(self, size=None, pagesize=0x10000, fill=0):
+        if pagesize < 1 or pagesize & (pagesize - 1):
+            raise ValueError("pagesize must be a power of two")
+        self.size       = size
+        self._pagesize  = pagesize
+        self._pageshift = pagesize.bit_length() - 1
+        self._blank     = bytes([fill]) * pagesize
+        self._pages     = {}
+        self._mapped    = [] # (start, end, buffer) of lazily loaded images, latest last
+
+    def _check(self, adr, length):
+        if adr < 0 or (self.size is not None and adr + length > self.size):
+            raise IndexError("Access to 0x%x-0x%x is outside of the memory" % (adr, adr + length - 1))
+
+    def _backing(self, start, end):
+        #mapped images overlapping [start, end) in load order
+        return [m for m in self._mapped if m[0] < end and start < m[1]]
+
+    def _page(self, num):
+        #get a page for writing, allocate it on first touch
+        page = self._pages.get(num)
+        if page is None:
+            page = bytearray(self._blank)
+            start = num << self._pageshift
+            end = start + self._pagesize
+            for mstart, mend, buf in self._backing(start, end):
+                lo = max(start, mstart)
+                hi = min(end, mend)
+                page[lo - start:hi - start] = buf[lo - mstart:hi - mstart]
+            self._pages[num] = page
+        return page
+
+    def _chunks(self, adr, length):
+        #split an access into (page number, offset in page, offset in access, length)
+        done = 0
+        while done < length:
+            num = (adr + done) >> self._pageshift
+            off = (adr + done) & (self._pagesize - 1)
+            cnt = min(self._pagesize - off, length - done)
+            yield num, off, done, cnt
+            done += cnt
+
+    def read(self, adr, length):
+        """Read <length> bytes starting at byte address <adr>
+        """
+        self._check(adr, length)
+        data = bytearray(length)
+        for num, off, pos, cnt in self._chunks(adr, length):
+            page = self._pages.get(num)
+            if page is None:
+                start = num << self._pageshift
+                if not self._backing(start + off, start + off + cnt):
+                    if self._blank[0]:
+                        data[pos:pos + cnt] = self._blank[:cnt]
+                    continue
+                page = self._page(num)
+            data[pos:pos + cnt] = page[off:off + cnt]
+        return bytes(data)
+
+    def write(self, adr, data):
+        """Write the bytes-like object <data> starting at byte address <adr>
+        """
+        data = memoryview(data).cast("B")
+        self._check(adr, len(data))
+        for num, off, pos, cnt in self._chunks(adr, len(data)):
+            self._page(num)[off:off + cnt] = data[pos:pos + cnt]
+
+    def read_word(self, adr, nbytes):
+        """Read a little endian word of <nbytes> bytes
+        """
+        return int.from_bytes(self.read(adr, nbytes), "little")
+
+    def write_word(self, adr, value, nbytes, sel=None):
+        """Write a little endian word of <nbytes> bytes, only the byte lanes
+        enabled in <sel> are written. None enables all lanes.
+        """
+        full = (1 << nbytes) - 1
+        if sel is not None and (sel & full) != full:
+            if not sel & full:
+                return
+            mask = lane_mask(sel & full, nbytes)
+            value = (self.read_word(adr, nbytes) & ~mask) | (value & mask)
+        self.write(adr, (value & ((1 << (8 * nbytes)) - 1)).to_bytes(nbytes, "little"))
+
+    def load(self, src, base=0):
+        """Load an image into the memory starting at byte address <base>
+
+        <src> is a bytes-like object, a file name or a file object. Files are
+        memory mapped, their content is copied page by page when touched.
+
+        Returns:
+            the number of bytes loaded
+        """
+        if isinstance(src, (str, os.PathLike)):
+            with open(src, "rb") as f:
+                return self.load(f, base)
+        if hasattr(src, "fileno"):
+            try:
+                fileno = src.fileno()
+            except (OSError, ValueError):
+                fileno = None
+            if fileno is not None:
+                length = os.fstat(fileno).st_size
+                if length == 0:
+                    return 0
+                self._check(base, length)
+                buf = mmap.mmap(fileno, length, access=mmap.ACCESS_READ)
+                self._mapped.append((base, base + length, buf))
+                #pages already in use don't see the image otherwise
+                for num, off, pos, cnt in self._chunks(base, length):
+                    page = self._pages.get(num)
+                    if page is not None:
+                        page[off:off + cnt] = buf[pos:pos + cnt]
+                return length
+            src = src.read()
+        data = memoryview(src).cast("B")
+        self.write(base, data)
+        return len(data)
+
+    def dump(self, base, length):
+        """Return <length> bytes of the memory starting at byte address <base>
+        """
+        return self.read(base, length)
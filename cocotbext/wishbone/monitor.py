@@ -1,31 +1,30 @@
 
-import cocotb
-from itertools import repeat
-from cocotb_bus.monitors    import BusMonitor
-from cocotb.triggers    import RisingEdge
+import weakref
+from array import array
+from collections import deque
+from itertools import chain, repeat
+from cocotb_bus.monitors    import BusMonitor, MonitorStatistics
+from cocotb.log         import SimLog
+from cocotb.triggers    import RisingEdge, Event
 from cocotb.result      import TestFailure
 from cocotb.decorators  import public
-try:
-    from Queue import Queue # Python 2.x
-except ImportError:
-    from queue import Queue
+from .results           import WBResults
+from .sink              import WBStreamSink
+from .trace             import WBTraceWriter
+from .events            import WBEvent, sim_time
+from .stats             import WBStats
+from .profile           import make_profile
+from cocotb.utils       import get_sim_time
+from .signals           import SEL, ERR, STALL, RTY, CTI, BTE, capabilities, bus_width, binstr_reader, to_int, to_binary, as_int, resolve
+from .memory            import lane_mask
 
 
-class WBAux():
-    """Wishbone Auxiliary Wrapper Class, wrap meta informations on bus transaction (internal only)
-    """
-    def __init__(self, sel=0xf, adr=0, datwr=None, waitStall=0, waitIdle=0, tsStb=0):
-        self.adr        = adr
-        self.datwr      = datwr
-        self.sel        = sel
-        self.waitStall  = waitStall
-        self.ts         = tsStb
-        self.waitIdle   = waitIdle
-
 @public
 class WBRes():
     """Wishbone Result Wrapper Class. What's happend on the bus plus meta information on timing
     """
+    __slots__ = ("ack", "sel", "adr", "datrd", "datwr", "waitStall", "waitAck", "waitIdle")
+
     def __init__(self, ack=0, sel=0xf, adr=0, datrd=None, datwr=None,
                  waitIdle=0, waitStall=0, waitAck=0):
         self.ack        = ack
@@ -49,19 +48,105 @@ class WBRes():
          "waitIdle" :self.waitIdle}
 
 
+@public
+class WBBurst():
+    """Wishbone Burst Result Wrapper Class. One record for all beats of a
+    registered feedback burst instead of one WBRes per beat.
+
+    <dat> holds the read data of a read burst or the write data of a write
+    burst, one entry per acknowledged beat. The timing information is the one
+    of the first beat, the following beats are acknowledged back-to-back.
+    """
+    __slots__ = ("ack", "sel", "adr", "we", "cti", "bte", "dat", "waitStall", "waitAck", "waitIdle")
+
+    def __init__(self, ack=1, sel=0xf, adr=0, we=0, cti=2, bte=0,
+                 waitIdle=0, waitStall=0, waitAck=0, width=32):
+        self.ack        = ack
+        self.sel        = sel
+        self.adr        = adr
+        self.we         = we
+        self.cti        = cti
+        self.bte        = bte
+        self.dat        = array("Q") if width <= 64 else []
+        self.waitStall  = waitStall
+        self.waitAck    = waitAck
+        self.waitIdle   = waitIdle
+
+    @property
+    def beats(self):
+        return len(self.dat)
+
+    def to_dict(self):
+        return {
+         "ack"      :self.ack,
+         "sel"      :self.sel,
+         "adr"      :self.adr,
+         "we"       :self.we,
+         "cti"      :self.cti,
+         "bte"      :self.bte,
+         "dat"      :list(self.dat),
+         "waitStall":self.waitStall,
+         "waitAck"  :self.waitAck,
+         "waitIdle" :self.waitIdle}
+
+
+def _discard(transaction):
+    #callback standing in for detached streams, keeps _recvQ empty
+    pass
+
+
 class Wishbone(BusMonitor):
     """Wishbone
     """
 
     _signals = ["cyc", "stb", "we", "adr", "datwr", "datrd", "ack"]
-    _optional_signals = ["sel", "err", "stall", "rty"]
+    _optional_signals = ["sel", "err", "stall", "rty", "cti", "bte"]
     replyTypes = {1 : "ack", 2 : "err", 3 : "rty"}
+    # cycle type identifiers and the number of beats of the burst type extensions
+    CTI_CLASSIC, CTI_CONST, CTI_INC, CTI_END = 0, 1, 2, 7
+    burstWrap = {0 : None, 1 : 4, 2 : 8, 3 : 16}
+    # monitors that only observe the bus don't drive the reply lines
+    _passive = False
+    # coroutines and per clock functions instrumented with profile=True
+    _profiledCoroutines = ("_monitor_recv",)
+    _profiledFunctions = ()
 
     def __init__(self, entity, name, clock, signals_dict=None, **kwargs):
         if signals_dict is not None:
             self._signals=signals_dict
-        self._width = kwargs.pop('width', 32)
+        self._width = kwargs.pop('width', None)
+        self._tlm = kwargs.pop('tlm', False)
+        # before BusMonitor starts _monitor_recv
+        self.profile = make_profile(kwargs.pop('profile', None), name)
+        if self.profile is not None:
+            self.profile.instrument(self, self._profiledCoroutines, self._profiledFunctions)
+        if self._tlm:
+            # no bus, a master in TLM mode calls _tlm_access directly
+            self._width = bus_width(None, self._width)
+            self._open_trace()
+            self.log = SimLog("cocotb.wishbone.%s" % name)
+            self.entity = entity
+            self.name = name
+            self.clock = clock
+            self.bus = None
+            self._caps = SEL | ERR | RTY
+            self._replyLines = {}
+            # what Monitor.__init__ sets up, without _monitor_recv: nothing
+            # here needs the scheduler, so this mode runs without a simulator
+            self._event = kwargs.get('event')
+            self._wait_event = Event()
+            self._recvQ = deque()
+            self._callbacks = []
+            self.stats = MonitorStatistics()
+            self._thread = None
+            if kwargs.get('callback') is not None:
+                self.add_callback(kwargs['callback'])
+            return
         BusMonitor.__init__(self, entity, name, clock, **kwargs)
+        self._width = bus_width(self.bus, self._width)
+        self._open_trace()
+        if self._passive:
+            return
         # Drive some sensible defaults (setimmediatevalue to avoid x asserts)
         self.bus.ack.setimmediatevalue(0)
         self.bus.datrd.setimmediatevalue(0)
@@ -72,193 +157,643 @@ class Wishbone(BusMonitor):
         if hasattr(self.bus, "rty"):
             self.bus.rty.setimmediatevalue(0)
 
+    def _open_trace(self):
+        #a trace given by file name is written once the bus width is known
+        trace = getattr(self, "trace", None)
+        if trace is not None and not isinstance(trace, WBTraceWriter):
+            self.trace = WBTraceWriter(trace, self._width)
+
+    def add_sink(self, sink):
+        """Pass every transaction to <sink>. As with callbacks, _recvQ isn't
+        populated any more once a sink is added.
+        """
+        self.add_callback(sink.put)
+        return sink
+
+    def transactions(self, maxlen=1024):
+        """Return an async iterator over the transactions from now on::
+
+            async for transaction in slave.transactions():
+                ...
+
+        At most <maxlen> transactions are buffered for a slow consumer. The
+        iterator stops getting transactions once it is closed or no longer
+        referenced, e.g. after the consumer left the loop.
+        """
+        stream = WBStreamSink(maxlen)
+        ref = weakref.ref(stream)
+
+        def put(transaction):
+            sink = ref()
+            if sink is None:
+                detach()
+            else:
+                sink.put(transaction)
+
+        def detach():
+            #_recv may be iterating over the callbacks, replace the list. Without
+            # any callback left the transactions would pile up in _recvQ again
+            self._callbacks = [cb for cb in self._callbacks if cb is not put] or [_discard]
+
+        stream._detach = detach
+        self.add_callback(put)
+        return stream
+
+    def _burst_next(self, adr, cti, bte):
+        """Predict the address of the beat following <adr> in a burst
+        """
+        if cti == self.CTI_CONST:
+            return adr
+        inc = self._width // 8 if self._byteaddr else 1
+        wrap = self.burstWrap.get(bte)
+        if wrap is None:
+            return adr + inc
+        span = wrap * inc
+        return (adr & ~(span - 1)) | ((adr + inc) & (span - 1))
+
+    def _init_sampling(self):
+        """Resolve the optional lines and the readers of the sampled lines
+        once, called by _monitor_recv before it touches the bus
+        """
+        bus = self.bus
+        self._caps = capabilities(bus)
+        self._rd_cyc   = binstr_reader(bus.cyc)
+        self._rd_stb   = binstr_reader(bus.stb)
+        self._rd_we    = binstr_reader(bus.we)
+        self._rd_adr   = binstr_reader(bus.adr)
+        self._rd_datwr = binstr_reader(bus.datwr)
+        self._rd_sel   = binstr_reader(bus.sel) if self._caps & SEL else None
+        self._rd_stall = binstr_reader(bus.stall) if self._caps & STALL else None
+        self._rd_cti   = binstr_reader(bus.cti) if self._caps & CTI else None
+        self._rd_bte   = binstr_reader(bus.bte) if self._caps & BTE else None
+        # lines a reply of each type is signalled on
+        self._replyLines = {1 : bus.ack}
+        if self._caps & ERR:
+            self._replyLines[2] = bus.err
+        if self._caps & RTY:
+            self._replyLines[3] = bus.rty
+        replied = [binstr_reader(line) for line in self._replyLines.values()]
+        if len(replied) == 1:
+            ack = replied[0]
+            self._replied = lambda: ack() == "1"
+        else:
+            self._replied = lambda: any(line() == "1" for line in replied)
+
 
 class WishboneSlave(Wishbone):
     """Wishbone slave
+
+    All per-clock work (stall generation, cycle counting, replies and
+    recording) is done by a single coroutine. While no cycle is open it
+    doesn't wake up on the clock at all but waits for the master to raise cyc.
+
+    Registered feedback bursts (constant address, linear and wrap-4/8/16
+    incrementing, signalled on cti/bte) are recognised: the slave predicts
+    the address of the next beat and acknowledges it back-to-back with
+    prefetched read data as long as no wait cycles are requested for it.
+    A burst is recorded as one WBBurst.
+
+    If the bus has a stall line the slave takes a new request on every clock
+    it doesn't stall, while earlier ones still wait for their reply. Each
+    reply is due <waitreplygen> clocks after its request was taken, but not
+    before the reply to the previous request, so the latencies of
+    outstanding requests overlap instead of adding up.
+
+    Args:
+        datgen: generator for the read data
+        ackgen: generator for the reply type (1 ack, 2 err, 3 rty)
+        waitreplygen: generator for the clock cycles to wait before replying
+        waitstallgen: generator of (stalled, not stalled) clock cycle tuples
+
+    Any iterable works for the generators, see the seeded timing profiles of
+    cocotbext.wishbone.timing (WBUniform, WBGeometric, WBBurstStall, ...).
+        memory: WBMemory answering reads and storing writes instead of <datgen>
+        decoder: WBDecoder answering each access from the target its address
+            falls into, with the latency and reply policy of the target
+        byteaddr: the address bus carries byte addresses instead of word indices
+        width: size of the data bus in bits, a power of two like 32, 64 or
+            128, None to take it from the datwr line (32 in TLM mode).
+            Writes to the memory or decoder only change the byte lanes
+            enabled in sel.
+        columnar: record the transfers of a cycle in a WBResults instead of a
+            list of WBRes/WBBurst objects, each burst beat is a row
+        sink: WBSink or list of sinks the transactions are passed to instead
+            of keeping them all in _recvQ
+        trace: WBTraceWriter or file name to record all transfers to
+        events: callable or WBSink getting a WBEvent when a cycle opens or
+            closes and for every transfer, None disables the events
+        ints: record adr, sel and datwr as int instead of BinaryValue, None
+            if the value isn't resolvable
+        regions: address ranges to break the statistics in <perf> down by,
+            see WBStats
+        tlm: transaction level mode, the slave has no bus but is passed to
+            a WishboneMaster constructed with tlm=<slave>, which hands it
+            the requests directly. The generators and the memory or decoder
+            answer them as usual, stalls and wait cycles are only counted.
+            adr, sel and datwr are recorded as int.
+        profile: count the wakeups and Python time of _monitor_recv and the
+            per clock functions in a WBProfile, True or the WBProfile to use
     """
+    _profiledFunctions = ("_stall", "_ack", "_clk_cycle_counter", "_respond", "_idle", "_confirm",
+                          "_speculate", "_access_memory", "_tlm_access")
 
     def bitSeqGen(self, tupleGen):
-        while True:
-            [highCnt, lowCnt] = next(tupleGen)
-            #make sure there's at least one low cycle in here
-            if lowCnt < 1:
-                lowCnt = 1
-            bits = []
-            for i in range(0, highCnt):
-                bits.append(1)
-            for i in range(0, lowCnt):
-                bits.append(0)
-            for bit in bits:
-                yield bit
+        """Expand (high, low) clock cycle tuples into one bit per clock
+        """
+        #make sure there's at least one low cycle in each tuple
+        return chain.from_iterable(chain(repeat(1, highCnt), repeat(0, max(lowCnt, 1)))
+                                   for highCnt, lowCnt in tupleGen)
 
     def __init__(self, entity, name, clock, **kwargs):
         datGen = kwargs.pop('datgen', None)
         ackGen = kwargs.pop('ackgen', None)
         waitAckGen = kwargs.pop('waitreplygen', None)
         waitStallGen = kwargs.pop('waitstallgen', None)
+        self._memory = kwargs.pop('memory', None)
+        self._decoder = kwargs.pop('decoder', None)
+        if self._decoder is not None:
+            if self._memory is not None:
+                raise ValueError("A slave takes either a memory or a decoder")
+            self._memory = self._decoder
+        self._byteaddr = kwargs.pop('byteaddr', False)
+        self._columnar = kwargs.pop('columnar', False)
+        sinks = kwargs.pop('sink', None)
+        self.trace = kwargs.pop('trace', None)
+        events = kwargs.pop('events', None)
+        self._events = getattr(events, "put", events)
+        self._cycle_num = 0
+        self._opened = False
+        self._value = to_int if kwargs.pop('ints', False) else to_binary
+        self.perf = WBStats(kwargs.pop('regions', None))
+        self._openClk = None    # value of _clk when the open cycle was seen first
+        self._tlmClocks = 0     # clocks of the open cycle in TLM mode
         #init instance variables
         self._acked_ops      = 0  # ack cntr. wait for equality with
                                   # number of Ops before releasing lock
-        self._reply_Q        = Queue() # save datwr, sel, idle
-        self._res_buf        = [] # save readdata/ack/err/rty
+        self._replies        = deque() # (due clock, reply, datrd), in due order
+        self._clk            = 0       # clocks the slave was awake for
+        self._lastDue        = 0       # due clock of the latest scheduled reply
+        self._res_buf        = None    # save readdata/ack/err/rty, once the bus width is known
         self._clk_cycle_count = 0
         self._cycle          = False
         self._lastTime       = 0
         self._stallCount     = 0
+        self._stalled        = False
+        self._replying       = False # reply lines are asserted
+        self._burst          = None  # WBBurst of the running burst
+        self._burstAdr       = 0     # address expected for the next beat
+        self._burstWaitAck   = None  # wait cycles already drawn for the next beat
+        self._spec           = None  # reply sent for a beat the master hasn't shown yet
 
         #init instance generators
         self._datGen            = repeat(int(0))
         if datGen is not None:
-            self._datGen        = datGen
+            self._datGen        = iter(datGen)
         self._ackGen            = repeat(int(1))
         if ackGen is not None:
-            self._ackGen        = ackGen
+            self._ackGen        = iter(ackGen)
         self._waitAckGen        = repeat(int(0))
         if waitAckGen is not None:
-            self._waitAckGen    = waitAckGen
+            self._waitAckGen    = iter(waitAckGen)
         self._waitStallGen      = repeat(int(0))
         if waitStallGen is not None:
             self._waitStallGen  = self.bitSeqGen(waitStallGen)
 
         Wishbone.__init__(self, entity, name, clock, **kwargs)
-        cocotb.start_soon(self._stall())
-        cocotb.start_soon(self._clk_cycle_counter())
-        cocotb.start_soon(self._ack())
+        self._res_buf = self._new_res_buf(self._width)
+        if sinks is not None:
+            for sink in (sinks if isinstance(sinks, (list, tuple)) else [sinks]):
+                self.add_sink(sink)
 
-    async def _clk_cycle_counter(self):
-        """
+    def _new_res_buf(self, width):
+        return WBResults(width) if self._columnar else []
+
+    def _clk_cycle_counter(self):
+        """Count the clock cycles of the open bus cycle
         """
-        clkedge = RisingEdge(self.clock)
-        self._clk_cycle_count = 0
-        while True:
-            if self._cycle:
-                self._clk_cycle_count += 1
-            else:
-                self._clk_cycle_count = 0
-            await clkedge
+        if self._cycle:
+            self._clk_cycle_count += 1
+        else:
+            self._clk_cycle_count = 0
 
-    async def _stall(self):
-        clkedge = RisingEdge(self.clock)
-        # if stall drops, keep the value for one more clock cycle
-        while True:
-            if hasattr(self.bus, "stall"):
-                tmpStall = next(self._waitStallGen)
+    def _stall(self):
+        """Drive the stall line for the next clock cycle
+        """
+        if self._caps & STALL:
+            if self._spec is not None:
+                # don't stall a beat we already acknowledged
+                if self._stalled:
+                    self.bus.stall.value = 0
+                    self._stalled = False
+                return
+            # a stall run ends once a low stall cycle has passed
+            if not self._stalled:
+                self._stallCount = 0
+            tmpStall = next(self._waitStallGen)
+            if bool(tmpStall) != self._stalled:
                 self.bus.stall.value = tmpStall
-                if bool(tmpStall):
-                    self._stallCount += 1
-                    await clkedge
-                else:
-                    await clkedge
-                    self._stallCount = 0
-            else:
-                break
+            self._stalled = bool(tmpStall)
+            if self._stalled:
+                self._stallCount += 1
 
-    async def _ack(self):
-        clkedge = RisingEdge(self.clock)
-        while True:
+    def _schedule(self, reply, datrd, waitAck):
+        """Queue a reply for the request taken in this clock, due after
+        <waitAck> wait cycles and after the reply to the previous request
+        """
+        due = max(self._clk + 1 + waitAck, self._lastDue + 1)
+        self._lastDue = due
+        self._replies.append((due, reply, datrd))
+
+    def _ack(self):
+        """Drive the reply lines for the next clock cycle
+        """
+        self._clk += 1
+        if self._replying:
             #set defaults
             self.bus.ack.value = 0
             self.bus.datrd.value = 0
-            if hasattr(self.bus, "err"):
+            if self._caps & ERR:
                 self.bus.err.value = 0
-            if hasattr(self.bus, "rty"):
+            if self._caps & RTY:
                 self.bus.rty.value = 0
+            self._replying = False
+
+        replies = self._replies
+        if not replies or replies[0][0] > self._clk:
+            return
+        _, ack, datrd = replies.popleft()
+        #check if the signal we want to assign exists and assign
+        line = self._replyLines.get(ack)
+        if line is None:
+            raise TestFailure("Tried to assign <%s> (%u) to slave reply, but this slave does not have a <%s> line" % (self.replyTypes[ack], ack, self.replyTypes[ack]))
+        line.value = 1
+        self.bus.datrd.value = datrd
+        self._replying = True
+
+    def _access_memory(self, adr=None, we=None):
+        """Carry out the presented request on the memory model, return the read data
+        """
+        nbytes = self._width // 8
+        if adr is None:
+            adr = self._request_adr(self._rd_adr())
+        if we is None:
+            we = self._rd_we() == "1"
+        if not we:
+            return self._memory.read_word(self._mem_adr(adr), nbytes)
+        sel = None
+        if self._caps & SEL:
+            sel, undefined = resolve(self._rd_sel())
+            if undefined:
+                raise TestFailure("Master presented sel %s with X/Z bits on %s when writing 0x%x" %
+                                  (self._rd_sel(), self.name, adr))
+        #the byte lanes sel doesn't enable are don't care
+        datwr, undefined = resolve(self._rd_datwr())
+        if undefined & lane_mask(sel if sel is not None else (1 << nbytes) - 1, nbytes):
+            raise TestFailure("Master wrote %s with X/Z bits in the selected byte lanes on %s at 0x%x" %
+                              (self._rd_datwr(), self.name, adr))
+        self._memory.write_word(self._mem_adr(adr), datwr, nbytes, sel)
+        return 0
+
+    def _request_adr(self, adr):
+        """Address of a request taken with the address lines at <adr>, a
+        binary string
+        """
+        value = to_int(adr)
+        if value is None:
+            raise TestFailure("Master presented address %s with X/Z bits on %s" % (adr, self.name))
+        return value
 
-            if not self._reply_Q.empty():
-                #get next reply from queue
-                rep = self._reply_Q.get_nowait()
-
-                #wait <waitAck> clock cycles before replying
-                if rep.waitAck is not None:
-                    waitcnt = rep.waitAck
-                    while waitcnt > 0:
-                        waitcnt -= 1
-                        await clkedge
-
-                #check if the signal we want to assign exists and assign
-                if not hasattr(self.bus, self.replyTypes[rep.ack]):
-                    raise TestFailure("Tried to assign <%s> (%u) to slave reply, but this slave does not have a <%s> line" % (self.replyTypes[rep.ack], rep.ack, self.replyTypes[rep.ack]))
-                if self.replyTypes[rep.ack]    == "ack":
-                    self.bus.ack.value = 1
-                elif self.replyTypes[rep.ack]  == "err":
-                    self.bus.err.value = 1
-                elif self.replyTypes[rep.ack]  == "rty":
-                    self.bus.rty.value = 1
-                self.bus.datrd.value = rep.datrd
-            await clkedge
+    def _mem_adr(self, adr):
+        """Byte address of the word bus address <adr> points to
+        """
+        nbytes = self._width // 8
+        if self._byteaddr:
+            return adr & ~(nbytes - 1)
+        return adr * nbytes
+
+    def _policy(self, adr):
+        """Generators of the wait cycles and the reply type for an access to
+        <adr>, from the target the decoder maps it to
+        """
+        if self._decoder is None:
+            return self._waitAckGen, self._ackGen
+        target = self._decoder.lookup(self._mem_adr(adr))
+        return (target.latency if target.latency is not None else self._waitAckGen,
+                target.reply if target.reply is not None else self._ackGen)
+
+    def _burst_type(self):
+        #masters without bursts may leave cti and bte undriven
+        cti = to_int(self._rd_cti(), self.CTI_CLASSIC) if self._caps & CTI else self.CTI_CLASSIC
+        bte = to_int(self._rd_bte(), 0) if self._caps & BTE else 0
+        return cti, bte
+
+    def _record_op(self, reply, sel, adr, rd, wr, cti, bte, waitIdle, waitStall, waitAck):
+        """Pass a transfer to the trace and the event callback
+        """
+        adr = as_int(adr, 0)
+        rd = as_int(rd, 0)
+        wr = None if wr is None else as_int(wr, 0)
+        sel = None if sel is None else as_int(sel, 0)
+        time = sim_time()
+        if self.trace is not None:
+            self.trace.append(adr, rd, wr, sel, wr is not None, reply, waitIdle, waitStall, waitAck, cti, bte, time)
+        if self._events is not None:
+            self._events(WBEvent("transfer", time, self._cycle_num, adr, wr is not None, rd, wr, sel, reply,
+                                 waitIdle, waitStall, waitAck, cti, bte))
+
+    def _burst_beat(self, reply, sel, rd, wr, cti, bte, waitIdle=0, waitStall=0, waitAck=0):
+        """Record a beat of the running burst, end it if it was the last one
+        """
+        burst = self._burst
+        self.perf.add(reply, self._burstAdr, wr is not None, waitIdle, waitStall, waitAck)
+        if self.trace is not None or self._events is not None:
+            self._record_op(reply, sel, self._burstAdr, rd, wr, cti, bte, waitIdle, waitStall, waitAck)
+        if self._columnar:
+            self._res_buf.append(reply, None if sel is None else as_int(sel, 0), self._burstAdr, as_int(rd, 0),
+                                 None if wr is None else as_int(wr, 0), waitIdle, waitStall, waitAck, cti, bte)
+        else:
+            burst.dat.append(as_int(wr, 0) if burst.we else as_int(rd, 0))
+            if reply != 1:
+                burst.ack = reply
+        if reply != 1 or cti not in (self.CTI_CONST, self.CTI_INC):
+            self._burst = None
+            return
+        self._burstAdr = self._burst_next(self._burstAdr, burst.cti, burst.bte)
+
+    def _speculate(self):
+        """Reply to the next beat of the running burst before the master shows it
+
+        With registered feedback the slave knows from cti that another beat
+        follows and which address it has, so it can acknowledge it in the
+        cycle the master presents it.
+        """
+        if self._burst is None or self._burstWaitAck is not None:
+            return
+        waitAckGen, ackGen = self._policy(self._burstAdr)
+        waitAck = next(waitAckGen)
+        if waitAck:
+            # the beat gets wait states, handle it when the master shows it
+            self._burstWaitAck = waitAck
+            return
+        reply = next(ackGen)
+        if reply not in self.replyTypes:
+            raise TestFailure("Tried to assign unknown reply type (%u) to slave reply. Valid is 1-3 (ack, err, rty)" %  reply)
+        rd = 0
+        if not self._burst.we:
+            #prefetch the read data
+            if self._memory is not None:
+                rd = self._access_memory(self._burstAdr, False)
+            else:
+                rd = next(self._datGen)
+        self._schedule(reply, rd, 0)
+        self._spec = (reply, rd)
+
+    def _confirm(self):
+        """Check the master presented the beat we replied to in advance
+        """
+        rep = self._spec
+        self._spec = None
+        burst = self._burst
+        valid = (self._rd_cyc() == "1" and self._rd_stb() == "1" and
+                 (self._rd_we() == "1") == bool(burst.we) and to_int(self._rd_adr()) == self._burstAdr)
+        if not valid:
+            self.log.warning("Master left the burst at 0x%x, acknowledged a beat it didn't present", self._burstAdr)
+            self._burst = None
+            return False
+        cti, bte = self._burst_type()
+        if self._memory is not None and burst.we:
+            self._access_memory()
+        wr = self._value(self._rd_datwr()) if burst.we else None
+        sel = self._value(self._rd_sel()) if self._caps & SEL else None
+        self._lastTime = self._clk_cycle_count
+        self._burst_beat(rep[0], sel, rep[1], wr, cti, bte)
+        return True
 
     def _respond(self):
-        valid = self.bus.cyc.value and self.bus.stb.value
+        valid = self._rd_cyc() == "1" and self._rd_stb() == "1"
         #if there is a stall signal, take it into account
-        if hasattr(self.bus, "stall"):
-            valid = valid and not self.bus.stall.value
+        if self._rd_stall is not None:
+            valid = valid and self._rd_stall() != "1"
 
         if valid:
+            cti, bte = self._burst_type()
+            we = self._rd_we() == "1"
+            adr = self._rd_adr()
+            #continuing a burst?
+            beat = (self._burst is not None and to_int(adr) == self._burstAdr and
+                    we == bool(self._burst.we))
+            if self._burst is not None and not beat:
+                self._burst = None
+            if self._decoder is not None:
+                waitAckGen, ackGen = self._policy(self._request_adr(adr))
+            else:
+                waitAckGen, ackGen = self._waitAckGen, self._ackGen
             #wait before replying ?
-            waitAck = next(self._waitAckGen)
+            if beat and self._burstWaitAck is not None:
+                waitAck = self._burstWaitAck
+            else:
+                waitAck = next(waitAckGen)
+            self._burstWaitAck = None
             #Response: rddata/don't care
-            if not self.bus.we.value:
+            if self._memory is not None:
+                rd = self._access_memory(self._request_adr(adr), we)
+            elif not we:
                 rd = next(self._datGen)
             else:
                 rd = 0
 
             #Response: ack/err/rty
-            reply = next(self._ackGen)
+            reply = next(ackGen)
             if reply not in self.replyTypes:
                 raise TestFailure("Tried to assign unknown reply type (%u) to slave reply. Valid is 1-3 (ack, err, rty)" %  reply)
 
             wr = None
-            if self.bus.we.value:
-                wr = self.bus.datwr.value
+            if we:
+                wr = self._value(self._rd_datwr())
 
             #get the time the master idled since the last operation
             #TODO: subtract our own stalltime or, if we're not pipelined, time since last ack
             idleTime = self._clk_cycle_count - self._lastTime -1
-            _sel = self.bus.sel.value if hasattr(self.bus, "sel") else None
-            res = WBRes(ack=reply, sel=_sel, adr=self.bus.adr.value, datrd=rd, datwr=wr,
-                        waitIdle=idleTime, waitStall=self._stallCount, waitAck=waitAck)
-
-            #add whats going to happen to the result buffer
-            self._res_buf.append(res)
-            #add it to the reply queue for assignment. we need to process
-            # ops every cycle, so we can't do the <waitreply> delay here
-            self._reply_Q.put(res)
+            _sel = self._value(self._rd_sel()) if self._rd_sel is not None else None
+            _adr = self._value(adr)
+
+            if not beat and cti in (self.CTI_CONST, self.CTI_INC) and reply == 1:
+                #first beat of a burst, record the whole burst in one go
+                self._burst = WBBurst(ack=reply, sel=_sel, adr=_adr, we=int(we), cti=cti, bte=bte,
+                                      waitIdle=idleTime, waitStall=self._stallCount, waitAck=waitAck, width=self._width)
+                self._burstAdr = to_int(adr, 0)
+                if not self._columnar:
+                    self._res_buf.append(self._burst)
+                beat = True
+            if beat:
+                self._burst_beat(reply, _sel, rd, wr, cti, bte, idleTime, self._stallCount, waitAck)
+            else:
+                self.perf.add(reply, to_int(adr, 0), we, idleTime, self._stallCount, waitAck)
+                if self.trace is not None or self._events is not None:
+                    self._record_op(reply, _sel, _adr, rd, wr, cti, bte, idleTime, self._stallCount, waitAck)
+                if self._columnar:
+                    self._res_buf.append(reply, None if _sel is None else as_int(_sel, 0), as_int(_adr, 0), as_int(rd, 0),
+                                         None if wr is None else as_int(wr, 0), idleTime, self._stallCount, waitAck, cti, bte)
+                else:
+                    #add whats going to happen to the result buffer
+                    self._res_buf.append(WBRes(ack=reply, sel=_sel, adr=_adr, datrd=rd, datwr=wr,
+                                               waitIdle=idleTime, waitStall=self._stallCount, waitAck=waitAck))
+            #schedule the reply. we need to process ops every cycle, so we
+            # can't do the <waitreply> delay here
+            self._schedule(reply, rd, waitAck)
             self._lastTime = self._clk_cycle_count
+        return valid
+
+    def _idle(self):
+        """No cycle open and nothing left to reply, safe to stop clocking
+        """
+        if self._cycle or self._replies or self._replying or self._spec is not None:
+            return False
+        return self._rd_cyc() != "1"
+
+    def _tlm_access(self, adr, we, datwr, sel, idle):
+        """Answer a request of a master in TLM mode, in the order _respond does
+
+        Returns:
+            (reply, datrd, stall cycles, wait cycles)
+        """
+        if not self._opened:
+            if self._events is not None:
+                self._events(WBEvent("open", sim_time(), self._cycle_num))
+            self._opened = True
+        waitStall = 0
+        while next(self._waitStallGen):
+            waitStall += 1
+        waitAckGen, ackGen = self._policy(adr)
+        waitAck = next(waitAckGen)
+        if self._memory is not None:
+            nbytes = self._width // 8
+            if we:
+                self._memory.write_word(self._mem_adr(adr), datwr, nbytes, sel)
+                rd = 0
+            else:
+                rd = self._memory.read_word(self._mem_adr(adr), nbytes)
+        elif not we:
+            rd = next(self._datGen)
+        else:
+            rd = 0
+        reply = next(ackGen)
+        if reply not in self.replyTypes:
+            raise TestFailure("Tried to assign unknown reply type (%u) to slave reply. Valid is 1-3 (ack, err, rty)" %  reply)
+        self.perf.add(reply, adr, we, idle, waitStall, waitAck)
+        self._tlmClocks += idle + waitStall + waitAck + 2
+        if self.trace is not None or self._events is not None:
+            self._record_op(reply, sel, adr, rd, datwr, self.CTI_CLASSIC, 0, idle, waitStall, waitAck)
+        if self._columnar:
+            self._res_buf.append(reply, sel, adr, rd, datwr, idle, waitStall, waitAck, self.CTI_CLASSIC, 0)
+        else:
+            self._res_buf.append(WBRes(ack=reply, sel=sel, adr=adr, datrd=rd, datwr=datwr,
+                                       waitIdle=idle, waitStall=waitStall, waitAck=waitAck))
+        return reply, rd, waitStall, waitAck
+
+    def _tlm_close(self):
+        """End the cycle of a master in TLM mode
+        """
+        if not self._opened:
+            return
+        self.perf.end_cycle(self._tlmClocks)
+        self._tlmClocks = 0
+        self._recv(self._res_buf)
+        if self.trace is not None:
+            self.trace.end_cycle()
+        if self._events is not None:
+            self._events(WBEvent("close", sim_time(), self._cycle_num))
+        self._cycle_num += 1
+        self._opened = False
+        self._res_buf = self._new_res_buf(self._width)
+
+    def _end_cycle(self):
+        """Pass on the transfers of the cycle the master closed, drop the
+        replies it didn't wait for
+        """
+        self.perf.end_cycle(self._clk - (self._openClk if self._openClk is not None else self._clk))
+        self._openClk = None
+        self._recv(self._res_buf)
+        if self.trace is not None:
+            self.trace.end_cycle()
+        if self._events is not None:
+            self._events(WBEvent("close", get_sim_time("ps"), self._cycle_num))
+        self._cycle_num += 1
+        self._opened = False
+        self._replies.clear()
+        self._lastDue = self._clk
+        self._res_buf = self._new_res_buf(self._width)
+        self._cycle = False
+        self._burst = None
+        self._burstWaitAck = None
 
     async def _monitor_recv(self):
+        if self._tlm:
+            return
+        self._init_sampling()
         clkedge = RisingEdge(self.clock)
+        cycedge = RisingEdge(self.bus.cyc)
+        rd_cyc  = self._rd_cyc
+        rd_stb  = self._rd_stb
+        # with a stall line requests are taken while earlier ones wait for
+        # their reply, classic slaves see the request until they reply
+        pipelined = self._rd_stall is not None
+        waitReply = 0   # requests taken and not replied yet
         #respond and notify the callback function
         while True:
+            if self._idle():
+                # the next cycle starts with a freshly drawn stall
+                if self._stalled:
+                    self.bus.stall.value = 0
+                    self._stalled = False
+                await cycedge
+                self._stall()
 
-            while self.bus.stb.value.binstr != '1':
-                # Permission 3.05: MASTER interfaces MAY assert [CYC_O] indefinitely.
-                # i.e after [STB_O] was negated.
-                try:
-                    if self._cycle == 1 and self.bus.cyc.value == 0:
-                        self._recv(self._res_buf)
-                        self._reply_Q.queue.clear()
-                        self._res_buf = []
-                        self._cycle = 0
-                except ValueError:
-                    pass
-
-                await clkedge
-            try:
-                if self._cycle == 0 and self.bus.cyc.value == 1:
-                    self._lastTime = self._clk_cycle_count -1
-            except ValueError:
-                pass
-
-            self._respond()
-            # wait for response
-            while self.bus.ack.value.binstr != '1':
-                if hasattr(self.bus, "err"):
-                    if self.bus.err.value.binstr == '1':
-                        break
-                if hasattr(self.bus, "rty"):
-                    if self.bus.rty.value.binstr == '1':
-                        break
-                await clkedge
-
-            self._cycle = self.bus.cyc.value
             await clkedge
+
+            if self._spec is not None and self._confirm():
+                # burst beat acknowledged back-to-back, the next one is due
+                self._speculate()
+            elif waitReply and not pipelined:
+                # wait for response
+                if self._replied():
+                    waitReply = 0
+                    self._speculate()
+                elif rd_cyc() != "1":
+                    # the master gave up on the reply
+                    self._end_cycle()
+                    waitReply = 0
+            else:
+                if waitReply and self._replied():
+                    waitReply -= 1
+                    # a master waiting for the reply may continue a burst
+                    if rd_stb() != "1":
+                        self._speculate()
+                if rd_stb() != "1":
+                    # Permission 3.05: MASTER interfaces MAY assert [CYC_O] indefinitely.
+                    # i.e after [STB_O] was negated.
+                    if self._cycle and rd_cyc() == "0":
+                        self._end_cycle()
+                        waitReply = 0
+                else:
+                    if not self._cycle and rd_cyc() == "1":
+                        if self._openClk is None:
+                            self._openClk = self._clk
+                        self._lastTime = self._clk_cycle_count -1
+                        if self._events is not None and not self._opened:
+                            self._events(WBEvent("open", get_sim_time("ps"), self._cycle_num))
+                            self._opened = True
+
+                    # a stalled request is presented again on the next clock
+                    if self._respond():
+                        self._cycle = True
+                        if pipelined:
+                            waitReply += 1
+                        elif self._replied():
+                            self._speculate()
+                        else:
+                            waitReply = 1
+
+            self._stall()
+            self._clk_cycle_counter()
+            self._ack()
@@ -0,0 +1,140 @@
+
+from time import perf_counter
+from cocotb.decorators import public
+
+
+def make_profile(profile, name):
+    """WBProfile for the profile option of a component, None if disabled
+    """
+    if not profile:
+        return None
+    return profile if isinstance(profile, WBProfile) else WBProfile(name)
+
+
+class _Steps():
+    """Awaitable running a coroutine and timing each step of it, a step being
+    everything from one wakeup to the next await that suspends it
+    """
+    __slots__ = ("coro", "entry")
+
+    def __init__(self, coro, entry):
+        self.coro   = coro
+        self.entry  = entry
+
+    def __await__(self):
+        entry   = self.entry
+        steps   = self.coro.__await__()
+        value   = None
+        error   = None
+        while True:
+            start = perf_counter()
+            try:
+                trigger = steps.send(value) if error is None else steps.throw(error)
+            except StopIteration as done:
+                entry[0] += 1
+                entry[1] += perf_counter() - start
+                return done.value
+            except BaseException:
+                entry[0] += 1
+                entry[1] += perf_counter() - start
+                raise
+            entry[0] += 1
+            entry[1] += perf_counter() - start
+            try:
+                value = yield trigger
+                error = None
+            except GeneratorExit:
+                steps.close()
+                raise
+            except BaseException as e:
+                value = None
+                error = e
+
+
+@public
+class WBProfile():
+    """Wakeup counts and Python wall time of the coroutines and per clock
+    functions of a bus model
+
+    Master, slave and sniffer fill one when constructed with profile=True
+    (or a WBProfile to share it), in their <profile> attribute. Coroutines
+    count a wakeup each time they are resumed, functions each call. Times
+    include what a coroutine or function calls, so nested entries overlap.
+    Without the option nothing is instrumented.
+
+    Args:
+        name: name of the profiled component, for the summary
+    """
+    def __init__(self, name=None):
+        self.name       = name
+        self._entries   = {}    # name -> [wakeups or calls, seconds]
+        self._kinds     = {}    # name -> "coroutine" or "function"
+
+    def _entry(self, name, kind):
+        entry = self._entries.get(name)
+        if entry is None:
+            entry = self._entries[name] = [0, 0.0]
+            self._kinds[name] = kind
+        return entry
+
+    def coroutine(self, name, func):
+        """Wrap the coroutine function <func>, counting under <name>
+        """
+        entry = self._entry(name, "coroutine")
+        async def profiled(*args, **kwargs):
+            return await _Steps(func(*args, **kwargs), entry)
+        return profiled
+
+    def function(self, name, func):
+        """Wrap the function <func>, counting under <name>
+        """
+        entry = self._entry(name, "function")
+        def profiled(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                entry[0] += 1
+                entry[1] += perf_counter() - start
+        return profiled
+
+    def instrument(self, obj, coroutines=(), functions=()):
+        """Replace the named methods of <obj> by profiled ones
+        """
+        for name in coroutines:
+            setattr(obj, name, self.coroutine(name, getattr(obj, name)))
+        for name in functions:
+            setattr(obj, name, self.function(name, getattr(obj, name)))
+
+    def reset(self):
+        """Start counting from zero
+        """
+        for entry in self._entries.values():
+            entry[0] = 0
+            entry[1] = 0.0
+
+    def __getitem__(self, name):
+        """(wakeups or calls, seconds) of <name>
+        """
+        count, seconds = self._entries[name]
+        return count, seconds
+
+    def snapshot(self):
+        """Return the counters as dict of name -> dict of plain values
+        """
+        return {name: {"kind": self._kinds[name], "count": count, "time": seconds,
+                       "mean": seconds / count if count else 0.0}
+                for name, (count, seconds) in self._entries.items()}
+
+    def summary(self):
+        """Return a table of the counters, most time first
+        """
+        lines = ["Profile%s" % (" of %s" % self.name if self.name else ""),
+                 "%-20s %10s %-7s %10s %10s" % ("name", "count", "", "total ms", "mean us")]
+        for name, (count, seconds) in sorted(self._entries.items(), key=lambda item: -item[1][1]):
+            lines.append("%-20s %10u %-7s %10.2f %10.2f" % (name, count, "wakeups" if self._kinds[name] == "coroutine" else "calls",
+                                                           seconds * 1e3, seconds / count * 1e6 if count else 0.0))
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.summary()
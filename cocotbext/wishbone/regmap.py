@@ -0,0 +1,317 @@
+
+from cocotb.result import TestFailure
+from cocotb.decorators import public
+from .driver import WBOp, Wishbone
+
+# field and register access types, w1c is write one to clear
+accessTypes = ("rw", "ro", "wo", "w1c")
+
+
+@public
+class WBField():
+    """Bit field of a WBRegister
+
+    Args:
+        name: name of the field
+        lsb: lowest bit of the field
+        width: number of bits
+        access: "rw", "ro", "wo" or "w1c" (write one to clear)
+    """
+    def __init__(self, name, lsb, width=1, access="rw"):
+        if access not in accessTypes:
+            raise ValueError("Unknown access type %r of field %s, use one of %s" % (access, name, ", ".join(accessTypes)))
+        self.name   = name
+        self.lsb    = lsb
+        self.width  = width
+        self.access = access
+        self.mask   = ((1 << width) - 1) << lsb
+
+    def get(self, word):
+        """Value of the field in register value <word>
+        """
+        return (word & self.mask) >> self.lsb
+
+    def put(self, value):
+        """Register value with the field set to <value> and all other bits 0
+        """
+        if value < 0 or value >> self.width:
+            raise ValueError("Value 0x%x doesn't fit into the %u bits of field %s" % (value, self.width, self.name))
+        return value << self.lsb
+
+    def __repr__(self):
+        return "WBField(%s, %u:%u, %s)" % (self.name, self.lsb + self.width - 1, self.lsb, self.access)
+
+
+@public
+class WBRegister():
+    """Register of a WBRegMap
+
+    Non-volatile registers keep a shadow of their value: it is set by every
+    read and write and answers reads without bus traffic. Volatile registers
+    are changed by the hardware, every read of them goes to the bus.
+
+    Args:
+        name: name of the register
+        offset: byte offset of the register from the base of the map
+        fields: dict of name -> WBField, (lsb, width[, access]) or a dict
+            with these keys. Without fields the register is one field.
+        access: access type of the register, the default of its fields
+        volatile: reads always go to the bus, None to make read only
+            registers and registers with w1c fields volatile
+        reset: value after reset the shadow starts with, None if unknown
+        width: size of the register in bits
+    """
+    def __init__(self, name, offset, fields=None, access="rw", volatile=None, reset=None, width=32):
+        if access not in accessTypes:
+            raise ValueError("Unknown access type %r of register %s, use one of %s" % (access, name, ", ".join(accessTypes)))
+        self.name       = name
+        self.offset     = offset
+        self.access     = access
+        self.width      = width
+        self.fields     = {}
+        full = (1 << width) - 1
+        used = 0
+        for fname, spec in (fields or {}).items():
+            if not isinstance(spec, WBField):
+                if isinstance(spec, dict):
+                    spec = WBField(fname, spec["lsb"], spec.get("width", 1), spec.get("access", access))
+                else:
+                    spec = WBField(fname, *spec) if len(spec) > 2 else WBField(fname, spec[0], spec[1], access)
+            if spec.mask & ~full:
+                raise ValueError("Field %s doesn't fit into the %u bits of register %s" % (fname, width, name))
+            if spec.mask & used:
+                raise ValueError("Field %s overlaps another field of register %s" % (fname, name))
+            used |= spec.mask
+            self.fields[fname] = spec
+        if not self.fields:
+            self.fields[name] = WBField(name, 0, width, access)
+        # bits set by writes, including the ones outside of fields, and bits
+        # written with one to clear
+        self.writeMask  = full
+        self.clearMask  = 0
+        for field in self.fields.values():
+            if field.access in ("ro", "w1c"):
+                self.writeMask &= ~field.mask
+            if field.access == "w1c":
+                self.clearMask |= field.mask
+        if volatile is None:
+            volatile = access == "ro" or self.clearMask != 0
+        self.volatile   = volatile
+        self.reset      = reset
+        self.shadow     = None if volatile else reset
+
+    def field(self, name):
+        try:
+            return self.fields[name]
+        except KeyError:
+            raise KeyError("Register %s has no field %s" % (self.name, name)) from None
+
+    def __repr__(self):
+        return "WBRegister(%s, 0x%x, %s)" % (self.name, self.offset, ", ".join(self.fields))
+
+
+@public
+class WBRegMap():
+    """Register map on top of a WishboneMaster
+
+    Reads of non-volatile registers whose value is known are answered from
+    the shadow. Writes are queued with update() and carried out by flush(),
+    updates of the same non-volatile register are merged into one write.
+    All accesses of a read_many() or flush() go out in one bus cycle, plus
+    one cycle for reading the registers a field update has to be merged
+    into. Reads flush the queued writes first.
+
+    Args:
+        master: WishboneMaster to access the registers with
+        regs: dict of register name -> WBRegister or a dict of its arguments
+            (offset, fields, access, volatile, reset, width), e.g. as loaded
+            from a YAML file
+        base: byte address of the map
+        byteaddr: the address bus carries byte addresses instead of word
+            indices, None to follow the master
+    """
+    def __init__(self, master, regs, base=0, byteaddr=None):
+        if byteaddr is None:
+            byteaddr = master._byteaddr
+        self.master     = master
+        self.base       = base
+        self._nbytes    = master._width // 8
+        self._byteaddr  = byteaddr
+        self.registers  = {}
+        for name, spec in regs.items():
+            reg = spec if isinstance(spec, WBRegister) else WBRegister(name, width=master._width, **spec)
+            if reg.width > master._width:
+                raise ValueError("Register %s is wider than the %u bit bus" % (name, master._width))
+            if not byteaddr and (base + reg.offset) % self._nbytes:
+                raise ValueError("Register %s at offset 0x%x isn't aligned to the bus width" % (name, reg.offset))
+            self.registers[name] = reg
+        self._queue     = []    # queued writes: [register, value, mask]
+        self._pending   = {}    # non-volatile register -> its entry in _queue
+        self.hits       = 0     # reads answered from the shadow
+        self.reads      = 0     # reads on the bus
+        self.writes     = 0     # writes on the bus
+        self.merged     = 0     # updates merged into another write
+
+    def __getitem__(self, name):
+        try:
+            return self.registers[name]
+        except KeyError:
+            raise KeyError("No register %s in the map" % name) from None
+
+    def adr(self, reg):
+        """Bus address of register <reg>
+        """
+        adr = self.base + reg.offset
+        return adr if self._byteaddr else adr // self._nbytes
+
+    def invalidate(self, name=None):
+        """Forget the shadow of register <name>, of all registers without
+        """
+        for reg in self.registers.values() if name is None else [self[name]]:
+            reg.shadow = None
+
+    def update(self, name, value=None, **fields):
+        """Queue a write of register <name>: the whole register with <value>
+        or the given fields, keeping the others. Carried out by flush().
+        """
+        reg = self[name]
+        if reg.access == "ro":
+            raise ValueError("Register %s is read only" % name)
+        if value is not None:
+            if fields:
+                raise ValueError("Write either the value or fields of register %s" % name)
+            if value < 0 or value >> reg.width:
+                raise ValueError("Value 0x%x doesn't fit into register %s" % (value, name))
+            mask = (1 << reg.width) - 1
+        else:
+            if not fields:
+                raise ValueError("Nothing to write to register %s" % name)
+            value = mask = 0
+            for fname, fvalue in fields.items():
+                field = reg.field(fname)
+                if field.access == "ro":
+                    raise ValueError("Field %s of register %s is read only" % (fname, name))
+                value |= field.put(fvalue)
+                mask |= field.mask
+        entry = None if reg.volatile else self._pending.get(reg)
+        if entry is not None:
+            entry[1] = (entry[1] & ~mask) | value
+            entry[2] |= mask
+            self.merged += 1
+        else:
+            entry = [reg, value, mask]
+            self._queue.append(entry)
+            if not reg.volatile:
+                self._pending[reg] = entry
+
+    async def flush(self):
+        """Carry out the queued writes
+        """
+        queue, self._queue, self._pending = self._queue, [], {}
+        if not queue:
+            return
+        # fields are merged into the bits writes set, read those that aren't known
+        need = []
+        for reg, value, mask in queue:
+            if reg.writeMask & ~mask and (reg.volatile or reg.shadow is None) and reg not in need:
+                need.append(reg)
+        base = {}
+        if need:
+            res = await self._cycle([WBOp(self.adr(reg), sel=None) for reg in need], need, "read")
+            for reg, r in zip(need, res):
+                base[reg] = int(r.datrd) & ((1 << reg.width) - 1)
+                if not reg.volatile:
+                    reg.shadow = base[reg]
+        ops = []
+        shadows = []
+        for reg, value, mask in queue:
+            old = base.get(reg, reg.shadow)
+            word = value | (old & reg.writeMask & ~mask if old is not None else 0)
+            ops.append(WBOp(self.adr(reg), word, sel=None))
+            base[reg] = word
+            shadow = None
+            if not reg.volatile:
+                if reg.shadow is not None:
+                    # bits writes don't set keep their value
+                    shadow = (word & reg.writeMask) | (reg.shadow & ~reg.writeMask)
+                elif not ~reg.writeMask & ((1 << reg.width) - 1):
+                    shadow = word
+            shadows.append(shadow)
+        await self._cycle(ops, [entry[0] for entry in queue], "write", shadows)
+
+    async def read_many(self, items):
+        """Read registers or fields, <items> are register names or (register,
+        field) tuples. Returns the values in the same order. The reads that
+        can't be answered from the shadow go out in one cycle.
+        """
+        if self._queue:
+            await self.flush()
+        regs = []
+        for item in items:
+            name, fname = (item, None) if isinstance(item, str) else item
+            reg = self[name]
+            regs.append((reg, reg.field(fname) if fname is not None else None))
+        fetch = []
+        for reg, _ in regs:
+            if reg.volatile or reg.shadow is None:
+                # a volatile register is read as often as asked for
+                if reg.volatile or reg not in fetch:
+                    fetch.append(reg)
+            else:
+                self.hits += 1
+        fetched = {}
+        if fetch:
+            res = await self._cycle([WBOp(self.adr(reg), sel=None) for reg in fetch], fetch, "read")
+            for reg, r in zip(fetch, res):
+                value = int(r.datrd) & ((1 << reg.width) - 1)
+                fetched.setdefault(reg, []).append(value)
+                if not reg.volatile:
+                    reg.shadow = value
+        values = []
+        for reg, field in regs:
+            value = fetched[reg].pop(0) if reg.volatile else reg.shadow
+            values.append(field.get(value) if field is not None else value)
+        return values
+
+    async def read(self, name, field=None):
+        """Read register <name> or one of its fields
+        """
+        return (await self.read_many([name if field is None else (name, field)]))[0]
+
+    async def write(self, name, value=None, **fields):
+        """Write register <name> or some of its fields right away, together
+        with all queued writes
+        """
+        self.update(name, value, **fields)
+        await self.flush()
+
+    async def _cycle(self, ops, regs, what, shadows=None):
+        """Carry out <ops> on <regs> in one cycle. The shadows of the registers
+        are set to <shadows> as far as the slave acknowledged the accesses,
+        from a failing reply on they are forgotten.
+        """
+        res = await self.master.send_cycle(ops)
+        if what == "read":
+            self.reads += len(ops)
+        else:
+            self.writes += len(ops)
+        for i, (reg, r) in enumerate(zip(regs, res)):
+            if r.ack != 1:
+                for failed in regs[i:]:
+                    failed.shadow = None
+                raise TestFailure("Slave replied %s to the %s of register %s at 0x%x" %
+                                  (Wishbone.replyTypes.get(r.ack, r.ack), what, reg.name, self.adr(reg)))
+            if shadows is not None:
+                reg.shadow = shadows[i]
+        return res
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """Carry out the writes queued in an async with block
+        """
+        if exc_type is None:
+            await self.flush()
+        else:
+            self._queue, self._pending = [], {}
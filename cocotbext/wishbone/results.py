@@ -0,0 +1,106 @@
+
+from array import array
+from cocotb.decorators import public
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class WBResRow():
+    """Row view into WBResults, reads like a WBRes without holding the data
+    """
+    __slots__ = ("_res", "_idx")
+
+    def __init__(self, res, idx):
+        self._res = res
+        self._idx = idx
+
+    def _column(name):
+        return property(lambda self: getattr(self._res, name)[self._idx])
+
+    ack         = _column("ack")
+    sel         = _column("sel")
+    adr         = _column("adr")
+    we          = _column("we")
+    datrd       = _column("datrd")
+    waitIdle    = _column("waitIdle")
+    waitStall   = _column("waitStall")
+    waitAck     = _column("waitAck")
+    cti         = _column("cti")
+    bte         = _column("bte")
+    del _column
+
+    @property
+    def datwr(self):
+        return self._res.datwr[self._idx] if self.we else None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in WBResults.columns if name != "we"}
+
+
+@public
+class WBResults():
+    """Columnar Wishbone result storage
+
+    Keeps the results of many transfers in one typed array per field instead
+    of one WBRes object per transfer. Indexing and iterating yields WBResRow
+    views which have the same attributes as WBRes.
+
+    Args:
+        width: size of the data bus, columns for wider buses are plain lists
+    """
+    columns = ("ack", "sel", "adr", "we", "datrd", "datwr", "waitIdle", "waitStall", "waitAck", "cti", "bte")
+    _types  = {"ack": "B", "sel": "Q", "adr": "Q", "we": "B", "datrd": "Q", "datwr": "Q",
+               "waitIdle": "I", "waitStall": "I", "waitAck": "I", "cti": "B", "bte": "B"}
+
+    def __init__(self, width=32):
+        self._width = width
+        self.clear()
+
+    def clear(self):
+        """Drop all results
+        """
+        for name in self.columns:
+            if name in ("datrd", "datwr") and self._width > 64:
+                setattr(self, name, [])
+            else:
+                setattr(self, name, array(self._types[name]))
+
+    def append(self, ack, sel, adr, datrd, datwr, waitIdle=0, waitStall=0, waitAck=0, cti=0, bte=0):
+        """Add the result of a transfer, <datwr> is None for reads and <sel>
+        None if all byte lanes are selected
+        """
+        self.ack.append(ack)
+        self.sel.append((1 << (self._width // 8)) - 1 if sel is None else sel)
+        self.adr.append(adr)
+        self.we.append(datwr is not None)
+        self.datrd.append(datrd or 0)
+        self.datwr.append(datwr or 0)
+        self.waitIdle.append(waitIdle or 0)
+        self.waitStall.append(waitStall or 0)
+        self.waitAck.append(waitAck or 0)
+        self.cti.append(cti or 0)
+        self.bte.append(bte or 0)
+
+    def __len__(self):
+        return len(self.ack)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("result index out of range")
+        return WBResRow(self, idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield WBResRow(self, idx)
+
+    def to_numpy(self):
+        """Return a copy of the columns as a dict of NumPy arrays
+        """
+        if numpy is None:
+            raise ImportError("NumPy is required for WBResults.to_numpy()")
+        return {name: numpy.frombuffer(col, dtype=col.typecode).copy() if isinstance(col, array) else numpy.array(col, dtype=object)
+                for name, col in ((name, getattr(self, name)) for name in self.columns)}
@@ -0,0 +1,95 @@
+
+"""Helpers to sample bus lines without going through BinaryValue
+
+Reading ``handle.value`` builds a BinaryValue on every access, which is the
+bulk of the Python time of a bus model polled on every clock. The readers
+returned here fetch the binary string straight from the simulator handle
+and are resolved once when the model is constructed.
+"""
+from cocotb.binary import BinaryValue
+
+# capability bits of the optional Wishbone lines
+SEL, ERR, STALL, RTY, CTI, BTE = 1, 2, 4, 8, 16, 32
+_optional = (("sel", SEL), ("err", ERR), ("stall", STALL), ("rty", RTY), ("cti", CTI), ("bte", BTE))
+
+
+def capabilities(bus):
+    """Bitmask of the optional lines present on <bus>
+    """
+    caps = 0
+    for name, bit in _optional:
+        if hasattr(bus, name):
+            caps |= bit
+    return caps
+
+
+def bus_width(bus, width=None):
+    """Size of the data bus in bits: <width> if given, else the width of the
+    datwr line of <bus> or 32 without a bus. Raises ValueError if a given
+    <width> isn't a power of two of at least 8 bits or the data lines of
+    <bus> aren't <width> bits wide.
+    """
+    if width is None:
+        return len(bus.datwr) if bus is not None else 32
+    if width < 8 or width & (width - 1):
+        raise ValueError("Bus width must be a power of two of at least 8 bits, not %u" % width)
+    if bus is not None:
+        for name in ("datwr", "datrd"):
+            size = len(getattr(bus, name))
+            if size != width:
+                raise ValueError("Line %s is %u bits wide, but the bus width is %u" % (name, size, width))
+    return width
+
+
+def binstr_reader(handle):
+    """Function returning the current value of <handle> as binary string
+    """
+    raw = getattr(getattr(handle, "_handle", None), "get_signal_val_binstr", None)
+    if raw is not None:
+        return raw
+    return lambda: handle.value.binstr
+
+
+def int_reader(handle):
+    """Function returning the current value of <handle> as int, raises
+    ValueError if the value isn't resolvable
+    """
+    raw = binstr_reader(handle)
+    return lambda: int(raw(), 2)
+
+
+def to_int(binstr, default=None):
+    """Convert a binary string to int, <default> if it holds X/Z bits
+    """
+    try:
+        return int(binstr, 2)
+    except ValueError:
+        return default
+
+
+def resolve(binstr):
+    """Convert a binary string to (value, undefined), X/Z bits read as 0 in
+    <value> and are set in the mask <undefined>
+    """
+    value = to_int(binstr)
+    if value is not None:
+        return value, 0
+    return (int("".join(c if c in "01" else "0" for c in binstr), 2),
+            int("".join("0" if c in "01" else "1" for c in binstr), 2))
+
+
+def as_int(value, default=None):
+    """Convert a sampled value (int, BinaryValue or None) to int, <default>
+    if it is None or holds X/Z bits
+    """
+    if value is None:
+        return default
+    if isinstance(value, int):
+        return value
+    return to_int(value.binstr, default)
+
+
+def to_binary(binstr):
+    """Convert a binary string to a BinaryValue like handle.value returns it
+    """
+    return BinaryValue(binstr, n_bits=len(binstr))
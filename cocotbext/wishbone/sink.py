@@ -0,0 +1,188 @@
+
+import json
+import threading
+from collections import deque
+from cocotb.triggers import Event
+from cocotb.utils import get_sim_time
+from cocotb.decorators import public
+try:
+    from Queue import Queue # Python 2.x
+except ImportError:
+    from queue import Queue
+
+
+@public
+class WBSink():
+    """Base class of transaction sinks
+
+    A sink is attached to a WishboneSlave with add_sink() and gets every
+    completed cycle passed to put(). As sinks are registered as monitor
+    callbacks the monitor doesn't keep the transactions in its _recvQ.
+    """
+    def put(self, transaction):
+        raise NotImplementedError("Sink doesn't implement put()")
+
+    def close(self):
+        pass
+
+
+@public
+class WBRingSink(WBSink):
+    """Keep only the last <maxlen> transactions
+
+    Args:
+        maxlen: number of transactions to keep
+    """
+    def __init__(self, maxlen=1024):
+        self.transactions   = deque(maxlen=maxlen)
+        self.received       = 0
+
+    @property
+    def dropped(self):
+        return self.received - len(self.transactions)
+
+    def put(self, transaction):
+        self.received += 1
+        self.transactions.append(transaction)
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def __iter__(self):
+        return iter(self.transactions)
+
+
+@public
+class WBStreamSink(WBSink):
+    """Hand the transactions to a consumer coroutine
+
+    Use as async iterator::
+
+        async for transaction in sink:
+            ...
+
+    The monitor can't wait for the consumer, if it falls more than <maxlen>
+    transactions behind the oldest ones are dropped.
+
+    Args:
+        maxlen: number of transactions buffered for the consumer
+    """
+    def __init__(self, maxlen=1024):
+        self._queue     = deque(maxlen=maxlen)
+        self._event     = Event("wb_stream")
+        self._closed    = False
+        self._detach    = None  # set by the monitor handing out the stream
+        self.received   = 0
+        self.dropped    = 0
+
+    def put(self, transaction):
+        self.received += 1
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(transaction)
+        self._event.set()
+
+    def close(self):
+        self._closed = True
+        self._event.set()
+        if self._detach is not None:
+            self._detach()
+            self._detach = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._queue:
+            if self._closed:
+                raise StopAsyncIteration
+            self._event.clear()
+            await self._event.wait()
+        return self._queue.popleft()
+
+
+def _plain(value):
+    #make bus values JSON serializable
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    if hasattr(value, "integer"):
+        try:
+            return value.integer
+        except ValueError:
+            return value.binstr
+    if hasattr(value, "__iter__"):
+        return [_plain(v) for v in value]
+    return str(value)
+
+
+@public
+class WBFileSink(WBSink):
+    """Write the transactions to a file as JSON lines
+
+    Transactions are collected in batches of <batch> and written by a
+    background thread, so the simulation doesn't wait for the file system
+    and at most <backlog> batches are held in memory. Call close() at the
+    end of the test to write the last batch.
+
+    Each line holds the number of the transaction, the simulation time it was
+    received at in ns and the list of its records as dicts.
+
+    Args:
+        file: file name or file object opened for writing text
+        batch: number of transactions written at once
+        backlog: number of batches waiting for the writer before put() blocks
+    """
+    def __init__(self, file, batch=256, backlog=4):
+        if hasattr(file, "write"):
+            self._file  = file
+            self._own   = False
+        else:
+            self._file  = open(file, "w")
+            self._own   = True
+        self._batchsize = batch
+        self._batch     = []
+        self._queue     = Queue(maxsize=backlog)
+        self.received   = 0
+        self._thread    = threading.Thread(target=self._writer, name="wb_file_sink", daemon=True)
+        self._thread.start()
+
+    def put(self, transaction):
+        self._batch.append((self.received, get_sim_time("ns"), transaction))
+        self.received += 1
+        if len(self._batch) >= self._batchsize:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def flush(self):
+        """Write all transactions received so far
+        """
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+        self._queue.join()
+        self._file.flush()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._own:
+            self._file.close()
+
+    @staticmethod
+    def _format(num, time, transaction):
+        return json.dumps({"n": num, "time": time,
+                           "records": [{k: _plain(v) for k, v in r.to_dict().items()} for r in transaction]}) + "\n"
+
+    def _writer(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    return
+                self._file.write("".join(self._format(*entry) for entry in batch))
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,312 @@
+
+from collections import deque
+from cocotb.triggers    import RisingEdge, First
+from cocotb.result      import TestFailure
+from cocotb.decorators  import public
+from cocotb.utils       import get_sim_time
+from .monitor           import Wishbone, WBRes
+from .events            import WBEvent
+from .stats             import WBStats
+from .signals           import ERR, STALL, RTY, CTI, binstr_reader, to_int, to_binary
+
+
+# protocol rules checked by WishboneSniffer
+protocolChecks = {
+    "reply_multi":      "more than one of ack, err and rty asserted",
+    "reply_outside":    "reply line asserted outside of a cycle",
+    "reply_unexpected": "reply without an outstanding request",
+    "stb_dropped":      "stb negated before the slave took the request",
+    "unstable":         "request lines changed before the slave took the request",
+    "cti":              "reserved cti or illegal cti/bte sequence in a burst",
+    "burst_adr":        "address of a burst beat doesn't follow the previous beat",
+}
+
+# what the slave may see after a transfer of the given cti
+_ctiFollows = {0: (0, 1, 2, 7), 1: (1, 7), 2: (2, 7), 7: (0, 1, 2, 7)}
+
+# actions of a transition
+_CLOSE, _NEW, _HELD, _ACCEPT, _COMPLETE = 1, 2, 4, 8, 16
+
+
+def _transitions(pipelined, checks):
+    """Table of what a clock edge means, indexed by the sampled lines
+
+    The index is held << 6 | cyc << 5 | stb << 4 | stall << 3 | ack << 2 |
+    err << 1 | rty, <held> tells if a request was presented but not taken
+    at the previous edge. Each entry is (actions, held, reply, violations).
+    """
+    table = []
+    for key in range(128):
+        held    = key >> 6 & 1
+        cyc     = key >> 5 & 1
+        stb     = key >> 4 & 1
+        stall   = key >> 3 & 1
+        ack, err, rty = key >> 2 & 1, key >> 1 & 1, key & 1
+        reply   = 1 if ack else 2 if err else 3 if rty else 0
+        bad     = []
+        act     = 0
+        nheld   = 0
+        if ack + err + rty > 1:
+            bad.append("reply_multi")
+        if not cyc:
+            act = _CLOSE
+            if reply:
+                bad.append("reply_outside")
+        else:
+            if held and not stb:
+                bad.append("stb_dropped")
+            if stb:
+                act |= _HELD if held else _NEW
+                if pipelined:
+                    # the slave takes the request on the first clock it doesn't stall
+                    if stall:
+                        nheld = 1
+                    else:
+                        act |= _ACCEPT
+                elif reply:
+                    # a classic slave takes the request with its reply
+                    act |= _COMPLETE
+                else:
+                    nheld = 1
+            elif reply and not pipelined:
+                bad.append("reply_unexpected")
+        table.append((act, nheld, reply, tuple(name for name in bad if name in checks)))
+    return table
+
+
+@public
+class WBViolation():
+    """Protocol rule broken on the bus, found by a WishboneSniffer
+
+    Args:
+        check: name of the rule, see protocolChecks
+        time: simulation time in ps
+        cycle: number of the bus cycle, counting from 0
+        message: description for the log
+    """
+    __slots__ = ("check", "time", "cycle", "message")
+
+    def __init__(self, check, time, cycle, message):
+        self.check      = check
+        self.time       = time
+        self.cycle      = cycle
+        self.message    = message
+
+    def __repr__(self):
+        return "WBViolation(%s, %u ps, cycle %u: %s)" % (self.check, self.time, self.cycle, self.message)
+
+
+@public
+class WishboneSniffer(Wishbone):
+    """Passive Wishbone monitor
+
+    Records the transfers on a bus without driving any line, so it can be put
+    on a bus between two RTL blocks, and checks the protocol rules of
+    protocolChecks on the way. Like WishboneSlave it passes a list of WBRes
+    per bus cycle to its callbacks, sinks or _recvQ.
+
+    With a stall line the bus is taken as pipelined: a request is taken on
+    the first clock the slave doesn't stall and the replies are matched to
+    the taken requests in order. Without one a request is taken with its
+    reply. Bursts are recorded beat by beat.
+
+    Each clock of a cycle costs a fixed number of line reads and one lookup
+    in a precomputed transition table. While cyc is low the sniffer doesn't
+    wake up on the clock, only a reply line rising then wakes it to report
+    it.
+
+    The timing in the WBRes is what the master sees: waitStall is the number
+    of clocks the request was stalled, waitAck the number of clocks from
+    taking the request to the reply and waitIdle the number of clocks stb
+    was low with no reply outstanding before the request.
+
+    Args:
+        checks: names of the rules to check, None for all of protocolChecks
+        strict: raise TestFailure on the first violation instead of logging
+            an error
+        byteaddr: the address bus carries byte addresses instead of word
+            indices, for following the addresses of bursts
+        ints: record adr, sel, datrd and datwr as int instead of BinaryValue,
+            None if the value isn't resolvable
+        sink: WBSink or list of sinks the transactions are passed to instead
+            of keeping them all in _recvQ
+        trace: WBTraceWriter or file name to record all transfers to
+        events: callable or WBSink getting a WBEvent when a cycle opens or
+            closes and for every transfer, None disables the events
+        regions: address ranges to break the statistics in <perf> down by,
+            see WBStats
+        profile: count the wakeups and Python time of _monitor_recv and the
+            per transfer functions in a WBProfile, True or the WBProfile to use
+    """
+    _passive = True
+    _profiledCoroutines = ("_monitor_recv",)
+    _profiledFunctions = ("_read_request", "_transfer", "_check_burst")
+
+    def __init__(self, entity, name, clock, checks=None, strict=False, **kwargs):
+        if checks is None:
+            checks = protocolChecks
+        for check in checks:
+            if check not in protocolChecks:
+                raise ValueError("Unknown check %r, use some of %s" % (check, ", ".join(protocolChecks)))
+        self._checks = frozenset(checks)
+        self._strict = strict
+        self._byteaddr = kwargs.pop('byteaddr', False)
+        self._value = to_int if kwargs.pop('ints', False) else to_binary
+        sinks = kwargs.pop('sink', None)
+        self.trace = kwargs.pop('trace', None)
+        events = kwargs.pop('events', None)
+        self._events = getattr(events, "put", events)
+        self.perf = WBStats(kwargs.pop('regions', None))
+        self.violations = []
+        self._cycle_num = 0
+        Wishbone.__init__(self, entity, name, clock, **kwargs)
+        if sinks is not None:
+            for sink in (sinks if isinstance(sinks, (list, tuple)) else [sinks]):
+                self.add_sink(sink)
+
+    def _violate(self, check, message):
+        violation = WBViolation(check, get_sim_time("ps"), self._cycle_num,
+                                "%s: %s" % (protocolChecks[check], message))
+        self.violations.append(violation)
+        if self._strict:
+            raise TestFailure("Wishbone protocol violation on %s, %s" % (self.name, violation.message))
+        self.log.error("Protocol violation in cycle %u, %s", self._cycle_num, violation.message)
+
+    def _read_request(self):
+        """Sample the request lines, as binary strings
+        """
+        return (self._rd_adr(), self._rd_we(), self._rd_datwr(),
+                self._rd_sel() if self._rd_sel is not None else None,
+                self._rd_cti() if self._rd_cti is not None else None,
+                self._rd_bte() if self._rd_bte is not None else None)
+
+    def _check_burst(self, adr, cti, bte):
+        """Follow the cti/bte sequence and the addresses of a burst
+        """
+        prev = self._burstCti
+        if cti not in _ctiFollows:
+            if "cti" in self._checks:
+                self._violate("cti", "reserved cti %u at 0x%x" % (cti, adr))
+            self._burstCti = 0
+            return
+        if cti not in _ctiFollows[prev]:
+            if "cti" in self._checks:
+                self._violate("cti", "cti %u at 0x%x follows cti %u" % (cti, adr, prev))
+        elif prev in (self.CTI_CONST, self.CTI_INC):
+            if prev == self.CTI_INC and bte != self._burstBte and "cti" in self._checks:
+                self._violate("cti", "bte changed from %u to %u within the burst at 0x%x" % (self._burstBte, bte, adr))
+            if adr != self._burstAdr and "burst_adr" in self._checks:
+                self._violate("burst_adr", "beat at 0x%x, expected 0x%x" % (adr, self._burstAdr))
+        self._burstCti = cti if cti in (self.CTI_CONST, self.CTI_INC) else 0
+        self._burstBte = bte
+        if self._burstCti:
+            self._burstAdr = self._burst_next(adr, cti, bte)
+
+    def _transfer(self, req, reply, datrd, waitIdle, waitStall, waitAck):
+        """Record a transfer of the open cycle
+        """
+        adr, we, datwr, sel, cti, bte = req
+        we = we == "1"
+        cti = to_int(cti, 0) if cti is not None else self.CTI_CLASSIC
+        bte = to_int(bte, 0) if bte is not None else 0
+        if self._checkBursts:
+            self._check_burst(to_int(adr, 0), cti, bte)
+        value = self._value
+        self._res_buf.append(WBRes(ack=reply, sel=None if sel is None else value(sel), adr=value(adr),
+                                   datrd=value(datrd), datwr=value(datwr) if we else None,
+                                   waitIdle=waitIdle, waitStall=waitStall, waitAck=waitAck))
+        self.perf.add(reply, to_int(adr, 0), we, waitIdle, waitStall, waitAck)
+        if self.trace is not None or self._events is not None:
+            iadr, isel = to_int(adr, 0), None if sel is None else to_int(sel, 0)
+            ird, iwr = to_int(datrd, 0), to_int(datwr, 0) if we else None
+            time = get_sim_time("ps")
+            if self.trace is not None:
+                self.trace.append(iadr, ird, iwr, isel, we, reply, waitIdle, waitStall, waitAck, cti, bte, time)
+            if self._events is not None:
+                self._events(WBEvent("transfer", time, self._cycle_num, iadr, we, ird, iwr, isel, reply,
+                                     waitIdle, waitStall, waitAck, cti, bte))
+
+    async def _monitor_recv(self):
+        self._init_sampling()
+        bus         = self.bus
+        caps        = self._caps
+        pipelined   = bool(caps & STALL)
+        table       = _transitions(pipelined, self._checks)
+        clkedge     = RisingEdge(self.clock)
+        cycedge     = RisingEdge(bus.cyc)
+        low         = lambda: "0"
+        rd_cyc      = self._rd_cyc
+        rd_stb      = self._rd_stb
+        rd_stall    = self._rd_stall or low
+        rd_ack      = binstr_reader(bus.ack)
+        rd_err      = binstr_reader(bus.err) if caps & ERR else low
+        rd_rty      = binstr_reader(bus.rty) if caps & RTY else low
+        rd_datrd    = binstr_reader(bus.datrd)
+        read_req    = self._read_request
+        stable      = "unstable" in self._checks
+        violate     = self._violate
+        self._checkBursts = bool(caps & CTI) and bool(self._checks & {"cti", "burst_adr"})
+        if "reply_outside" in self._checks:
+            # a reply sampled by the clock closing the cycle is reported by
+            # the table, one rising after it while parked here
+            parked = First(cycedge, *(RisingEdge(line) for line in self._replyLines.values()))
+        else:
+            parked = cycedge
+        while True:
+            # park until the next cycle opens
+            while rd_cyc() != "1":
+                edge = await parked
+                if edge is not cycedge and rd_cyc() != "1":
+                    violate("reply_outside", "%s rose while cyc is low" % edge.signal._name)
+            if self._events is not None:
+                self._events(WBEvent("open", get_sim_time("ps"), self._cycle_num))
+            self._res_buf   = []
+            self._burstCti  = 0
+            self._burstBte  = 0
+            self._burstAdr  = 0
+            pending = deque()   # requests taken and not replied yet: (request, presented, taken, idle)
+            held    = 0
+            clk     = 0
+            idle    = 0
+            presented = 0
+            req     = None
+            while True:
+                await clkedge
+                clk += 1
+                act, held, reply, bad = table[held << 6 | (rd_cyc() == "1") << 5 | (rd_stb() == "1") << 4 |
+                                              (rd_stall() == "1") << 3 | (rd_ack() == "1") << 2 |
+                                              (rd_err() == "1") << 1 | (rd_rty() == "1")]
+                for check in bad:
+                    violate(check, "at clock %u of the cycle" % clk)
+                if act & _CLOSE:
+                    break
+                if act & _NEW:
+                    req = read_req()
+                    presented = clk
+                elif act & _HELD and stable and req != read_req():
+                    violate("unstable", "request at 0x%x changed at clock %u of the cycle" %
+                            (to_int(req[0], 0), clk))
+                    req = read_req()
+                if act & _ACCEPT:
+                    pending.append((req, presented, clk, idle))
+                    idle = 0
+                if reply:
+                    if act & _COMPLETE:
+                        self._transfer(req, reply, rd_datrd(), idle, 0, clk - presented)
+                        idle = 0
+                    elif pending:
+                        r, p, taken, i = pending.popleft()
+                        self._transfer(r, reply, rd_datrd(), i, taken - p, clk - taken)
+                    elif pipelined and "reply_unexpected" in self._checks:
+                        violate("reply_unexpected", "at clock %u of the cycle" % clk)
+                elif not act & (_NEW | _HELD) and not pending:
+                    idle += 1
+            if pending:
+                self.log.debug("Cycle %u closed with %u requests outstanding", self._cycle_num, len(pending))
+            self.perf.end_cycle(clk - 1)
+            self._recv(self._res_buf)
+            if self.trace is not None:
+                self.trace.end_cycle()
+            if self._events is not None:
+                self._events(WBEvent("close", get_sim_time("ps"), self._cycle_num))
+            self._cycle_num += 1
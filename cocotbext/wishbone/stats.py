@@ -0,0 +1,169 @@
+
+import csv
+import io
+import json
+from cocotb.decorators import public
+from .decoder import WBDecoder, WBTarget
+
+
+def _bucket_names(count):
+    names = ["0", "1"]
+    for i in range(2, count - 1):
+        names.append("%u-%u" % (1 << (i - 1), (1 << i) - 1))
+    names.append("%u+" % (1 << (count - 2)))
+    return names
+
+
+@public
+class WBStats():
+    """Running statistics of the transfers of a master or slave
+
+    Every transfer updates a fixed set of counters, nothing is stored per
+    transfer. Wait and stall cycles are also counted in histograms with
+    power of two buckets: 0, 1, 2-3, 4-7, ... and the last bucket for
+    everything above.
+
+    Args:
+        regions: break the transfers down by address range, a dict of
+            name -> (base, size) or a WBDecoder whose target names are used.
+            Addresses are the ones on the bus. Transfers outside all ranges
+            count for "other".
+    """
+    buckets = 16
+    bucketNames = _bucket_names(buckets)
+
+    def __init__(self, regions=None):
+        if regions is not None and not isinstance(regions, WBDecoder):
+            decoder = WBDecoder(WBTarget(0, 1, None, "other"))
+            for name, (base, size) in regions.items():
+                decoder.add(base, size, None, name)
+            regions = decoder
+        self._regions = regions
+        self.reset()
+
+    def reset(self):
+        """Start counting from zero
+        """
+        self.transfers  = 0
+        self.writes     = 0
+        self.cycles     = 0
+        self.clocks     = 0     # clock cycles with cyc asserted
+        self.replies    = [0, 0, 0, 0]  # by reply type, 1 ack, 2 err, 3 rty
+        self.waitIdle   = 0     # sums of the wait cycles of all transfers
+        self.waitStall  = 0
+        self.waitAck    = 0
+        self.maxStall   = 0
+        self.maxAck     = 0
+        self.stallHist  = [0] * self.buckets
+        self.ackHist    = [0] * self.buckets
+        self.regions    = {}    # name -> [transfers, errors, waitStall, waitAck]
+
+    def add(self, reply, adr, we, waitIdle, waitStall, waitAck):
+        """Count a transfer
+        """
+        last = self.buckets - 1
+        self.transfers += 1
+        if we:
+            self.writes += 1
+        self.replies[reply] += 1
+        self.waitIdle += waitIdle
+        self.waitStall += waitStall
+        self.waitAck += waitAck
+        if waitStall > self.maxStall:
+            self.maxStall = waitStall
+        if waitAck > self.maxAck:
+            self.maxAck = waitAck
+        self.stallHist[min(waitStall.bit_length(), last)] += 1
+        self.ackHist[min(waitAck.bit_length(), last)] += 1
+        if self._regions is not None:
+            name = self._regions.lookup(adr).name
+            region = self.regions.get(name)
+            if region is None:
+                region = self.regions[name] = [0, 0, 0, 0]
+            region[0] += 1
+            if reply != 1:
+                region[1] += 1
+            region[2] += waitStall
+            region[3] += waitAck
+
+    def end_cycle(self, clocks):
+        """Count a bus cycle that kept cyc asserted for <clocks> clock cycles
+        """
+        self.cycles += 1
+        self.clocks += clocks
+
+    @property
+    def errors(self):
+        return self.replies[2]
+
+    @property
+    def retries(self):
+        return self.replies[3]
+
+    @property
+    def utilisation(self):
+        """Transfers per clock cycle with cyc asserted
+        """
+        return self.transfers / self.clocks if self.clocks else 0.0
+
+    def snapshot(self):
+        """Return the statistics as dict of plain values
+        """
+        n = self.transfers
+        return {
+            "transfers":        n,
+            "reads":            n - self.writes,
+            "writes":           self.writes,
+            "cycles":           self.cycles,
+            "clocks":           self.clocks,
+            "utilisation":      self.utilisation,
+            "transfersPerCycle": n / self.cycles if self.cycles else 0.0,
+            "acks":             self.replies[1],
+            "errors":           self.replies[2],
+            "retries":          self.replies[3],
+            "waitIdle":         {"mean": self.waitIdle / n if n else 0.0},
+            "waitStall":        {"mean": self.waitStall / n if n else 0.0, "max": self.maxStall,
+                                 "hist": dict(zip(self.bucketNames, self.stallHist))},
+            "waitAck":          {"mean": self.waitAck / n if n else 0.0, "max": self.maxAck,
+                                 "hist": dict(zip(self.bucketNames, self.ackHist))},
+            "regions":          {name: {"transfers": r[0], "errors": r[1],
+                                        "waitStall": r[2] / r[0], "waitAck": r[3] / r[0]}
+                                 for name, r in self.regions.items()},
+        }
+
+    def to_json(self, file=None):
+        """Write the snapshot as JSON to <file> (name or text file object),
+        return it as string without
+        """
+        text = json.dumps(self.snapshot(), indent=1)
+        if file is None:
+            return text
+        if hasattr(file, "write"):
+            file.write(text)
+        else:
+            with open(file, "w") as f:
+                f.write(text)
+
+    def to_csv(self, file=None):
+        """Write the snapshot as CSV rows of (metric, value) to <file> (name
+        or text file object), return it as string without. Nested values
+        are named with dots, e.g. waitAck.hist.2-3 or regions.ram.errors.
+        """
+        rows = []
+        def flatten(prefix, value):
+            if isinstance(value, dict):
+                for key, sub in value.items():
+                    flatten("%s.%s" % (prefix, key) if prefix else key, sub)
+            else:
+                rows.append((prefix, value))
+        flatten("", self.snapshot())
+        out = io.StringIO() if file is None else file if hasattr(file, "write") else open(file, "w", newline="")
+        try:
+            writer = csv.writer(out)
+            writer.writerow(("metric", "value"))
+            writer.writerows(rows)
+            if file is None:
+                return out.getvalue()
+        finally:
+            if file is not None and not hasattr(file, "write"):
+                out.close()
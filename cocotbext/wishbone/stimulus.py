@@ -0,0 +1,280 @@
+
+import random
+from itertools import islice
+from cocotb.decorators import public
+from .driver import WBOp
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@public
+class WBOpBatch():
+    """Operations of many cycles in columns
+
+    One list per field instead of one WBOp per operation, as drawn by
+    WBStimulus. WishboneMaster.send_batch() drives the operations straight
+    from the columns, cycles() turns them into lists of WBOp.
+
+    Args:
+        width: size of the data bus
+    """
+    columns = ("adr", "we", "dat", "sel", "idle", "cti", "bte")
+
+    def __init__(self, width=32):
+        self._width = width
+        for name in self.columns:
+            setattr(self, name, [])
+        self.starts = []    # index of the first operation of each cycle
+
+    def __len__(self):
+        return len(self.adr)
+
+    @property
+    def ncycles(self):
+        return len(self.starts)
+
+    def cycle_range(self, idx):
+        """First and end index of the operations of cycle <idx>
+        """
+        end = self.starts[idx + 1] if idx + 1 < len(self.starts) else len(self.adr)
+        return self.starts[idx], end
+
+    def cycles(self):
+        """Yield the cycles as lists of WBOp
+        """
+        adr, we, dat, sel, idle, cti, bte = (getattr(self, name) for name in self.columns)
+        for idx in range(len(self.starts)):
+            start, end = self.cycle_range(idx)
+            yield [WBOp(adr[i], dat[i] if we[i] else None, idle[i], sel[i], cti=cti[i], bte=bte[i])
+                   for i in range(start, end)]
+
+    def to_numpy(self):
+        """Return the columns as dict of NumPy arrays, plus the cycle starts
+        """
+        if numpy is None:
+            raise ImportError("NumPy is required for WBOpBatch.to_numpy()")
+        out = {name: numpy.array(getattr(self, name), dtype="u8" if self._width <= 64 or name != "dat" else object)
+               for name in self.columns}
+        out["starts"] = numpy.array(self.starts, dtype="u8")
+        return out
+
+
+@public
+class WBStimulus():
+    """Seeded constrained-random stream of bus cycles for a WishboneMaster
+
+    Cycles are drawn in batches, all operations of a batch at once with
+    NumPy if it is installed. Iterating yields lists of WBOp for
+    send_cycle() or send_cycles(), batches() yields WBOpBatch columns for
+    send_batch(), which doesn't build an object per operation::
+
+        stim = WBStimulus([(0, 0x1000), (0x8000, 0x10, 10)], writes=0.3, length=(1, 8))
+        await master.send_cycles(stim.cycles(1000))
+        for batch in stim.batches(100, 1000):
+            await master.send_batch(batch, results)
+
+    Distributions (<length>, <idle>) are an int for a fixed value, a (low,
+    high) tuple for integers evenly distributed over low..high, a dict of
+    value -> weight or any iterable of values like WBGeometric(0.5).
+
+    The same seed gives the same stream. Without one the seed is drawn from
+    the random module, which cocotb seeds with RANDOM_SEED. NumPy and the
+    pure Python fallback produce different streams.
+
+    Args:
+        regions: address ranges to draw from, a (base, size) tuple or a list
+            of (base, size) or (base, size, weight) in bus address units. A
+            small range with a large weight makes a hot spot.
+        writes: fraction of the operations that are writes
+        length: distribution of the number of operations per cycle
+        idle: distribution of the idle clocks before each operation
+        align: addresses are multiples of <align> from the region base
+        step: address increment between the beats of a burst, the number of
+            bytes per word on a byte addressed bus
+        bursts: fraction of the cycles that are incrementing bursts (cti 2,
+            7 on the last beat), all reads or all writes at consecutive
+            addresses without idle clocks between the beats
+        sel: byte lane patterns of writes, None for all lanes, a list of
+            equally likely patterns or a dict of pattern -> weight. Reads
+            select all lanes.
+        width: size of the data bus
+        seed: seed of the random number generator
+        chunk: number of cycles drawn at a time by cycles()
+    """
+    def __init__(self, regions, writes=0.5, length=1, idle=0, align=1, step=1, bursts=0.0, sel=None,
+                 width=32, seed=None, chunk=256):
+        if isinstance(regions, tuple):
+            regions = [regions]
+        self.regions = [(r[0], r[1], r[2] if len(r) > 2 else 1) for r in regions]
+        if not self.regions:
+            raise ValueError("No address region to draw from")
+        for base, size, weight in self.regions:
+            if size < align or weight < 0:
+                raise ValueError("Region 0x%x+0x%x is smaller than the alignment or has a negative weight" % (base, size))
+        total = float(sum(r[2] for r in self.regions))
+        if total <= 0:
+            raise ValueError("No address region with a positive weight")
+        self._weights = [r[2] / total for r in self.regions]
+        if not 0 <= writes <= 1 or not 0 <= bursts <= 1:
+            raise ValueError("writes and bursts must be fractions in [0, 1]")
+        self.writes     = writes
+        self.length     = length
+        self.idle       = idle
+        self.align      = align
+        self.step       = step
+        self.bursts     = bursts
+        self.width      = width
+        self._all       = (1 << (width // 8)) - 1
+        if isinstance(sel, dict):
+            self._sels, self._selWeights = list(sel), [float(w) for w in sel.values()]
+        elif sel is not None:
+            self._sels, self._selWeights = list(sel), [1.0] * len(sel)
+        else:
+            self._sels, self._selWeights = [self._all], [1.0]
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed       = seed
+        self._chunk     = chunk
+        self._rng       = numpy.random.default_rng(seed) if numpy is not None else random.Random(seed)
+        # iterables given as distribution are shared by all batches
+        self._iters     = {name: iter(spec) for name, spec in (("length", length), ("idle", idle))
+                           if not isinstance(spec, (int, tuple, dict))}
+
+    def _values(self, name, spec, n):
+        """List of <n> values of the distribution <spec>
+        """
+        rng = self._rng
+        if isinstance(spec, int):
+            return [spec] * n
+        if isinstance(spec, tuple):
+            low, high = spec
+            if numpy is not None:
+                return rng.integers(low, high, n, endpoint=True).tolist()
+            return [rng.randint(low, high) for _ in range(n)]
+        if isinstance(spec, dict):
+            values = list(spec)
+            weights = [float(w) for w in spec.values()]
+            if numpy is not None:
+                total = sum(weights)
+                return [values[i] for i in rng.choice(len(values), n, p=[w / total for w in weights]).tolist()]
+            return rng.choices(values, weights, k=n)
+        return list(islice(self._iters[name], n))
+
+    def batch(self, ncycles):
+        """Draw the next <ncycles> cycles as WBOpBatch
+        """
+        lengths = [max(1, v) for v in self._values("length", self.length, ncycles)]
+        n = sum(lengths)
+        idle = self._values("idle", self.idle, n)
+        if numpy is not None:
+            return self._batch_numpy(lengths, n, idle)
+        return self._batch_python(lengths, n, idle)
+
+    def _batch_numpy(self, lengths, n, idle):
+        rng     = self._rng
+        align   = self.align
+        bases   = numpy.array([r[0] for r in self.regions], dtype=numpy.int64)
+        sizes   = numpy.array([r[1] for r in self.regions], dtype=numpy.int64)
+        lengths = numpy.array(lengths, dtype=numpy.int64)
+        starts  = numpy.cumsum(lengths) - lengths
+        cycle   = numpy.repeat(numpy.arange(len(lengths)), lengths)    # cycle of each operation
+        beat    = numpy.arange(n) - starts[cycle]                        # index in its cycle
+        region  = rng.choice(len(self.regions), n, p=self._weights)
+        adr     = bases[region] + rng.integers(0, sizes[region] // align) * align
+        we      = rng.random(n) < self.writes
+        cti     = numpy.zeros(n, dtype=numpy.int64)
+        idle    = numpy.array(idle, dtype=numpy.int64)
+        burst   = rng.random(len(lengths)) < self.bursts
+        if burst.any():
+            # a burst runs from the address of its first beat, moved down to
+            # keep it within the region
+            first   = starts[burst]
+            base    = bases[region[first]]
+            end     = base + sizes[region[first]] - (lengths[burst] - 1) * self.step
+            start   = numpy.maximum(numpy.minimum(adr[first], base + (end - 1 - base) // align * align), base)
+            beats   = burst[cycle]
+            adr[beats] = numpy.repeat(start, lengths[burst]) + beat[beats] * self.step
+            we[beats] = numpy.repeat(rng.random(len(first)) < self.writes, lengths[burst])
+            cti[beats] = numpy.where(beat[beats] == lengths[cycle[beats]] - 1, 7, 2)
+            idle[beats & (beat > 0)] = 0
+        sel = numpy.full(n, self._all, dtype=object)
+        if we.any():
+            total = sum(self._selWeights)
+            pick = rng.choice(len(self._sels), int(we.sum()), p=[w / total for w in self._selWeights])
+            sel[we] = numpy.array(self._sels, dtype=object)[pick]
+        nbytes = self.width // 8
+        raw = rng.bytes(n * nbytes)
+        if self.width <= 64:
+            dat = numpy.frombuffer(raw, dtype="<u%u" % nbytes).tolist()
+        else:
+            view = memoryview(raw)
+            dat = [int.from_bytes(view[i * nbytes:(i + 1) * nbytes], "little") for i in range(n)]
+        batch = WBOpBatch(self.width)
+        batch.adr   = adr.tolist()
+        batch.we    = we.tolist()
+        batch.dat   = [d if w else 0 for d, w in zip(dat, batch.we)]
+        batch.sel   = sel.tolist()
+        batch.idle  = idle.tolist()
+        batch.cti   = cti.tolist()
+        batch.bte   = [0] * n
+        batch.starts = starts.tolist()
+        return batch
+
+    def _batch_python(self, lengths, n, idle):
+        rng     = self._rng
+        align   = self.align
+        regions = rng.choices(self.regions, self._weights, k=n)
+        batch   = WBOpBatch(self.width)
+        i = 0
+        for length in lengths:
+            batch.starts.append(len(batch.adr))
+            if rng.random() < self.bursts:
+                base, size, _ = regions[i]
+                end = base + size - (length - 1) * self.step
+                start = base + rng.randrange(size // align) * align
+                start = max(min(start, base + (end - 1 - base) // align * align), base)
+                write = rng.random() < self.writes
+                for j in range(length):
+                    batch.adr.append(start + j * self.step)
+                    batch.we.append(write)
+                    batch.idle.append(idle[i + j] if j == 0 else 0)
+                    batch.cti.append(7 if j == length - 1 else 2)
+            else:
+                for j in range(length):
+                    base, size, _ = regions[i + j]
+                    batch.adr.append(base + rng.randrange(size // align) * align)
+                    batch.we.append(rng.random() < self.writes)
+                    batch.idle.append(idle[i + j])
+                    batch.cti.append(0)
+            i += length
+        for write in batch.we:
+            batch.sel.append(rng.choices(self._sels, self._selWeights)[0] if write else self._all)
+            batch.dat.append(rng.getrandbits(self.width) if write else 0)
+        batch.bte = [0] * n
+        return batch
+
+    def batches(self, count=None, ncycles=None):
+        """Yield <count> WBOpBatch of <ncycles> cycles each, without end for
+        None
+        """
+        ncycles = ncycles or self._chunk
+        done = 0
+        while count is None or done < count:
+            yield self.batch(ncycles)
+            done += 1
+
+    def cycles(self, count=None):
+        """Yield <count> cycles as lists of WBOp, without end for None. The
+        cycles are drawn <chunk> at a time.
+        """
+        done = 0
+        while count is None or done < count:
+            batch = self.batch(self._chunk if count is None else min(self._chunk, count - done))
+            for ops in batch.cycles():
+                yield ops
+            done += batch.ncycles
+
+    def __iter__(self):
+        return self.cycles()
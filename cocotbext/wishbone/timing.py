@@ -0,0 +1,185 @@
+
+import math
+import random
+from collections import Counter
+from itertools import chain
+from cocotb.decorators import public
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@public
+class WBTiming():
+    """Seeded stream of values for the generators of WishboneSlave
+
+    The values are drawn in chunks of <chunk> at a time, with NumPy if it is
+    installed, and handed out through a C level iterator, so taking one per
+    transfer or per clock costs next to nothing. Pass the object wherever
+    the slave takes a generator, e.g. waitreplygen=WBUniform(0, 3).
+
+    The same seed gives the same sequence. Without one the seed is drawn
+    from the random module, which cocotb seeds with RANDOM_SEED, so the
+    timing follows the seed of the regression. NumPy and the pure Python
+    fallback produce different sequences.
+
+    Args:
+        seed: seed of the random number generator
+        chunk: number of values drawn at a time
+    """
+    def __init__(self, seed=None, chunk=1024):
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed   = seed
+        self._chunk = chunk
+        self._rng   = numpy.random.default_rng(seed) if numpy is not None else random.Random(seed)
+        self._it    = chain.from_iterable(self._chunks())
+
+    def _chunks(self):
+        while True:
+            yield self._draw(self._chunk)
+
+    def _draw(self, n):
+        """Return a list of the next <n> values
+        """
+        raise NotImplementedError("Timing doesn't implement _draw()")
+
+    def __iter__(self):
+        return self._it
+
+    def __next__(self):
+        return next(self._it)
+
+
+@public
+class WBFixed(WBTiming):
+    """Always the same value
+    """
+    def __init__(self, value, chunk=1024):
+        self.value = value
+        super().__init__(0, chunk)
+
+    def _draw(self, n):
+        return [self.value] * n
+
+
+@public
+class WBUniform(WBTiming):
+    """Integers evenly distributed over <low>..<high>, both included
+    """
+    def __init__(self, low, high, seed=None, chunk=1024):
+        if high < low:
+            raise ValueError("high must not be less than low")
+        self.low    = low
+        self.high   = high
+        super().__init__(seed, chunk)
+
+    def _draw(self, n):
+        if numpy is not None:
+            return self._rng.integers(self.low, self.high, n, endpoint=True).tolist()
+        randint = self._rng.randint
+        return [randint(self.low, self.high) for _ in range(n)]
+
+
+@public
+class WBGeometric(WBTiming):
+    """Number of failed tries before the first success with probability <p>,
+    mean (1 - p) / p. Models a latency that is mostly short with a long tail.
+
+    Args:
+        p: success probability, 0 < p <= 1
+        offset: added to every value
+        limit: values are clipped to at most <limit>, None for no limit
+    """
+    def __init__(self, p, offset=0, limit=None, seed=None, chunk=1024):
+        if not 0 < p <= 1:
+            raise ValueError("p must be in (0, 1]")
+        self.p      = p
+        self.offset = offset
+        self.limit  = limit
+        super().__init__(seed, chunk)
+
+    def _draw(self, n):
+        if numpy is not None:
+            values = self._rng.geometric(self.p, n) - 1 + self.offset
+            if self.limit is not None:
+                values = numpy.minimum(values, self.limit)
+            return values.tolist()
+        if self.p == 1:
+            values = [self.offset] * n
+        else:
+            rnd = self._rng.random
+            scale = 1 / math.log(1 - self.p)
+            values = [int(math.log(1 - rnd()) * scale) + self.offset for _ in range(n)]
+        if self.limit is not None:
+            values = [min(v, self.limit) for v in values]
+        return values
+
+
+@public
+class WBBurstStall(WBTiming):
+    """(stalled, not stalled) clock cycle tuples for <waitstallgen>: the slave
+    stalls in bursts of geometrically distributed length
+
+    Args:
+        busy: fraction of the clocks the slave stalls, 0 < busy < 1
+        length: mean length of a stall burst in clocks, at least 1
+    """
+    def __init__(self, busy, length, seed=None, chunk=1024):
+        if not 0 < busy < 1:
+            raise ValueError("busy must be in (0, 1)")
+        if length < 1:
+            raise ValueError("length must be at least 1")
+        self.busy   = busy
+        self.length = length
+        # mean length of the gaps between the bursts, at least one clock
+        self._gap   = max(1, length * (1 - busy) / busy)
+        super().__init__(seed, chunk)
+
+    def _draw(self, n):
+        if numpy is not None:
+            stalled = self._rng.geometric(1 / self.length, n).tolist()
+            free = self._rng.geometric(1 / self._gap, n).tolist()
+            return list(zip(stalled, free))
+        rnd = self._rng.random
+        def geometric(mean):
+            if mean == 1:
+                return 1
+            return int(math.log(1 - rnd()) / math.log(1 - 1 / mean)) + 1
+        return [(geometric(self.length), geometric(self._gap)) for _ in range(n)]
+
+
+@public
+class WBHistogram(WBTiming):
+    """Values drawn with the frequencies of a histogram, e.g. one recorded
+    from a real design
+
+    Args:
+        hist: dict of value -> weight, or a sequence of the weights of the
+            values 0, 1, 2, ...
+    """
+    def __init__(self, hist, seed=None, chunk=1024):
+        if not isinstance(hist, dict):
+            hist = dict(enumerate(hist))
+        hist = {value: weight for value, weight in hist.items() if weight > 0}
+        if not hist:
+            raise ValueError("Histogram has no values with a positive weight")
+        self.values     = list(hist)
+        self.weights    = [hist[value] for value in self.values]
+        super().__init__(seed, chunk)
+
+    @classmethod
+    def from_samples(cls, samples, seed=None, chunk=1024):
+        """Histogram of recorded <samples>, e.g. [res.waitAck for res in
+        transaction] or WBTrace(file).to_numpy()["waitAck"]
+        """
+        return cls(Counter(int(v) for v in samples), seed, chunk)
+
+    def _draw(self, n):
+        if numpy is not None:
+            total = float(sum(self.weights))
+            idx = self._rng.choice(len(self.values), n, p=[w / total for w in self.weights])
+            values = self.values
+            return [values[i] for i in idx.tolist()]
+        return self._rng.choices(self.values, self.weights, k=n)
@@ -0,0 +1,169 @@
+
+import os
+import mmap
+import struct
+from collections import namedtuple
+from itertools import chain, repeat
+from cocotb.utils import get_sim_time
+from cocotb.decorators import public
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+_HEADER = struct.Struct("<8sHHI")       # magic, bus width, record size, reserved
+_RECORD = struct.Struct("<QQQQIIIIBBBBB3x")
+_MAGIC  = b"WBTRACE1"
+
+WBTraceRecord = namedtuple("WBTraceRecord", ("time", "adr", "datrd", "datwr", "cycle",
+                                             "waitIdle", "waitStall", "waitAck",
+                                             "sel", "we", "ack", "cti", "bte"))
+
+
+@public
+class WBTraceWriter():
+    """Record transfers to a binary trace file
+
+    Every transfer is stored as a fixed size little endian record (see
+    WBTrace.dtype), so the file can be memory mapped and indexed without
+    parsing. Records are collected in a buffer and written in chunks.
+
+    Args:
+        file: file name or binary file object opened for writing
+        width: size of the data bus, at most 64
+        buffer: number of records collected before they are written
+    """
+    def __init__(self, file, width=32, buffer=4096):
+        if width > 64:
+            raise ValueError("Traces support data buses of up to 64 bits")
+        if hasattr(file, "write"):
+            self._file  = file
+            self._own   = False
+        else:
+            self._file  = open(file, "wb")
+            self._own   = True
+        self._width     = width
+        self._buf       = bytearray()
+        self._limit     = buffer * _RECORD.size
+        self.cycle      = 0
+        self.records    = 0
+        self._file.write(_HEADER.pack(_MAGIC, width, _RECORD.size, 0))
+
+    def append(self, adr, datrd, datwr, sel, we, ack, waitIdle=0, waitStall=0, waitAck=0, cti=0, bte=0, time=None):
+        """Record a transfer of the current bus cycle, <time> defaults to now
+        """
+        if time is None:
+            time = get_sim_time("ps")
+        if sel is None:
+            sel = (1 << (self._width // 8)) - 1
+        self._buf += _RECORD.pack(int(time), adr, datrd or 0, datwr or 0, self.cycle,
+                                  waitIdle or 0, waitStall or 0, waitAck or 0, sel, we, ack, cti or 0, bte or 0)
+        self.records += 1
+        if len(self._buf) >= self._limit:
+            self.flush()
+
+    def end_cycle(self):
+        """Following transfers belong to the next bus cycle
+        """
+        self.cycle += 1
+
+    def flush(self):
+        if self._buf:
+            self._file.write(self._buf)
+            self._buf = bytearray()
+        self._file.flush()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        if self._own:
+            self._file.close()
+        self._file = None
+
+
+@public
+class WBTrace():
+    """Read a binary trace written by WBTraceWriter
+
+    The file is memory mapped, records are only decoded when accessed.
+    Indexing and iterating yields WBTraceRecord tuples.
+
+    Args:
+        file: file name of the trace
+    """
+    dtype = None
+    if numpy is not None:
+        dtype = numpy.dtype([("time", "<u8"), ("adr", "<u8"), ("datrd", "<u8"), ("datwr", "<u8"),
+                             ("cycle", "<u4"), ("waitIdle", "<u4"), ("waitStall", "<u4"), ("waitAck", "<u4"),
+                             ("sel", "u1"), ("we", "u1"), ("ack", "u1"), ("cti", "u1"), ("bte", "u1"),
+                             ("pad", "V3")])
+
+    def __init__(self, file):
+        with open(file, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError("%s is not a Wishbone trace" % file)
+            magic, self.width, size, _ = _HEADER.unpack(header)
+            if magic != _MAGIC or size != _RECORD.size:
+                raise ValueError("%s is not a Wishbone trace of this version" % file)
+            length = os.fstat(f.fileno()).st_size
+            self._count = (length - _HEADER.size) // _RECORD.size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self._count else b""
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError("trace index out of range")
+        return WBTraceRecord._make(_RECORD.unpack_from(self._map, _HEADER.size + idx * _RECORD.size))
+
+    def __iter__(self):
+        if not self._count:
+            return
+        end = _HEADER.size + self._count * _RECORD.size
+        for fields in _RECORD.iter_unpack(memoryview(self._map)[_HEADER.size:end]):
+            yield WBTraceRecord._make(fields)
+
+    def cycles(self):
+        """Iterate over the bus cycles of the trace, each a list of records
+        """
+        cycle = []
+        for rec in self:
+            if cycle and rec.cycle != cycle[0].cycle:
+                yield cycle
+                cycle = []
+            cycle.append(rec)
+        if cycle:
+            yield cycle
+
+    def to_numpy(self):
+        """Return the records as NumPy structured array backed by the mapping
+        """
+        if numpy is None:
+            raise ImportError("NumPy is required for WBTrace.to_numpy()")
+        return numpy.frombuffer(self._map, dtype=self.dtype, count=self._count, offset=_HEADER.size)
+
+    def slave_generators(self):
+        """Generators making a WishboneSlave answer like the recorded slave
+
+        Read data, reply types and reply wait cycles are served in the order
+        of the trace. Stalls are approximated by stalling each transfer for
+        its recorded number of cycles. Once the trace is used up the slave
+        acknowledges without waiting.
+
+        Returns:
+            dict of datgen, ackgen, waitreplygen and waitstallgen arguments
+        """
+        return {"datgen":       chain((rec.datrd for rec in self if not rec.we), repeat(0)),
+                "ackgen":       chain((rec.ack for rec in self), repeat(1)),
+                "waitreplygen": chain((rec.waitAck for rec in self), repeat(0)),
+                "waitstallgen": chain(((rec.waitStall, 1) for rec in self), repeat((0, 1)))}
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
@@ -0,0 +1,255 @@
+"""cocotb tests of WishboneMaster against WishboneSlave, run by test_sim.py
+"""
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from cocotbext.wishbone.driver import WishboneMaster, WBOp
+from cocotbext.wishbone.monitor import WishboneSlave
+from cocotbext.wishbone.memory import WBMemory
+from cocotbext.wishbone.decoder import WBDecoder
+from cocotbext.wishbone.results import WBResults
+from cocotbext.wishbone.stimulus import WBStimulus
+
+
+def start(dut, master=None, **kwargs):
+    """Start the clock, return a master and a slave with a WBMemory on the
+    loopback bus
+    """
+    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
+    kwargs.setdefault("memory", WBMemory())
+    slave = WishboneSlave(dut, "", dut.clk, **kwargs)
+    return WishboneMaster(dut, "", dut.clk, timeout=100, **(master or {})), slave
+
+
+def watch(dut):
+    """Record (clock, adr, we, sel, cti) of every request the slave takes,
+    i.e. with stb asserted and stall not
+    """
+    taken = []
+
+    async def run():
+        clk = 0
+        while True:
+            await RisingEdge(dut.clk)
+            clk += 1
+            if dut.cyc.value == 1 and dut.stb.value == 1 and dut.stall.value == 0:
+                taken.append((clk, int(dut.adr.value), int(dut.we.value), int(dut.sel.value), int(dut.cti.value)))
+
+    cocotb.start_soon(run())
+    return taken
+
+
+@cocotb.test()
+async def pipelined_issue_order(dut):
+    master, slave = start(dut, dict(pipelined=True, ints=True), waitreplygen=[2] * 16)
+    taken = watch(dut)
+    ops = [WBOp(adr, adr * 3) for adr in (5, 1, 7, 3)] + [WBOp(adr) for adr in (3, 7, 1, 5)]
+    res = await master.send_cycle(ops)
+    assert [t[1] for t in taken] == [op.adr for op in ops]
+    assert [t[2] for t in taken] == [1] * 4 + [0] * 4
+    # a new request on every clock while the replies are outstanding
+    assert [b[0] - a[0] for a, b in zip(taken, taken[1:])] == [1] * 7
+    assert [r.adr for r in res] == [op.adr for op in ops]
+    assert [r.ack for r in res] == [1] * 8
+    assert [r.datrd for r in res[4:]] == [9, 21, 3, 15]
+
+
+@cocotb.test()
+async def classic_waits_for_ack(dut):
+    master, slave = start(dut, dict(ints=True), waitreplygen=[0] * 4 + [2] * 4)
+    taken = watch(dut)
+    fast = await master.send_cycle([WBOp(adr) for adr in range(4)])
+    del taken[:]
+    res = await master.send_cycle([WBOp(adr) for adr in range(4)])
+    assert [t[1] for t in taken] == [0, 1, 2, 3]
+    assert all(b[0] - a[0] > 1 for a, b in zip(taken, taken[1:]))
+    assert [r.waitAck - f.waitAck for r, f in zip(res, fast)] == [2] * 4
+
+
+@cocotb.test()
+async def burst_beats(dut):
+    mem = WBMemory()
+    master, slave = start(dut, memory=mem)
+    taken = watch(dut)
+    data = bytes(range(32))
+    await master.write_block(0x10, data)
+    assert [t[1] for t in taken] == list(range(0x10, 0x18))
+    assert [t[4] for t in taken] == [2] * 7 + [7]
+    assert mem.dump(0x40, 32) == data
+    del taken[:]
+    out = await master.read_block(0x10, 8)
+    assert bytes(out) == data
+    assert [t[4] for t in taken] == [2] * 7 + [7]
+    # registered feedback: the beats after the first are acknowledged back-to-back
+    assert [b[0] - a[0] for a, b in zip(taken[1:], taken[2:])] == [1] * 6
+    del taken[:]
+    await master.read_block(0x20, 1)
+    assert [t[4] for t in taken] == [7]
+
+
+@cocotb.test()
+async def byte_lanes(dut):
+    mem = WBMemory()
+    mem.load(bytes(16), 0)
+    master, slave = start(dut, memory=mem)
+    taken = watch(dut)
+    await master.write_bytes(1, b"\x11\x22\x33\x44\x55")
+    assert [(t[1], t[3]) for t in taken] == [(0, 0b1110), (1, 0b0011)]
+    assert mem.dump(0, 8) == b"\x00\x11\x22\x33\x44\x55\x00\x00"
+    del taken[:]
+    assert bytes(await master.read_bytes(3, 3)) == b"\x33\x44\x55"
+    assert [(t[1], t[3]) for t in taken] == [(0, 0b1000), (1, 0b0011)]
+    del taken[:]
+    await master.write_bytes(6, b"\x66")
+    assert [(t[1], t[3]) for t in taken] == [(1, 0b0100)]
+    del taken[:]
+    await master.write_bytes(2, bytes(range(1, 11)))
+    assert [(t[1], t[3]) for t in taken] == [(0, 0b1100), (1, 0b1111), (2, 0b1111)]
+    assert mem.dump(0, 12) == b"\x00\x11" + bytes(range(1, 11))
+
+
+@cocotb.test()
+async def byte_lanes_byteaddr(dut):
+    mem = WBMemory()
+    master, slave = start(dut, dict(byteaddr=True), memory=mem, byteaddr=True)
+    taken = watch(dut)
+    await master.write_bytes(7, b"\xaa\xbb")
+    assert [(t[1], t[3]) for t in taken] == [(4, 0b1000), (8, 0b0001)]
+    assert mem.dump(4, 8) == b"\x00\x00\x00\xaa\xbb\x00\x00\x00"
+    await master.write_block(16, bytes(range(8)))
+    assert [t[1] for t in taken[2:]] == [16, 20]
+
+
+@cocotb.test()
+async def decoder_targets(dut):
+    dec = WBDecoder()
+    ram = WBMemory()
+    dec.add(0, 0x1000, ram, "ram")
+    dec.add(0x2000, 0x10, {}, "regs")
+    master, slave = start(dut, dict(ints=True), memory=None, decoder=dec, byteaddr=True)
+    res = await master.send_cycle([WBOp(0, 0x1234), WBOp(0x5000), WBOp(0), WBOp(0x2004, 5), WBOp(0x2004)])
+    assert [r.ack for r in res] == [1, 2, 1, 1, 1]
+    assert res[2].datrd == 0x1234
+    assert res[4].datrd == 5
+
+
+@cocotb.test()
+async def back_to_back_cycles(dut):
+    master, slave = start(dut, dict(ints=True))
+    cycles = [[WBOp(i, i)] for i in range(4)]
+    res = await master.send_cycles(cycles)
+    assert [r[0].ack for r in res] == [1] * 4
+    res = await master.send_cycles([[WBOp(i)] for i in range(4)])
+    assert [r[0].datrd for r in res] == list(range(4))
+    assert master.perf.cycles == 8 and slave.perf.transfers == 8
+
+
+@cocotb.test()
+async def priority_arbitration(dut):
+    master, slave = start(dut, dict(ints=True, arbitration="priority"))
+    taken = watch(dut)
+    # all are queued before the bus is arbitrated
+    reqs = [master.submit([WBOp(adr)], priority=prio) for adr, prio in ((0, 0), (1, 1), (2, 3), (3, 2))]
+    for req in reqs:
+        await req
+    assert [t[1] for t in taken] == [2, 3, 1, 0]
+    del taken[:]
+    # while a cycle holds the bus
+    first = master.submit([WBOp(8, 1)] * 4)
+    await RisingEdge(dut.clk)
+    reqs = [master.submit([WBOp(adr)], priority=prio) for adr, prio in ((0, 0), (1, 1), (2, 3))]
+    await first
+    for req in reqs:
+        await req
+    assert [t[1] for t in taken] == [8] * 4 + [2, 1, 0]
+
+
+@cocotb.test()
+async def idle_none(dut):
+    master, slave = start(dut, dict(ints=True, regions={"low": (0, 0x100)}, events=[].append))
+    res = await master.send_cycle([WBOp(1, 5, idle=None), WBOp(1, idle=None)])
+    assert [r.ack for r in res] == [1, 1] and res[1].datrd == 5
+    results = await master.send_cycle([WBOp(2, idle=None)], results=WBResults())
+    assert len(results) == 1
+    assert master.perf.transfers == 3 and master.perf.waitIdle == 0
+
+
+@cocotb.test()
+async def undefined_read_data(dut):
+    """Read data with X/Z bits, as RTL slaves leave it on write acks, counts
+    as unresolvable instead of failing
+    """
+    master, slave = start(dut)
+    master._read_datrd = lambda: "x" * 32
+    results = await master.send_cycle([WBOp(0, 1), WBOp(0)], results=WBResults())
+    assert list(results.ack) == [1, 1] and list(results.datrd) == [0, 0]
+    res = await master.send_cycle([WBOp(0, 1), WBOp(0)])
+    assert not res[1].datrd.is_resolvable
+    assert bytes(await master.read_block(0, 2)) == bytes(8)
+    assert bytes(await master.read_bytes(1, 2)) == bytes(2)
+
+
+@cocotb.test()
+async def batch_undefined_read_data(dut):
+    master, slave = start(dut)
+    master._read_datrd = lambda: "z" * 32
+    batch = WBStimulus((0, 0x40), writes=0.5, length=(1, 4), seed=1).batch(8)
+    results = await master.send_batch(batch)
+    assert len(results) == len(batch) and set(results.datrd) == {0}
+
+
+@cocotb.test()
+async def failing_events_callback(dut):
+    """A failing events callback fails its cycle, not the master"""
+    failing = set()
+
+    def events(event):
+        if event.kind in failing:
+            raise RuntimeError("%s event failed" % event.kind)
+
+    master, slave = start(dut, dict(ints=True, events=events))
+    for kind in ("open", "close", "transfer"):
+        failing.add(kind)
+        reqs = [master.submit([WBOp(i, i)]) for i in range(3)]
+        for req in reqs:
+            try:
+                await req
+            except RuntimeError:
+                assert kind != "close"
+            else:
+                # submitted cycles complete before they are closed
+                assert kind == "close", "%s event didn't fail the cycle" % kind
+        try:
+            await master.send_cycle([WBOp(1)])
+        except RuntimeError:
+            pass
+        else:
+            assert False, "%s event didn't fail the cycle" % kind
+        failing.discard(kind)
+        res = await master.send_cycle([WBOp(1)])
+        assert res[0].ack == 1 and not master.busy
+
+
+@cocotb.test()
+async def failing_serve(dut):
+    """If serving the queue fails, all queued cycles fail and the master
+    takes new ones
+    """
+    master, slave = start(dut, dict(ints=True))
+
+    def end_cycle(clocks):
+        raise RuntimeError("statistics failed")
+
+    master.perf.end_cycle = end_cycle
+    reqs = [master.submit([WBOp(i, i + 1)]) for i in range(3)]
+    for req in reqs:
+        try:
+            await req
+        except RuntimeError:
+            pass
+        else:
+            assert False, "cycle didn't fail"
+    del master.perf.end_cycle
+    # only the first cycle was carried out
+    res = await master.send_cycle([WBOp(0), WBOp(1)])
+    assert [r.datrd for r in res] == [1, 0]
@@ -0,0 +1,117 @@
+"""cocotb tests of WishboneSlave, run by test_sim.py
+"""
+import random
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge, ClockCycles
+from cocotb.result import TestFailure
+from cocotbext.wishbone.driver import WishboneMaster, WBOp, WBTimeout
+from cocotbext.wishbone.monitor import WishboneSlave
+from cocotbext.wishbone.memory import WBMemory
+
+
+@cocotb.test()
+async def stall_at_end_of_cycle(dut):
+    """A stall drawn on the last clock of a cycle must not stay on the bus
+    while the slave waits for the next cycle
+    """
+    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
+    rnd = random.Random(1)
+    stalls = [(rnd.randrange(4), rnd.randrange(1, 3)) for _ in range(500)]
+    seen = []
+    slave = WishboneSlave(dut, "", dut.clk, memory=WBMemory(), waitstallgen=stalls, callback=seen.extend)
+    master = WishboneMaster(dut, "", dut.clk, timeout=100)
+    idle = []   # stall of the clocks with cyc low
+
+    async def watch():
+        while True:
+            await RisingEdge(dut.clk)
+            if dut.cyc.value == 0:
+                idle.append(int(dut.stall.value))
+
+    cocotb.start_soon(watch())
+    waits = []
+    for i in range(40):
+        res = await master.send_cycle([WBOp(i, i), WBOp(i)])
+        waits.extend(r.waitStall for r in res)
+        if i % 3 == 0:
+            await ClockCycles(dut.clk, 3)
+    await ClockCycles(dut.clk, 2)
+    assert len(seen) == len(waits) == 80
+    assert sum(waits) > 0
+    # the slave counts the stall runs up to taking a request, all clocks
+    # the master was stalled for are part of it
+    assert all(m <= s.waitStall for m, s in zip(waits, seen)), list(zip(waits, (s.waitStall for s in seen)))
+    # at most the clock closing the cycle is stalled, not the idle ones after it
+    assert "11" not in "".join(map(str, idle))
+
+
+@cocotb.test()
+async def undefined_request_lines(dut):
+    """X/Z on sel and the write data doesn't fail the recording"""
+    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
+    seen = []
+    slave = WishboneSlave(dut, "", dut.clk, columnar=True, callback=seen.append, events=[].append)
+    bslave = WishboneSlave(dut, "", dut.clk, callback=seen.append, events=[].append)
+    master = WishboneMaster(dut, "", dut.clk, timeout=100)
+    await RisingEdge(dut.clk)
+    for s in (slave, bslave):
+        s._rd_sel = lambda: "x" * 4
+        s._rd_datwr = lambda: "z" * 32
+    await master.send_cycle([WBOp(1, 5), WBOp(2)])
+    await master.write_block(4, bytes(16))
+    await ClockCycles(dut.clk, 2)
+    columns, objects = seen[0], seen[1]
+    assert list(columns.adr) == [1, 2] and list(columns.sel) == [0, 0] and list(columns.datwr) == [0, 0]
+    assert [r.adr for r in objects] == [1, 2] and not objects[0].datwr.is_resolvable
+    assert list(seen[2].adr) == [4, 5, 6, 7]
+    assert list(seen[3][0].dat) == [0] * 4
+
+
+@cocotb.test()
+async def undefined_unselected_lanes(dut):
+    """X/Z in the byte lanes a write doesn't select and in cti/bte is don't
+    care for the memory model, in a selected lane it fails the write
+    """
+    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
+    mem = WBMemory()
+    slave = WishboneSlave(dut, "", dut.clk, memory=mem)
+    master = WishboneMaster(dut, "", dut.clk, timeout=100, ints=True)
+    await RisingEdge(dut.clk)
+    rd_datwr = slave._rd_datwr
+    slave._rd_datwr = lambda: "x" * 16 + rd_datwr()[16:]
+    slave._rd_cti = lambda: "zzz"
+    slave._rd_bte = lambda: "xx"
+    res = await master.send_cycle([WBOp(1, 0x1234, sel=0x3), WBOp(1)])
+    assert [r.ack for r in res] == [1, 1] and res[1].datrd == 0x1234
+    assert mem.dump(4, 4) == b"\x34\x12\x00\x00"
+    slave._rd_sel = lambda: "0100"
+    try:
+        slave._access_memory(1, True)
+    except TestFailure:
+        pass
+    else:
+        assert False, "X/Z in a selected byte lane written"
+    assert mem.dump(4, 4) == b"\x34\x12\x00\x00"
+
+
+@cocotb.test()
+async def retry_after_timeout(dut):
+    """A cycle the master gives up on is closed by the slave, the reply it
+    didn't wait for doesn't hold up the next cycle
+    """
+    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
+    seen = []
+    slave = WishboneSlave(dut, "", dut.clk, memory=WBMemory(), waitreplygen=[50] + [0] * 10, callback=seen.append)
+    master = WishboneMaster(dut, "", dut.clk, timeout=10, ints=True)
+    try:
+        await master.send_cycle([WBOp(1, 5)])
+    except WBTimeout:
+        pass
+    else:
+        assert False, "no timeout"
+    res = await master.send_cycle([WBOp(1)])
+    assert res[0].ack == 1 and res[0].datrd == 5 and res[0].waitAck <= 1
+    await ClockCycles(dut.clk, 2)
+    assert [len(cycle) for cycle in seen] == [1, 1]
+    assert slave.perf.cycles == 2
@@ -0,0 +1,55 @@
+"""cocotb tests of WishboneSniffer, run by test_sim.py
+"""
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge, ClockCycles
+from cocotbext.wishbone.driver import WishboneMaster, WBOp
+from cocotbext.wishbone.monitor import WishboneSlave
+from cocotbext.wishbone.sniffer import WishboneSniffer
+from cocotbext.wishbone.memory import WBMemory
+
+
+@cocotb.test()
+async def clean_bus(dut):
+    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
+    slave = WishboneSlave(dut, "", dut.clk, memory=WBMemory(), waitreplygen=[0, 1, 2] * 10)
+    sniffer = WishboneSniffer(dut, "", dut.clk, ints=True)
+    master = WishboneMaster(dut, "", dut.clk, timeout=100, ints=True)
+    await master.send_cycle([WBOp(i, i) for i in range(4)])
+    res = await master.send_cycle([WBOp(i) for i in range(4)])
+    await master.write_block(8, bytes(16))
+    await ClockCycles(dut.clk, 2)
+    assert sniffer.violations == []
+    seen = sniffer._recvQ
+    assert len(seen) == 3 and [r.datrd for r in seen[1]] == [r.datrd for r in res]
+
+
+@cocotb.test()
+async def reply_outside_once(dut):
+    """A reply while cyc is low is reported once, whether it rises between
+    cycles or together with the close of a cycle
+    """
+    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
+    for name in ("cyc", "stb", "we", "ack", "err", "rty", "stall"):
+        getattr(dut, name).value = 0
+    await RisingEdge(dut.clk)
+    sniffer = WishboneSniffer(dut, "", dut.clk)
+    await ClockCycles(dut.clk, 2)
+    # between cycles
+    dut.ack.value = 1
+    await ClockCycles(dut.clk, 2)
+    dut.ack.value = 0
+    await ClockCycles(dut.clk, 2)
+    assert [v.check for v in sniffer.violations] == ["reply_outside"]
+    # a cycle closing as the reply rises
+    dut.cyc.value = 1
+    dut.stb.value = 1
+    await RisingEdge(dut.clk)
+    dut.stb.value = 0
+    await RisingEdge(dut.clk)
+    dut.cyc.value = 0
+    dut.ack.value = 1
+    await ClockCycles(dut.clk, 2)
+    dut.ack.value = 0
+    await ClockCycles(dut.clk, 2)
+    assert [v.check for v in sniffer.violations] == ["reply_outside"] * 2, sniffer.violations
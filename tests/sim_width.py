@@ -0,0 +1,48 @@
+"""cocotb tests of buses other than 32 bits wide, run by test_sim.py
+"""
+import cocotb
+from cocotb.clock import Clock
+from cocotbext.wishbone.driver import WishboneMaster, WBOp
+from cocotbext.wishbone.monitor import WishboneSlave
+from cocotbext.wishbone.sniffer import WishboneSniffer
+from cocotbext.wishbone.memory import WBMemory
+
+
+@cocotb.test()
+async def width_from_lines(dut):
+    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
+    width = len(dut.datwr)
+    nbytes = width // 8
+    mem = WBMemory()
+    slave = WishboneSlave(dut, "", dut.clk, memory=mem)
+    sniffer = WishboneSniffer(dut, "", dut.clk)
+    master = WishboneMaster(dut, "", dut.clk, timeout=100, ints=True)
+    assert master._width == slave._width == sniffer._width == width
+    word = int.from_bytes(bytes(range(1, nbytes + 1)), "little")
+    res = await master.send_cycle([WBOp(1, word), WBOp(1)])
+    assert [r.sel for r in res] == [(1 << nbytes) - 1] * 2
+    assert res[1].datrd == word
+    assert mem.dump(nbytes, nbytes) == bytes(range(1, nbytes + 1))
+    await master.write_bytes(nbytes + 1, b"\xff")
+    assert bytes(await master.read_bytes(nbytes, 2)) == b"\x01\xff"
+    assert sniffer.violations == []
+
+
+@cocotb.test()
+async def explicit_width(dut):
+    width = len(dut.datwr)
+    master = WishboneMaster(dut, "", dut.clk, width=width)
+    assert master._sel_all == (1 << (width // 8)) - 1
+    for wrong in (width * 2, 24):
+        try:
+            WishboneMaster(dut, "", dut.clk, width=wrong)
+        except ValueError:
+            pass
+        else:
+            assert False, "width %u accepted on a %u bit bus" % (wrong, width)
+        try:
+            WishboneSlave(dut, "", dut.clk, width=wrong)
+        except ValueError:
+            pass
+        else:
+            assert False, "width %u accepted on a %u bit bus" % (wrong, width)
@@ -0,0 +1,61 @@
+
+import pytest
+from cocotbext.wishbone.decoder import WBDecoder, WBTarget
+from cocotbext.wishbone.memory import WBMemory
+
+
+def test_lookup():
+    dec = WBDecoder()
+    ram = dec.add(0x1000, 0x1000, WBMemory(), "ram")
+    regs = dec.add(0x4000, 0x10, {}, "regs")
+    assert dec.lookup(0x1000) is ram
+    assert dec.lookup(0x1fff) is ram
+    assert dec.lookup(0x2000) is dec.default
+    assert dec.lookup(0x0fff) is dec.default
+    assert dec.lookup(0x400c) is regs
+    assert dec.lookup(0x4010) is dec.default
+    assert dec.targets == [ram, regs]
+
+
+def test_overlap():
+    dec = WBDecoder()
+    dec.add(0x1000, 0x1000, None)
+    with pytest.raises(ValueError):
+        dec.add(0x1800, 0x1000, None)
+    with pytest.raises(ValueError):
+        dec.add(0x800, 0x1000, None)
+    dec.add(0x2000, 0x10, None)
+
+
+def test_unmapped_doesnt_shadow_address_0():
+    dec = WBDecoder()
+    mem = dec.add(0, 0x1000, WBMemory(), "mem")
+    assert dec.lookup(0) is mem
+    assert dec.lookup(0x5000).name == "unmapped"
+    assert dec.lookup(0) is mem
+    assert dec.lookup(0x5000).name == "unmapped"
+    assert dec.lookup(0x10) is mem
+
+
+def test_default_target():
+    other = WBTarget(0, 1, {}, "other")
+    dec = WBDecoder(other)
+    dec.add(0, 0x100, None, "low")
+    assert dec.lookup(0x200) is other
+    assert dec.lookup(0).name == "low"
+
+
+def test_handlers():
+    dec = WBDecoder()
+    regs = {}
+    calls = []
+    dec.add(0x100, 0x10, regs)
+    dec.add(0x200, 0x10, lambda adr, we, dat, sel: calls.append((adr, we, dat, sel)) or 0x55)
+    dec.write_word(0x104, 0x11223344, 4)
+    dec.write_word(0x104, 0xaabbccdd, 4, sel=0b0101)
+    assert regs == {4: 0x11bb33dd}
+    assert dec.read_word(0x104, 4) == 0x11bb33dd
+    assert dec.read_word(0x208, 4) == 0x55
+    dec.write_word(0x20c, 7, 4, sel=0xf)
+    assert calls == [(8, False, None, None), (12, True, 7, 0xf)]
+    assert dec.read_word(0x300, 4) == 0
@@ -0,0 +1,94 @@
+
+import asyncio
+import pytest
+from cocotb import result
+from cocotbext.wishbone.regmap import WBRegMap
+
+
+class FakeReply():
+    def __init__(self, ack, datrd):
+        self.ack    = ack
+        self.datrd  = datrd
+
+
+class FakeMaster():
+    """Stands in for a WishboneMaster, with a dict as memory"""
+    _width = 32
+    _byteaddr = False
+
+    def __init__(self):
+        self.mem = {}
+        self.cycles = []
+        self.failing = set()    # addresses replied to with err
+
+    async def send_cycle(self, ops):
+        self.cycles.append([(op.adr, op.dat) for op in ops])
+        res = []
+        for op in ops:
+            if op.adr in self.failing:
+                res.append(FakeReply(2, 0))
+                continue
+            if op.dat is not None:
+                self.mem[op.adr] = op.dat
+            res.append(FakeReply(1, self.mem.get(op.adr, 0)))
+        return res
+
+
+regs = {
+    "ctrl":   dict(offset=0x0, fields={"en": (0, 1), "mode": (1, 3)}, reset=0),
+    "div":    dict(offset=0x4),
+    "status": dict(offset=0x8, access="ro"),
+    "irq":    dict(offset=0xc, fields={"pending": (0, 4, "w1c"), "mask": (8, 4)}),
+}
+
+
+def test_merging():
+    master = FakeMaster()
+    rmap = WBRegMap(master, regs)
+    rmap.update("ctrl", en=1)
+    rmap.update("ctrl", mode=5)
+    rmap.update("div", 10)
+    rmap.update("div", 12)
+    asyncio.run(rmap.flush())
+    # the fields of ctrl merge with its reset value, div is written once
+    assert master.cycles == [[(0, 0b1011), (1, 12)]]
+    assert rmap.merged == 2 and rmap.writes == 2
+    assert rmap["ctrl"].shadow == 0b1011 and rmap["div"].shadow == 12
+
+
+def test_field_update_reads_unknown_value():
+    master = FakeMaster()
+    master.mem[3] = 0x0f05
+    rmap = WBRegMap(master, regs)
+    asyncio.run(rmap.write("irq", mask=2))
+    # the w1c bits aren't written back
+    assert master.cycles == [[(3, None)], [(3, 0x0200)]]
+
+
+def test_shadow_hits():
+    master = FakeMaster()
+    master.mem[1] = 7
+    master.mem[2] = 1
+    rmap = WBRegMap(master, regs)
+    assert asyncio.run(rmap.read_many(["div", "div", "status", "status", ("ctrl", "en")])) == [7, 7, 1, 1, 0]
+    assert master.cycles == [[(1, None), (2, None), (2, None)]]
+    assert asyncio.run(rmap.read("div")) == 7
+    assert rmap.hits == 2 and rmap.reads == 3
+
+
+def test_failing_write():
+    master = FakeMaster()
+    rmap = WBRegMap(master, dict(regs, scratch=dict(offset=0x10)))
+    asyncio.run(rmap.write("div", 1))
+    rmap["scratch"].shadow = 3
+    master.failing.add(0)
+    rmap.update("div", 2)
+    rmap.update("ctrl", en=1)
+    rmap.update("scratch", 4)
+    with pytest.raises(result.TestFailure):
+        asyncio.run(rmap.flush())
+    # div was written, ctrl and the write after it may or may not have been
+    assert rmap["div"].shadow == 2
+    assert rmap["ctrl"].shadow is None and rmap["scratch"].shadow is None
+    master.failing.clear()
+    assert asyncio.run(rmap.read("scratch")) == 4
@@ -0,0 +1,40 @@
+"""Run the cocotb test modules sim_*.py in a simulator
+
+The master and slave models attach to the lines of the empty loopback module
+of the benchmarks. SIM selects the simulator, icarus by default.
+"""
+import os
+import shutil
+import sys
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(here)
+sim = os.environ.get("SIM", "icarus")
+tools = {"icarus": "iverilog", "verilator": "verilator"}
+
+pytestmark = pytest.mark.skipif(shutil.which(tools.get(sim, sim)) is None, reason="simulator %s not found" % sim)
+
+
+def run(module, width=32):
+    from cocotb.runner import get_runner, get_results
+    runner = get_runner(sim)
+    build_dir = os.path.join(here, "build", "%s-%u" % (sim, width))
+    build_args = ["--public-flat-rw", "-Wno-fatal"] if sim == "verilator" else []
+    runner.build(verilog_sources=[os.path.join(root, "benchmarks", "loopback.sv")], hdl_toplevel="loopback",
+                 parameters={"WIDTH": width}, build_dir=build_dir, build_args=build_args)
+    # the test modules and, when not installed, cocotbext
+    sys.path[:0] = [p for p in (here, root) if p not in sys.path]
+    results = runner.test(hdl_toplevel="loopback", test_module=module, build_dir=build_dir, test_dir=build_dir, seed=1)
+    tests, failed = get_results(results)
+    assert tests > 0 and failed == 0, "%u of %u tests of %s failed" % (failed, tests, module)
+
+
+@pytest.mark.parametrize("module", ["sim_master", "sim_slave", "sim_sniffer"])
+def test_sim(module):
+    run(module)
+
+
+@pytest.mark.parametrize("width", [16, 64])
+def test_width(width):
+    run("sim_width", width)
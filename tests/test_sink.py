@@ -0,0 +1,44 @@
+
+import asyncio
+import gc
+from cocotbext.wishbone.driver import WishboneMaster, WBOp
+from cocotbext.wishbone.monitor import WishboneSlave
+from cocotbext.wishbone.memory import WBMemory
+from cocotbext.wishbone.sink import WBRingSink
+
+
+def test_transactions_detach():
+    slave = WishboneSlave(None, "s", None, tlm=True, memory=WBMemory())
+    master = WishboneMaster(None, "m", None, tlm=slave)
+    kept = slave.transactions()
+    closed = slave.transactions()
+    closed.close()
+    left = slave.transactions()
+
+    async def consume():
+        await master.send_cycle([WBOp(0)])
+        async for transaction in left:
+            return transaction
+
+    assert len(asyncio.run(consume())) == 1
+    del left
+    gc.collect()
+    asyncio.run(master.send_cycle([WBOp(1)]))
+    assert kept.received == 2 and closed.received == 0
+    assert len(slave._callbacks) == 1
+    kept.close()
+    asyncio.run(master.send_cycle([WBOp(2)]))
+    # the monitor doesn't fall back to collecting them in _recvQ
+    assert not slave._recvQ
+
+
+def test_transactions_with_sinks():
+    last = WBRingSink(2)
+    slave = WishboneSlave(None, "s", None, tlm=True, memory=WBMemory(), sink=last)
+    master = WishboneMaster(None, "m", None, tlm=slave)
+    stream = slave.transactions()
+    stream.close()
+    for adr in range(3):
+        asyncio.run(master.send_cycle([WBOp(adr)]))
+    assert last.received == 3 and len(last) == 2
+    assert slave._callbacks == [last.put]
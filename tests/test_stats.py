@@ -0,0 +1,43 @@
+
+import csv
+import io
+import json
+from cocotbext.wishbone.stats import WBStats
+
+
+def test_counters():
+    stats = WBStats()
+    stats.add(1, 0, True, 1, 0, 0)
+    stats.add(1, 4, False, 0, 3, 5)
+    stats.add(2, 8, False, 0, 0, 20)
+    stats.end_cycle(12)
+    snap = stats.snapshot()
+    assert snap["transfers"] == 3 and snap["reads"] == 2 and snap["writes"] == 1
+    assert snap["acks"] == 2 and snap["errors"] == 1
+    assert stats.utilisation == 3 / 12
+    assert snap["waitStall"]["max"] == 3
+    assert snap["waitStall"]["hist"]["0"] == 2 and snap["waitStall"]["hist"]["2-3"] == 1
+    assert snap["waitAck"]["hist"]["4-7"] == 1 and snap["waitAck"]["hist"]["16-31"] == 1
+    assert json.loads(stats.to_json())["transfers"] == 3
+    rows = dict(csv.reader(io.StringIO(stats.to_csv())))
+    assert rows["waitAck.max"] == "20"
+
+
+def test_regions():
+    stats = WBStats({"low": (0, 0x100), "high": (0x1000, 0x100)})
+    stats.add(1, 0x1010, False, 0, 0, 1)
+    stats.add(2, 0x5000, False, 0, 0, 1)
+    # address 0 after an unmapped transfer still counts for its region
+    stats.add(1, 0, False, 0, 0, 1)
+    stats.add(1, 0x10, True, 0, 0, 3)
+    regions = stats.snapshot()["regions"]
+    assert regions["low"] == {"transfers": 2, "errors": 0, "waitStall": 0.0, "waitAck": 2.0}
+    assert regions["high"]["transfers"] == 1
+    assert regions["other"]["errors"] == 1
+
+
+def test_reset():
+    stats = WBStats({"low": (0, 0x100)})
+    stats.add(1, 0, False, 0, 0, 0)
+    stats.reset()
+    assert stats.transfers == 0 and stats.regions == {}
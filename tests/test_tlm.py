@@ -0,0 +1,53 @@
+
+import asyncio
+from cocotbext.wishbone.driver import WishboneMaster, WBOp
+from cocotbext.wishbone.monitor import WishboneSlave
+from cocotbext.wishbone.memory import WBMemory
+from cocotbext.wishbone.decoder import WBDecoder
+from cocotbext.wishbone.results import WBResults
+from cocotbext.wishbone.stimulus import WBStimulus
+
+
+def test_memory():
+    master = WishboneMaster(None, "m", None, tlm=WBMemory(), ints=True)
+
+    async def run():
+        res = await master.send_cycle([WBOp(1, 5), WBOp(1)])
+        assert [r.datrd for r in res] == [0, 5]
+        await master.write_block(4, bytes(range(16)))
+        assert bytes(await master.read_block(4, 4)) == bytes(range(16))
+        await master.write_bytes(17, b"\xaa")
+        assert bytes(await master.read_bytes(16, 2)) == b"\x00\xaa"
+
+    asyncio.run(run())
+    assert master.perf.cycles == 5 and master.clocks > 0
+
+
+def test_slave():
+    events = []
+    slave = WishboneSlave(None, "s", None, tlm=True, memory=WBMemory(), waitreplygen=[3] * 8, events=events.append)
+    master = WishboneMaster(None, "m", None, tlm=slave, ints=True)
+    res = asyncio.run(master.send_cycle([WBOp(2, 7), WBOp(2)]))
+    assert [r.waitAck for r in res] == [4, 4] and res[1].datrd == 7
+    assert [e.kind for e in events] == ["open", "transfer", "transfer", "close"]
+    assert len(slave._recvQ) == 1 and slave.perf.transfers == 2
+
+
+def test_queue():
+    dec = WBDecoder()
+    dec.add(0, 0x100, WBMemory(), "ram")
+    master = WishboneMaster(None, "m", None, tlm=dec, ints=True, arbitration="priority")
+
+    async def run():
+        # the queue is carried out in priority order by the first await
+        reqs = [master.submit([WBOp(0, i)], priority=i) for i in range(3)]
+        await reqs[0]
+        assert all(req.done for req in reqs)
+        assert (await master.send_cycle([WBOp(0)]))[0].datrd == 0
+        res = await master.send_cycles([[WBOp(i, i)] for i in range(8)])
+        assert len(res) == 8
+        batch = WBStimulus((0, 0x40), writes=0.5, length=(1, 4), seed=1).batch(8)
+        results = await master.send_batch(batch, WBResults())
+        assert len(results) == len(batch)
+
+    asyncio.run(run())